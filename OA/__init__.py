@@ -1,2 +1,27 @@
-from .engine import TemplateEngine
-from .worksheet import Worksheet
+# Stage backends (docxtpl, PyPDF2, pandas, Office automation) are imported by the stage that uses them,
+# and the public names are resolved on first access so `import OA` itself stays cheap.
+
+__all__ = ['TemplateEngine', 'Worksheet', 'stats_from_book', 'stats_from_files', 'run_job', 'open_sink',
+           'validate_records', 'ValidationError']
+
+
+def __getattr__(name):
+    if name == 'TemplateEngine':
+        from .engine import TemplateEngine
+        return TemplateEngine
+    if name == 'Worksheet':
+        from .worksheet import Worksheet
+        return Worksheet
+    if name in ('stats_from_book', 'stats_from_files'):
+        from . import _payroll
+        return getattr(_payroll, name)
+    if name == 'run_job':
+        from ._daemon import run_job
+        return run_job
+    if name == 'open_sink':
+        from ._sink import open_sink
+        return open_sink
+    if name in ('validate_records', 'ValidationError'):
+        from . import _validate
+        return getattr(_validate, name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -1,68 +1,340 @@
 # -*- coding: utf-8 -*-
 
+import hashlib
+import logging
+import os
+import shutil
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
-from functools import wraps
+from functools import partial, wraps
 from pathlib import Path
-from zipfile import ZipFile, ZIP_DEFLATED
+from tempfile import SpooledTemporaryFile
+from typing import Dict, List, Optional, Tuple
+from zipfile import ZipFile, ZipInfo, ZIP_DEFLATED
 
+from ._manifest import MANIFEST_FILES
+from ._trace import carry, count, span
+from ._ziputil import CHUNK_SIZE, FLAG_DATA_DESCRIPTOR, RawZipWriter, clone_info, deflate_stream, read_raw
 
-def auto_zip(func):
+# Prefix of the member comment that records the SHA-256 of the archived content
+DIGEST_PREFIX = 'sha256:'
+# Compressed members larger than this are spooled to disk instead of memory
+SPOOL_SIZE = 8 * CHUNK_SIZE
+
+
+def auto_zip(func=None, *, workers: Optional[int] = None, per_year: bool = False, compresslevel: int = 6):
     """
     Decorator to automatically zip files in a directory returned by the decorated function.
 
+    Can be used bare (``@auto_zip``) or with options (``@auto_zip(per_year=True)``).
+
     Args:
         func (callable): The function to decorate.
+        workers (int, optional): Number of threads compressing files concurrently. Defaults to the CPU count.
+        per_year (bool, optional): Append every file to one archive per year instead of one archive per file.
+        compresslevel (int, optional): The zlib compression level. Defaults to 6.
 
     Returns:
         callable: The wrapper function.
     """
+    if func is None:
+        return partial(auto_zip, workers=workers, per_year=per_year, compresslevel=compresslevel)
 
     @wraps(func)
     def wrapper(*args, **kwargs):
         # Execute the decorated function and get its result (a directory path)
         path = func(*args, **kwargs)
-        # Iterate through each file in the directory
-        for file in path.iterdir():
-            # Skip if the file is already a zip file
-            if file.suffix == '.zip':
-                continue
-            # Zip the file
-            zip_file(file)
+        return zip_directory(path, workers=workers, per_year=per_year, compresslevel=compresslevel)
 
     return wrapper
 
 
-def zip_file(file_path):
+def zip_directory(path: Path, workers: Optional[int] = None, per_year: bool = False, compresslevel: int = 6) -> Path:
+    """
+    Zips the files directly inside a directory.
+
+    Args:
+        path (Path): The directory.
+        workers (int, optional): Number of threads compressing files concurrently. Defaults to the CPU count.
+        per_year (bool, optional): Append every file to one archive per year instead of one archive per file.
+        compresslevel (int, optional): The zlib compression level. Defaults to 6.
+
+    Returns:
+        Path: The directory.
+    """
+    # Skip directories, files that are already zip files and the incremental build manifest
+    files = [file for file in path.iterdir()
+             if file.is_file() and file.suffix != '.zip' and file.name not in MANIFEST_FILES]
+
+    with span('auto_zip', 'stage', files=len(files), per_year=per_year):
+        if per_year:
+            archive_by_year(path, files, workers=workers, compresslevel=compresslevel)
+        else:
+            # Zip the archives concurrently; zlib releases the GIL while compressing
+            with ThreadPoolExecutor(max_workers=workers) as executor:
+                list(executor.map(carry(partial(zip_files, compresslevel=compresslevel)), group_by_archive(files)))
+    return path
+
+
+def extract_year(file_path: Path) -> Optional[int]:
+    """
+    Extracts the year from a file name in '%Y_%m' format.
+
+    Args:
+        file_path (Path): The file path.
+
+    Returns:
+        Optional[int]: The year, or None if the name is not in date format.
+    """
+    try:
+        return datetime.strptime(file_path.stem, "%Y_%m").year
+    except ValueError:
+        return None
+
+
+def file_digest(file_path: Path) -> str:
+    """
+    Computes the SHA-256 of a file, reading it in chunks.
+
+    Args:
+        file_path (Path): The file to hash.
+
+    Returns:
+        str: The digest as stored in the member comment.
+    """
+    digest = hashlib.sha256()
+    with open(file_path, 'rb') as stream:
+        while chunk := stream.read(CHUNK_SIZE):
+            digest.update(chunk)
+    return DIGEST_PREFIX + digest.hexdigest()
+
+
+def archived_digests(archive: Path) -> Dict[str, str]:
+    """
+    Reads the content digests recorded for the members of an existing archive.
+
+    Args:
+        archive (Path): The archive path.
+
+    Returns:
+        Dict[str, str]: Member name to digest; members without a recorded digest are left out.
+    """
+    if not archive.is_file():
+        return {}
+    with ZipFile(archive) as myzip:
+        return {info.filename: comment for info in myzip.infolist()
+                if (comment := info.comment.decode('ascii', 'ignore')).startswith(DIGEST_PREFIX)}
+
+
+def zip_destination(file_path: Path) -> Path:
+    """
+    Returns where zip_file leaves the archive of a file: next to it, or in a folder named after its year.
+
+    Args:
+        file_path (Path): The file to be compressed.
+
+    Returns:
+        Path: The archive path.
+    """
+    archive = file_path.with_suffix('.zip')
+    year = extract_year(file_path)
+    return archive if year is None else file_path.parent / str(year) / archive.name
+
+
+def group_by_archive(files: List[Path]) -> List[List[Path]]:
+    """
+    Groups files by the archive zip_file leaves them in, so files sharing a stem (a.docx, a.pdf)
+    are written into a.zip by one task instead of racing on it.
+
+    Args:
+        files (List[Path]): The files to be compressed.
+
+    Returns:
+        List[List[Path]]: The files of each archive, in the order given.
+    """
+    groups = defaultdict(list)
+    for file in files:
+        groups[zip_destination(file)].append(file)
+    return list(groups.values())
+
+
+def zip_file(file_path, compresslevel: int = 6):
     """
     Compresses a file into a ZIP archive, deletes the original file, and, if applicable,
     moves the ZIP file into a directory named after the year extracted from the file name.
 
     Args:
         file_path (Path): The path to the file to be compressed.
+        compresslevel (int, optional): The zlib compression level. Defaults to 6.
+    """
+    zip_files([file_path], compresslevel=compresslevel)
+
+
+def zip_files(files: List[Path], compresslevel: int = 6):
+    """
+    Compresses files sharing an archive, as grouped by group_by_archive, into that ZIP archive,
+    deletes the original files, and, if applicable, moves the ZIP file into a directory named
+    after the year extracted from the file names.
+
+    The files are streamed in chunks. If the destination archive already holds the same content,
+    it is left untouched and only the original files are deleted.
+
+    Args:
+        files (List[Path]): The files to be compressed; they share a stem and a directory.
+        compresslevel (int, optional): The zlib compression level. Defaults to 6.
     """
     # Define the name of the ZIP archive
-    archive = file_path.with_suffix('.zip')
+    archive = files[0].with_suffix('.zip')
+    year = extract_year(files[0])
+    destination = zip_destination(files[0])
+
     try:
-        # Create and write to the ZIP file
-        with ZipFile(archive, 'w', compression=ZIP_DEFLATED, compresslevel=6) as myzip:
-            myzip.write(filename=file_path, arcname=file_path.name)
+        digests = {file_path: file_digest(file_path) for file_path in files}
+        archived = archived_digests(destination)
+        if all(archived.get(file_path.name) == digest for file_path, digest in digests.items()):
+            # The archive is already current
+            for file_path in files:
+                file_path.unlink()
+            return
+
+        # Create and write to the ZIP file, streaming the content in chunks
+        with ZipFile(archive, 'w', compression=ZIP_DEFLATED, compresslevel=compresslevel) as myzip:
+            for file_path, digest in digests.items():
+                zinfo = ZipInfo.from_file(file_path, arcname=file_path.name)
+                zinfo.compress_type = ZIP_DEFLATED
+                zinfo.comment = digest.encode('ascii')
+                with span('zip', 'document', file=file_path.name), \
+                        open(file_path, 'rb') as src, myzip.open(zinfo, 'w') as dst:
+                    shutil.copyfileobj(src, dst, CHUNK_SIZE)
+        count('files.zipped', len(files))
+        count('bytes.zipped', archive.stat().st_size)
     except Exception as e:
-        # Print an error message if an exception occurs
-        print(f"Error occurred while zipping file {file_path}: {e}")
+        logging.error(f"Error occurred while zipping {', '.join(str(file_path) for file_path in files)}: {e}")
+        return
     else:
-        # If zipping successful, delete original file
-        file_path.unlink()
+        # If zipping successful, delete the original files
+        for file_path in files:
+            file_path.unlink()
 
     # Check if file name is in date format, if yes, create a new folder and move the file
-    try:
-        year = datetime.strptime(file_path.stem, "%Y_%m").year
-    except ValueError:
-        # If parsing fails, return early
+    if year is None:
         return
 
     # Create a new directory with the year name if it doesn't exist
-    new_directory = file_path.parent / str(year)
-    new_directory.mkdir(exist_ok=True)
+    destination.parent.mkdir(exist_ok=True)
 
     # Move the zip file to the new directory
-    archive.rename(Path(new_directory, archive.name))
+    archive.replace(destination)
+
+
+def compress_member(file_path: Path, archived: Optional[str], compresslevel: int = 6):
+    """
+    Compresses a file for appending to an archive, unless the archive already holds the same content.
+
+    Args:
+        file_path (Path): The file to compress.
+        archived (str, optional): The digest recorded in the archive for this file name.
+        compresslevel (int, optional): The zlib compression level.
+
+    Returns:
+        Optional[Tuple[ZipInfo, SpooledTemporaryFile]]: The member and its compressed data, or None if unchanged.
+    """
+    digest = file_digest(file_path)
+    if digest == archived:
+        return None
+
+    data = SpooledTemporaryFile(max_size=SPOOL_SIZE)
+    with span('zip', 'document', file=file_path.name), open(file_path, 'rb') as src:
+        stats = deflate_stream(src, data, compresslevel=compresslevel)
+    data.seek(0)
+    count('files.zipped')
+    count('bytes.zipped', stats.compress_size)
+
+    zinfo = ZipInfo(file_path.name, time.localtime(file_path.stat().st_mtime)[:6])
+    zinfo.compress_type = stats.compress_type
+    zinfo.CRC, zinfo.file_size, zinfo.compress_size = stats.CRC, stats.file_size, stats.compress_size
+    zinfo.external_attr = (file_path.stat().st_mode & 0xFFFF) << 16
+    zinfo.comment = digest.encode('ascii')
+    return zinfo, data
+
+
+def write_year_archive(archive: Path, members: List[Tuple[ZipInfo, SpooledTemporaryFile]]) -> None:
+    """
+    Adds compressed members to a yearly archive.
+
+    New names are appended in place. If a name already exists, the archive is rebuilt
+    with the unchanged members copied as raw compressed bytes.
+
+    Args:
+        archive (Path): The yearly archive.
+        members: The compressed members to add.
+    """
+    names = {zinfo.filename for zinfo, _ in members}
+    if archive.is_file():
+        with ZipFile(archive) as old:
+            infos = old.infolist()
+        # Members written with data descriptors do not tell where the central directory starts
+        rebuild = any(info.filename in names or info.flag_bits & FLAG_DATA_DESCRIPTOR for info in infos)
+    else:
+        infos, rebuild = [], False
+
+    if not rebuild:
+        with RawZipWriter(archive, 'a' if infos else 'w') as myzip:
+            for zinfo, data in members:
+                myzip.write_raw(zinfo, data)
+        return
+
+    temporary = archive.with_suffix('.zip.tmp')
+    with open(archive, 'rb') as old, RawZipWriter(temporary) as new:
+        for info in infos:
+            if info.filename not in names:
+                new.write_raw(clone_info(info), read_raw(old, info))
+        for zinfo, data in members:
+            new.write_raw(zinfo, data)
+    os.replace(temporary, archive)
+
+
+def archive_by_year(path: Path, files: List[Path], workers: Optional[int] = None, compresslevel: int = 6) -> None:
+    """
+    Appends files named '%Y_%m' to one archive per year in the directory, e.g. '2019.zip'.
+
+    Files are compressed concurrently; files whose content matches the archived entry are skipped.
+    Files without a date in their name are zipped individually.
+
+    Args:
+        path (Path): The directory holding the files.
+        files (List[Path]): The files to archive.
+        workers (int, optional): Number of compression threads.
+        compresslevel (int, optional): The zlib compression level.
+    """
+    groups = defaultdict(list)
+    for file in files:
+        groups[extract_year(file)].append(file)
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        # Files without a year keep the one-archive-per-file layout
+        list(executor.map(carry(partial(zip_files, compresslevel=compresslevel)),
+                          group_by_archive(groups.pop(None, []))))
+
+        for year, group in sorted(groups.items()):
+            archive = path / f'{year}.zip'
+            digests = archived_digests(archive)
+            members = []
+            try:
+                results = executor.map(
+                    carry(lambda file: compress_member(file, digests.get(file.name), compresslevel)), group)
+                members = [result for result in results if result is not None]
+                if members:
+                    write_year_archive(archive, members)
+            except Exception as e:
+                logging.error(f"Error occurred while zipping files into {archive}: {e}")
+                continue
+            finally:
+                for _, data in members:
+                    data.close()
+
+            # The archive now holds every file of the group
+            for file in group:
+                file.unlink()
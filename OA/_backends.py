@@ -0,0 +1,8 @@
+# -*- coding: utf-8 -*-
+
+# Backends that can fill the VAT and personal income tax workbooks: an Excel process driven
+# through xlwings, or the files written directly. Kept apart from the stages so choosing a
+# backend does not import xlwings.
+EXCEL_BACKEND = 'excel'
+HEADLESS_BACKEND = 'headless'
+BACKENDS = (EXCEL_BACKEND, HEADLESS_BACKEND)
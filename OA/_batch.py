@@ -0,0 +1,125 @@
+# -*- coding: utf-8 -*-
+
+import logging
+from collections import namedtuple
+from itertools import groupby
+from pathlib import Path
+from typing import List
+
+from ._classify_files import categorize_directory
+from ._convert2pdf import WORD_SUFFIXES, convert_directory, default_converter
+from ._trace import span
+
+# One company of a batch run: the template name and file, the register, its periods and its result folder
+BatchJob = namedtuple('BatchJob', ['template', 'template_path', 'register', 'periods', 'output_folder'])
+
+# Templates filled as Excel workbooks, and the personal income tax archive
+VAT_TEMPLATES = ('小规模', '一般纳税人')
+PIT_TEMPLATE = '个税压缩包'
+
+
+def finish_directories(folders: List[Path]) -> None:
+    """
+    Convert the Word documents of every folder with one converter, then categorize and merge each folder.
+
+    Args:
+        folders: The result folders.
+    """
+    # The Excel outputs are written with their PDFs, so a converter is only started for Word documents
+    pending = [folder for folder in folders
+               if any(file.suffix.lower() in WORD_SUFFIXES for file in folder.iterdir())]
+    try:
+        if pending:
+            with default_converter() as converter:
+                for folder in pending:
+                    convert_directory(folder, converter)
+    except FileNotFoundError as error:
+        logging.error(f'No PDF converter available: {error}')
+
+    for folder in folders:
+        categorize_directory(folder, merge=True)
+
+
+def run_template_group(template: str, jobs: List[BatchJob], workers: int = 1, backend: str = 'excel') -> List[Path]:
+    """
+    Produce the outputs of every company using one template.
+
+    Args:
+        template: The template name shared by the jobs.
+        jobs: The companies using the template.
+        workers: The number of processes used for rendering Word templates.
+        backend: 'excel' or 'headless' for the Excel templates.
+
+    Returns:
+        The result folders.
+    """
+    from .common import merge_range_and_data
+
+    folders = [job.output_folder for job in jobs]
+
+    if template == PIT_TEMPLATE:
+        from ._pil import generate_personal_income_tax_batch
+        generate_personal_income_tax_batch(
+            [(job.register, job.periods, job.output_folder) for job in jobs], backend=backend)
+        return folders
+
+    if template in VAT_TEMPLATES:
+        from ._backends import BACKENDS, HEADLESS_BACKEND
+        from ._vat import fill_many_headless, fill_many_with_excel
+        if backend not in BACKENDS:
+            raise ValueError(f"Invalid backend: {backend}. Expected one of {BACKENDS}")
+
+        fill = fill_many_headless if backend == HEADLESS_BACKEND else fill_many_with_excel
+        with span('fill_sheet', 'stage', backend=backend, companies=len(jobs)):
+            fill(jobs[0].template_path, [(job.output_folder, merge_range_and_data(job.periods, job.register))
+                                         for job in jobs])
+    else:
+        from ._pipeline import run_pipeline
+        from ._render import build_filenames, raise_for_failures
+        # Every company's documents stream through one pipeline, sharing the compiled template and the converter
+        documents = [document for job in jobs for document in
+                     build_filenames(merge_range_and_data(job.periods, job.register), job.output_folder, 'Tax')]
+        raise_for_failures(run_pipeline(jobs[0].template_path, documents, workers=workers), len(documents))
+        return folders
+
+    finish_directories(folders)
+    return folders
+
+
+def run_batch(jobs: List[BatchJob], workers: int = 1, backend: str = 'excel') -> List[Path]:
+    """
+    Produce the period outputs of many companies, grouping them by template so each
+    template and office backend is opened once per group.
+
+    Args:
+        jobs: One job per company.
+        workers: The number of processes used for rendering Word templates.
+        backend: 'excel' or 'headless' for the Excel templates.
+
+    Returns:
+        The result folders, in the order of the jobs.
+
+    Raises:
+        ValueError: If a job has no template; nothing is run then.
+        RenderError: If documents of Word templates failed, once every group has run; lists the
+            failures of all groups.
+    """
+    from ._render import RenderError, raise_for_failures
+
+    untemplated = [str(job.register.get('CN')) for job in jobs if job.template is None]
+    if untemplated:
+        raise ValueError(f'No template for {", ".join(untemplated)}')
+    ordered = sorted(jobs, key=lambda job: job.template)
+    failures, total = [], 0
+    for template, group in groupby(ordered, key=lambda job: job.template):
+        group = list(group)
+        with span('batch group', 'stage', template=template, companies=len(group)):
+            try:
+                run_template_group(template, group, workers=workers, backend=backend)
+            except RenderError as error:
+                # The other groups still run, like the Excel groups whose failures are only logged
+                logging.error(f'Template {template}: {len(error.failures)} of {error.total} documents failed')
+                failures.extend(error.failures)
+                total += error.total
+    raise_for_failures(failures, total)
+    return [job.output_folder for job in jobs]
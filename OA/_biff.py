@@ -0,0 +1,483 @@
+# -*- coding: utf-8 -*-
+
+import bisect
+import math
+import re
+import struct
+from datetime import date, datetime, time
+from functools import lru_cache
+from pathlib import Path
+from typing import Any, Dict, List, Tuple, Union
+
+# Compound File Binary constants
+CFB_SIGNATURE = b'\xd0\xcf\x11\xe0\xa1\xb1\x1a\xe1'
+FREESECT = 0xFFFFFFFF
+ENDOFCHAIN = 0xFFFFFFFE
+FATSECT = 0xFFFFFFFD
+DIFSECT = 0xFFFFFFFC
+DIRECTORY_ENTRY_SIZE = 128
+HEADER_DIFAT_ENTRIES = 109
+
+# BIFF8 record types
+BOF, EOF, BOUNDSHEET, NAME, EXTERNSHEET, DATEMODE = 0x0809, 0x000A, 0x0085, 0x0018, 0x0017, 0x0022
+INDEX, DBCELL, ROW = 0x020B, 0x00D7, 0x0208
+BLANK, NUMBER, LABEL, BOOLERR, RK, LABELSST = 0x0201, 0x0203, 0x0204, 0x0205, 0x027E, 0x00FD
+FORMULA, STRING, MULRK, MULBLANK = 0x0006, 0x0207, 0x00BD, 0x00BE
+SINGLE_CELL_RECORDS = (BLANK, NUMBER, LABEL, BOOLERR, RK, LABELSST, FORMULA)
+
+# Size of a ROW record including its header
+ROW_RECORD_SIZE = 20
+# Longest string a LABEL record can hold
+MAX_LABEL_LENGTH = 255
+
+CELL_REF_PATTERN = re.compile(r'^\$?([A-Z]{1,3})\$?(\d+)$')
+
+
+def parse_ref(ref: str) -> List[Tuple[int, int]]:
+    """
+    Converts an A1-style cell or range reference to zero-based (row, col) pairs.
+
+    Args:
+        ref: A reference such as 'D3' or 'K3:M3'.
+
+    Returns:
+        The cells covered by the reference, or an empty list if it is not a reference.
+    """
+    corners = []
+    for part in ref.upper().split(':'):
+        match = CELL_REF_PATTERN.match(part)
+        if match is None:
+            return []
+        col = 0
+        for char in match.group(1):
+            col = col * 26 + ord(char) - ord('A') + 1
+        corners.append((int(match.group(2)) - 1, col - 1))
+    (row1, col1), (row2, col2) = corners[0], corners[-1]
+    return [(row, col) for row in range(row1, row2 + 1) for col in range(col1, col2 + 1)]
+
+
+class CompoundFile:
+    """
+    A Compound File Binary (OLE2) container whose largest stream can be replaced in a copy.
+
+    Only the sectors of the replaced stream, the FAT, the DIFAT and its directory entry change;
+    every other byte of the original file is copied as-is.
+
+    Args:
+        data: The content of the container.
+        stream_name: The name of the stream to expose, e.g. 'Workbook'.
+    """
+
+    def __init__(self, data: bytes, stream_name: str):
+        if data[:8] != CFB_SIGNATURE:
+            raise ValueError('Not a Compound File Binary document')
+        self.data = data
+        self.sector_size = 1 << struct.unpack_from('<H', data, 0x1E)[0]
+        (self.fat_count, self.dir_start, _, self.mini_cutoff,
+         _, _, self.difat_start, self.difat_count) = struct.unpack_from('<8I', data, 0x2C)
+
+        self.fat_sectors = self._read_difat()
+        self.fat = list(struct.unpack_from(
+            f'<{len(self.fat_sectors) * self.sector_size // 4}I',
+            b''.join(self._sector(sector) for sector in self.fat_sectors)))
+
+        self.entry_offset, start, self.stream_size = self._find_entry(stream_name)
+        if self.stream_size < self.mini_cutoff:
+            raise ValueError(f'Stream {stream_name} is stored in the mini stream')
+        self.chain = self._chain(start)
+
+    def _sector(self, sector: int) -> bytes:
+        offset = (sector + 1) * self.sector_size
+        return self.data[offset:offset + self.sector_size]
+
+    def _read_difat(self) -> List[int]:
+        entries = list(struct.unpack_from(f'<{HEADER_DIFAT_ENTRIES}I', self.data, 0x4C))
+        self.difat_sectors = []
+        sector = self.difat_start
+        for _ in range(self.difat_count):
+            self.difat_sectors.append(sector)
+            block = struct.unpack(f'<{self.sector_size // 4}I', self._sector(sector))
+            entries.extend(block[:-1])
+            sector = block[-1]
+        return entries[:self.fat_count]
+
+    def _chain(self, start: int) -> List[int]:
+        chain = []
+        while start not in (ENDOFCHAIN, FREESECT):
+            chain.append(start)
+            start = self.fat[start]
+        return chain
+
+    def _find_entry(self, stream_name: str) -> Tuple[int, int, int]:
+        for sector in self._chain(self.dir_start):
+            base = (sector + 1) * self.sector_size
+            for offset in range(base, base + self.sector_size, DIRECTORY_ENTRY_SIZE):
+                length = struct.unpack_from('<H', self.data, offset + 64)[0]
+                name = self.data[offset:offset + max(length - 2, 0)].decode('utf-16-le', 'ignore')
+                if name == stream_name:
+                    start, size = struct.unpack_from('<II', self.data, offset + 116)
+                    return offset, start, size
+        raise KeyError(f'Stream not found: {stream_name}')
+
+    def read_stream(self) -> bytes:
+        """Returns the content of the exposed stream."""
+        return b''.join(self._sector(sector) for sector in self.chain)[:self.stream_size]
+
+    def replace_stream(self, stream: bytes) -> bytearray:
+        """
+        Builds a copy of the container with new content for the exposed stream.
+
+        Args:
+            stream: The new stream content.
+
+        Returns:
+            The new container bytes.
+        """
+        size = self.sector_size
+        out = bytearray(self.data)
+        out.extend(b'\0' * (-len(out) % size))
+        fat, fat_sectors, chain = list(self.fat), list(self.fat_sectors), list(self.chain)
+        difat_sectors = list(self.difat_sectors)
+        # FAT sector numbers held by one DIFAT sector; its last entry links to the next one
+        per_difat = size // 4 - 1
+        needed = max(math.ceil(len(stream) / size), 1)
+
+        if needed < len(chain):
+            # Release the sectors that are no longer used
+            for sector in chain[needed:]:
+                fat[sector] = FREESECT
+            chain = chain[:needed]
+        else:
+            # Append new sectors at the end of the file, growing the FAT when it is full and the DIFAT
+            # when the header and the DIFAT sectors hold no more FAT sector numbers
+            next_sector = len(out) // size - 1
+            while len(chain) < needed:
+                if next_sector >= len(fat):
+                    fat.extend([FREESECT] * (size // 4))
+                    fat[next_sector] = FATSECT
+                    fat_sectors.append(next_sector)
+                elif len(fat_sectors) > HEADER_DIFAT_ENTRIES + len(difat_sectors) * per_difat:
+                    fat[next_sector] = DIFSECT
+                    difat_sectors.append(next_sector)
+                else:
+                    if chain:
+                        fat[chain[-1]] = next_sector
+                    chain.append(next_sector)
+                next_sector += 1
+            out.extend(b'\0' * ((next_sector + 1) * size - len(out)))
+        fat[chain[-1]] = ENDOFCHAIN
+
+        # Copy the stream into its sectors, one contiguous run at a time
+        run_start = 0
+        for index in range(1, len(chain) + 1):
+            if index == len(chain) or chain[index] != chain[index - 1] + 1:
+                offset = (chain[run_start] + 1) * size
+                piece = stream[run_start * size:index * size]
+                out[offset:offset + len(piece)] = piece
+                run_start = index
+
+        # Directory entry: start sector and size
+        struct.pack_into('<II', out, self.entry_offset + 116, chain[0], len(stream))
+        # FAT sectors, the header DIFAT and the DIFAT sectors
+        packed = struct.pack(f'<{len(fat)}I', *fat)
+        for index, sector in enumerate(fat_sectors):
+            offset = (sector + 1) * size
+            out[offset:offset + size] = packed[index * size:(index + 1) * size]
+        header = fat_sectors[:HEADER_DIFAT_ENTRIES]
+        struct.pack_into('<I', out, 0x2C, len(fat_sectors))
+        struct.pack_into(f'<{HEADER_DIFAT_ENTRIES}I', out, 0x4C,
+                         *header, *[FREESECT] * (HEADER_DIFAT_ENTRIES - len(header)))
+        struct.pack_into('<II', out, 0x44, difat_sectors[0] if difat_sectors else ENDOFCHAIN, len(difat_sectors))
+        for index, sector in enumerate(difat_sectors):
+            start = HEADER_DIFAT_ENTRIES + index * per_difat
+            entries = fat_sectors[start:start + per_difat]
+            entries += [FREESECT] * (per_difat - len(entries))
+            link = difat_sectors[index + 1] if index + 1 < len(difat_sectors) else ENDOFCHAIN
+            struct.pack_into(f'<{per_difat + 1}I', out, (sector + 1) * size, *entries, link)
+        return out
+
+
+class BiffTemplate:
+    """
+    An XLS (BIFF8) workbook template whose cells are patched in the record stream, without an Excel process.
+
+    The template is parsed once: defined names are resolved to cells and the records of the first
+    worksheet are indexed. :meth:`save` replaces only the records of the target cells, fixes the
+    stream offsets that depend on them (BOUNDSHEET, INDEX, DBCELL) and writes a copy of the file.
+
+    Args:
+        fullname: The path to the template workbook.
+    """
+
+    def __init__(self, fullname: Union[str, Path]):
+        self.fullname = Path(fullname)
+        self.container = CompoundFile(self.fullname.read_bytes(), 'Workbook')
+        self.stream = self.container.read_stream()
+        self.datemode = 0
+        self.sheets: List[int] = []
+        self.sheet_fields: List[int] = []
+        self.names: Dict[Tuple[str, int], List[Tuple[int, int]]] = {}
+        self._parse_globals()
+        self._parse_sheets()
+
+    def _records(self, position: int):
+        """Yields (position, type, length) for the records of a substream, up to its EOF."""
+        stream = self.stream
+        while position < len(stream):
+            record_type, length = struct.unpack_from('<HH', stream, position)
+            yield position, record_type, length
+            if record_type == EOF:
+                return
+            position += 4 + length
+
+    def _parse_globals(self) -> None:
+        stream, sheets, names, externs = self.stream, [], [], []
+        for position, record_type, length in self._records(0):
+            data = stream[position + 4:position + 4 + length]
+            if record_type == BOUNDSHEET:
+                self.sheet_fields.append(position + 4)
+                sheets.append(struct.unpack_from('<I', data)[0])
+            elif record_type == DATEMODE:
+                self.datemode = struct.unpack_from('<H', data)[0]
+            elif record_type == EXTERNSHEET:
+                count = struct.unpack_from('<H', data)[0]
+                externs = [struct.unpack_from('<HHH', data, 2 + 6 * i)[1] for i in range(count)
+                           if 2 + 6 * (i + 1) <= len(data)]
+            elif record_type == NAME:
+                names.append(data)
+        self.sheets = sheets
+
+        for data in names:
+            try:
+                self._parse_name(data, externs)
+            except (struct.error, IndexError, UnicodeDecodeError):
+                # Names with formulas other than a plain 3D reference are not needed
+                continue
+
+    def _parse_name(self, data: bytes, externs: List[int]) -> None:
+        flags, _, cch, cce, _, itab = struct.unpack_from('<HBBHHH', data)
+        if flags & 0x20:  # Built-in name such as Print_Area
+            return
+        high_byte = data[14] & 0x01
+        end = 15 + cch * (2 if high_byte else 1)
+        name = data[15:end].decode('utf-16-le' if high_byte else 'latin-1')
+        rgce = data[end:end + cce]
+
+        ptg = rgce[0] & 0x1F | 0x20
+        if ptg == 0x3A and cce == 7:  # ptgRef3d
+            ixti, row, col = struct.unpack_from('<HHH', rgce, 1)
+            rows, cols = (row, row), (col & 0x3FFF, col & 0x3FFF)
+        elif ptg == 0x3B and cce == 11:  # ptgArea3d
+            ixti, row1, row2, col1, col2 = struct.unpack_from('<HHHHH', rgce, 1)
+            rows, cols = (row1, row2), (col1 & 0x3FFF, col2 & 0x3FFF)
+        else:
+            return
+        sheet = externs[ixti]
+        cells = [(row, col) for row in range(rows[0], rows[1] + 1) for col in range(cols[0], cols[1] + 1)]
+        # itab 0 is a workbook-wide name, otherwise the 1-based index of the owning sheet
+        self.names[(name, itab - 1)] = [(sheet, row, col) for row, col in cells]
+
+    def _parse_sheets(self) -> None:
+        """Indexes the first worksheet and collects the INDEX records of the later ones."""
+        stream = self.stream
+        self.cells: Dict[Tuple[int, int], Tuple[int, int, int]] = {}
+        self.index_fields: List[int] = []
+        self.dbcells: List[Tuple[int, int, List[int]]] = []
+
+        records = list(self._records(self.sheets[0]))
+        for number, (position, record_type, length) in enumerate(records):
+            if record_type in SINGLE_CELL_RECORDS:
+                row, col = struct.unpack_from('<HH', stream, position + 4)
+                end = position + 4 + length
+                if record_type == FORMULA and records[number + 1][1] == STRING:
+                    # The cached string result belongs to the formula
+                    end = records[number + 1][0] + 4 + records[number + 1][2]
+                self.cells[(row, col)] = (position, end, record_type)
+            elif record_type in (MULBLANK, MULRK):
+                row, first = struct.unpack_from('<HH', stream, position + 4)
+                last = struct.unpack_from('<H', stream, position + 4 + length - 2)[0]
+                for col in range(first, last + 1):
+                    self.cells[(row, col)] = (position, position + 4 + length, record_type)
+            elif record_type == DBCELL:
+                first_row = position - struct.unpack_from('<I', stream, position + 4)[0]
+                offsets = struct.unpack_from(f'<{(length - 4) // 2}H', stream, position + 8)
+                cursor, targets = first_row + ROW_RECORD_SIZE, []
+                for offset in offsets:
+                    cursor += offset
+                    targets.append(cursor)
+                self.dbcells.append((position, first_row, targets))
+
+        # Absolute stream positions held by INDEX records, in every worksheet
+        for sheet in self.sheets:
+            for position, record_type, length in self._records(sheet):
+                if record_type == INDEX:
+                    self.index_fields.append(position + 16)  # ibXF
+                    self.index_fields.extend(range(position + 20, position + 4 + length, 4))  # rgibRw
+                    break
+
+    def resolve(self, key: str) -> List[Tuple[int, int]]:
+        """
+        Resolves a defined name or an A1 reference to cells of the first worksheet.
+
+        Args:
+            key: The name or reference.
+
+        Returns:
+            The zero-based (row, col) cells.
+
+        Raises:
+            KeyError: If the key is neither a name referring to the first worksheet nor a reference.
+        """
+        for scope in (0, -1):
+            cells = self.names.get((key, scope))
+            if cells is not None and all(sheet == 0 for sheet, _, _ in cells):
+                return [(row, col) for _, row, col in cells]
+        cells = parse_ref(key)
+        if not cells:
+            raise KeyError(f'Name not found in {self.fullname.name}: {key}')
+        return cells
+
+    def encode_value(self, value: Any) -> Tuple[int, bytes]:
+        """
+        Encodes a Python value as the type and payload of a cell record (after row, col and ixfe).
+
+        Dates are written as serial numbers so the cell's own date format applies.
+        """
+        if value is None:
+            return BLANK, b''
+        if isinstance(value, bool):
+            return BOOLERR, struct.pack('<BB', int(value), 0)
+        if isinstance(value, (date, datetime)):
+            epoch = datetime(1904, 1, 1) if self.datemode else datetime(1899, 12, 30)
+            value = value if isinstance(value, datetime) else datetime.combine(value, time())
+            return NUMBER, struct.pack('<d', (value - epoch).total_seconds() / 86400)
+        if isinstance(value, (int, float)):
+            return NUMBER, struct.pack('<d', value)
+
+        text = str(value)
+        if len(text) > MAX_LABEL_LENGTH:
+            raise ValueError(f'Text longer than {MAX_LABEL_LENGTH} characters: {text[:20]}...')
+        try:
+            return LABEL, struct.pack('<HB', len(text), 0) + text.encode('latin-1')
+        except UnicodeEncodeError:
+            return LABEL, struct.pack('<HB', len(text), 1) + text.encode('utf-16-le')
+
+    @staticmethod
+    def cell_record(record_type: int, row: int, col: int, ixfe: int, payload: bytes) -> bytes:
+        body = struct.pack('<HHH', row, col, ixfe) + payload
+        return struct.pack('<HH', record_type, len(body)) + body
+
+    def _replacement(self, start: int, end: int, record_type: int, values: Dict[Tuple[int, int], Any]) -> bytes:
+        """Builds the records replacing one original record for the given cell values."""
+        stream = self.stream
+        if record_type not in (MULBLANK, MULRK):
+            (row, col), = values
+            ixfe = struct.unpack_from('<H', stream, start + 8)[0]
+            kind, payload = self.encode_value(values[(row, col)])
+            return self.cell_record(kind, row, col, ixfe, payload)
+
+        # Split a MULBLANK/MULRK record into single-cell records
+        row, first = struct.unpack_from('<HH', stream, start + 4)
+        last = struct.unpack_from('<H', stream, end - 2)[0]
+        width = 2 if record_type == MULBLANK else 6
+        records = []
+        for index, col in enumerate(range(first, last + 1)):
+            offset = start + 8 + index * width
+            ixfe = struct.unpack_from('<H', stream, offset)[0]
+            if (row, col) in values:
+                kind, payload = self.encode_value(values[(row, col)])
+            elif record_type == MULBLANK:
+                kind, payload = BLANK, b''
+            else:
+                kind, payload = RK, stream[offset + 2:offset + 6]
+            records.append(self.cell_record(kind, row, col, ixfe, payload))
+        return b''.join(records)
+
+    def render(self, register: Dict[str, Any]) -> bytes:
+        """
+        Builds the Workbook stream with the register values written to their cells.
+
+        Args:
+            register: Values keyed by defined name or A1 reference. A value is written to every cell the key covers.
+
+        Returns:
+            The new Workbook stream.
+        """
+        grouped: Dict[Tuple[int, int, int], Dict[Tuple[int, int], Any]] = {}
+        for key, value in register.items():
+            for cell in self.resolve(key):
+                record = self.cells.get(cell)
+                if record is None:
+                    raise KeyError(f'Cell {cell} of {key} has no record in {self.fullname.name}')
+                grouped.setdefault(record, {})[cell] = value
+
+        patches = sorted((start, end, self._replacement(start, end, record_type, values))
+                         for (start, end, record_type), values in grouped.items())
+        starts = [start for start, _, _ in patches]
+        shifts = [0]
+        for start, end, data in patches:
+            shifts.append(shifts[-1] + len(data) - (end - start))
+
+        def moved(position: int) -> int:
+            # Records starting at or before a patch keep their place relative to it
+            return position + shifts[bisect.bisect_left(starts, position)]
+
+        stream = bytearray(self.stream)
+        for field in self.sheet_fields + self.index_fields:
+            struct.pack_into('<I', stream, field, moved(struct.unpack_from('<I', stream, field)[0]))
+        for position, first_row, targets in self.dbcells:
+            struct.pack_into('<I', stream, position + 4, moved(position) - moved(first_row))
+            cursor = moved(first_row) + ROW_RECORD_SIZE
+            for index, target in enumerate(targets):
+                struct.pack_into('<H', stream, position + 8 + 2 * index, moved(target) - cursor)
+                cursor = moved(target)
+
+        pieces, cursor = [], 0
+        for start, end, data in patches:
+            pieces.extend((stream[cursor:start], data))
+            cursor = end
+        pieces.append(stream[cursor:])
+        return b''.join(pieces)
+
+    def save(self, register: Dict[str, Any], path: Union[str, Path]) -> Path:
+        """
+        Writes a copy of the template with the register values.
+
+        Args:
+            register: Values keyed by defined name or A1 reference.
+            path: The output path.
+
+        Returns:
+            The output path.
+        """
+        path = Path(path)
+        path.write_bytes(self.render_file(register))
+        return path
+
+    def render_file(self, register: Dict[str, Any]) -> bytes:
+        """
+        Builds a copy of the template with the register values.
+
+        Args:
+            register: Values keyed by defined name or A1 reference.
+
+        Returns:
+            The workbook file content.
+        """
+        return self.container.replace_stream(self.render(register))
+
+
+@lru_cache(maxsize=4)
+def _load(fullname: Path, mtime: int) -> BiffTemplate:
+    return BiffTemplate(fullname)
+
+
+def load_biff_template(fullname: Union[str, Path]) -> BiffTemplate:
+    """
+    Returns the parsed template for a path, parsing it again only when the file changes.
+
+    Args:
+        fullname: The path to the template workbook.
+    """
+    fullname = Path(fullname).resolve()
+    return _load(fullname, fullname.stat().st_mtime_ns)
@@ -5,10 +5,10 @@ import os
 import shutil
 from functools import wraps
 from pathlib import Path
-from typing import List, Tuple, NoReturn
+from typing import List, Tuple
 
-from PyPDF2 import PdfWriter
-from more_itertools import only
+from ._manifest import Manifest
+from ._trace import count, span
 
 # Set up basic configuration for logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
@@ -59,78 +59,109 @@ def get_dst_index_by_suffix(suffix: str) -> int:
     return dst_index
 
 
-def move_file_to_dst(file: Path, dst_dir_fd: Path) -> None:
+def categorized_path(src_dir_fd: Path, name: str, dst_dir_fds: Tuple[str] = DIRECTORY_NAMES) -> Path:
     """
-    Move a file to the target directory.
+    Return where categorize_files files an output of the source directory.
+    :param src_dir_fd: Path to the source directory.
+    :param name: The output file name.
+    :param dst_dir_fds: Tuple of folder names used for categorization.
+    :return: The path of the file once categorized.
+    """
+    dst_index = get_dst_index_by_suffix(Path(name).suffix.lower())
+    return src_dir_fd / name if dst_index is None else src_dir_fd / dst_dir_fds[dst_index] / name
+
+
+def placed_path(filename: Path) -> Path:
+    """
+    Return where an output of a result folder is written: straight into its PDF, Word or Excel folder.
+    :param filename: The output path directly inside the result folder.
+    :return: The path of the file in its folder.
+    """
+    return categorized_path(filename.parent, filename.name)
+
+
+def pdf_path(document: Path) -> Path:
+    """
+    Return where the PDF of a document goes: the PDF folder beside the Word folder holding it, otherwise next to it.
+    :param document: The document to convert.
+    :return: The path of the PDF.
+    """
+    if document.parent.name in DIRECTORY_NAMES:
+        return categorized_path(document.parent.parent, document.with_suffix('.pdf').name)
+    return document.with_suffix('.pdf')
+
+
+def move_file_to_dst(file: Path, dst_dir_fd: Path) -> bool:
+    """
+    Move a file to the target directory, replacing an earlier version of it.
     :param file: Path to the file to move.
     :param dst_dir_fd: Path to the target directory.
+    :return: True if the file was moved.
     """
     try:
-        # Move file using shutil.move, setting copy_function to os.rename for renaming-based movement
-        shutil.move(file, dst_dir_fd / file.name, copy_function=os.rename)
+        # Rename within the result folder; os.replace overwrites the previous run's file on every platform
+        with span('move', 'document', file=file.name):
+            try:
+                os.replace(file, dst_dir_fd / file.name)
+            except OSError:
+                # Fall back to a copy when the folders are on different devices
+                shutil.move(file, dst_dir_fd / file.name)
+        count('files.moved')
         # Log information if the file is successfully moved
         logging.info(f'{file} moved to {dst_dir_fd} folder')
+        return True
     except Exception as e:
         # Log error if an exception occurs during the move
         logging.error(f'Error moving {file} to {dst_dir_fd.stem} folder: {e}')
+        return False
 
 
-def create_merged_pdf_dir(src_dir: Path) -> Path:
+def iter_pdf_files(src_directory: Path) -> List[Path]:
     """
-    Create a directory for merged PDFs.
-    :param src_dir: Path to the source directory.
-    :return: Path to the merged PDF directory.
+    Collect the PDF files to merge from the manifest of the source directory, or in a single walk of it.
+    :param src_directory: Path to the directory containing PDF files.
+    :return: Sorted list of PDF paths, excluding earlier merge results.
     """
-    # Create the path for the merged PDF directory
-    merged_pdf_dir = src_dir / MERGED_PDF_FOLDER_NAME
-    merged_pdf_dir.mkdir(parents=True, exist_ok=True)
-    return merged_pdf_dir
+    listed = Manifest(src_directory).files('.pdf')
+    if listed is not None:
+        return listed
+    return sorted(pdf_path for pdf_path in src_directory.rglob('*.pdf')
+                  if MERGED_PDF_FOLDER_NAME not in pdf_path.relative_to(src_directory).parts)
 
 
-def merge_and_write_pdf_files(src_directory: Path) -> NoReturn:
+def merged_is_current(src_directory: Path, pdf_files: List[Path]) -> bool:
     """
-    Merge multiple PDF files in a directory and write the merged file.
-    :param src_directory: Path to the directory containing PDF files to merge.
-    :return: None
+    Return whether the merged PDF of a directory is newer than every PDF file merged into it.
+    :param src_directory: Path to the directory containing PDF files.
+    :param pdf_files: The PDF files to merge.
+    :return: True if the merged PDF exists and is current.
     """
-    # Create the directory for merged PDFs
-    merged_pdf_path = create_merged_pdf_dir(src_directory)
-    # Create a PDF merger
-    merger = PdfWriter()
-    # Set the path for the target PDF
-    target_pdf_path = merged_pdf_path / 'Merged_Pdf.pdf'
+    merged_pdf_dir = src_directory / MERGED_PDF_FOLDER_NAME
+    merged = [file.stat().st_mtime_ns for file in merged_pdf_dir.glob('*.pdf')] if merged_pdf_dir.is_dir() else []
+    return bool(merged) and max((file.stat().st_mtime_ns for file in pdf_files), default=0) <= min(merged)
 
-    try:
-        # Iterate and add all PDF files
-        for pdf_path in sorted(src_directory.rglob('*.pdf')):
-            merger.append(pdf_path)
-        # Write the merged PDF file
-        merger.write(target_pdf_path)
-        logging.info(f'Merged PDF file created at {target_pdf_path}')
 
-    except Exception as error:
-        logging.error(f'Error merging PDFs: {error}')
-        raise
-    finally:
-        # Close the merger
-        merger.close()
-
-
-def handle_pdf_files(src_directory: str | Path) -> None:
+def handle_pdf_files(src_directory: str | Path, max_pages: int | None = None, max_bytes: int | None = None,
+                     pdf_files: List[Path] | None = None) -> None:
     """
     Handle PDF files in the specified source directory.
     :param src_directory: String or Path object representing the source directory.
+    :param max_pages: Maximum number of pages per merged file. Defaults to MAX_PAGES of OA._pdfmerge: 0, no limit.
+    :param max_bytes: Maximum total input size in bytes per merged file. Defaults to MAX_BYTES of OA._pdfmerge: 0, no limit.
+    :param pdf_files: The PDF files to merge. Defaults to iter_pdf_files(src_directory).
     :return: None
     """
     src_directory = Path(src_directory)  # Make sure src_directory is a Path object
-    pdf_files = src_directory.rglob('*.pdf')  # Get all pdf files
+    if pdf_files is None:
+        pdf_files = iter_pdf_files(src_directory)  # Get all pdf files in one walk
 
-    try:
-        # Attempt to merge PDF files, do not merge if there's only one file
-        _ = only(pdf_files, default=None, too_long=StopIteration)
-    except StopIteration:
-        # If there are multiple PDF files, proceed with merging
-        merge_and_write_pdf_files(src_directory)
+    # Do not merge if there's only one file
+    if len(pdf_files) > 1:
+        # PyPDF2 is only loaded when there is something to merge
+        from ._pdfmerge import merge_and_write_pdf_files
+
+        with span('merge', 'stage', documents=len(pdf_files)):
+            merge_and_write_pdf_files(src_directory, pdf_files=pdf_files, max_pages=max_pages, max_bytes=max_bytes)
     else:
         logging.warning('No additional PDF files')
 
@@ -148,40 +179,67 @@ def remove_empty_dirs(dir_names: list[Path]) -> None:
             logging.info(f'Empty folder {path} has been deleted')
 
 
-def categorize_files(merge=False, dst: tuple = DIRECTORY_NAMES):
+def categorize_directory(src: Path, merge: bool = False, dst: tuple = DIRECTORY_NAMES,
+                         max_pages: int | None = None, max_bytes: int | None = None) -> None:
     """
-    Decorator to categorize files based on their extension and optionally merge PDF files.
+    Move the files of a directory into folders by extension and optionally merge the PDF files.
+    :param src: The directory holding the output files.
     :param merge: A boolean indicating whether to merge the PDF files or not. Defaults to False.
     :param dst: A tuple of directories where the files will be categorized. Defaults to DIRECTORY_NAMES.
+    :param max_pages: Split the merged PDF every max_pages pages. Defaults to MAX_PAGES of OA._pdfmerge: 0, no limit.
+    :param max_bytes: Split the merged PDF every max_bytes bytes of input. Defaults to MAX_BYTES of OA._pdfmerge: 0, no limit.
     :return: None
     """
+    if not src.is_dir():
+        logging.error('Invalid directory dst_path')
+        return
 
-    def decorator(func):
-        @wraps(func)
-        def wrapper(*args, **kwargs):
-            src = func(*args, **kwargs)
-            if not src.is_dir():
-                logging.error('Invalid directory dst_path')
-                return
+    # Create all necessary folders at the beginning
+    dir_names = create_directories(src_dir_fd=src, dst_dir_fds=dst)
 
-            # Create all necessary folders at the beginning
-            dir_names = create_directories(src_dir_fd=src, dst_dir_fds=dst)
+    new_pdf_files = 0
+    with span('categorize_files', 'stage'):
+        for file in src.iterdir():
+            if file.is_file():
+                suffix = file.suffix.lower()
+                dst_index = get_dst_index_by_suffix(suffix)
+                if dst_index is not None and move_file_to_dst(file, dir_names[dst_index]):
+                    new_pdf_files += suffix == '.pdf'
 
-            for file in src.iterdir():
-                if file.is_file():
-                    suffix = file.suffix.lower()
-                    dst_index = get_dst_index_by_suffix(suffix)
-                    if dst_index is not None:
-                        move_file_to_dst(file, dir_names[dst_index])
+    logging.info('All files have been moved to the appropriate folder')
+
+    remove_empty_dirs(dir_names=dir_names)
+
+    if not merge:
+        logging.warning('No more PDF files')
+        return
+
+    # Outputs written straight into the PDF folder are not moved, so their times tell whether they are new
+    pdf_files = iter_pdf_files(src)
+    if not new_pdf_files and merged_is_current(src, pdf_files):
+        # An incremental run without new PDF files leaves the merged PDF as it is
+        logging.info('Merged PDF is current')
+    else:
+        handle_pdf_files(src, max_pages=max_pages, max_bytes=max_bytes, pdf_files=pdf_files)
 
-            logging.info('All files have been moved to the appropriate folder')
 
-            remove_empty_dirs(dir_names=dir_names)
+def categorize_files(merge=False, dst: tuple = DIRECTORY_NAMES, max_pages: int | None = None,
+                     max_bytes: int | None = None):
+    """
+    Decorator to categorize files based on their extension and optionally merge PDF files.
+    :param merge: A boolean indicating whether to merge the PDF files or not. Defaults to False.
+    :param dst: A tuple of directories where the files will be categorized. Defaults to DIRECTORY_NAMES.
+    :param max_pages: Split the merged PDF every max_pages pages. Defaults to MAX_PAGES of OA._pdfmerge: 0, no limit.
+    :param max_bytes: Split the merged PDF every max_bytes bytes of input. Defaults to MAX_BYTES of OA._pdfmerge: 0, no limit.
+    :return: The decorator; the decorated function returns the directory it filed.
+    """
 
-            if merge:
-                handle_pdf_files(src)
-            else:
-                logging.warning('No more PDF files')
+    def decorator(func):
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            src = func(*args, **kwargs)
+            categorize_directory(src, merge=merge, dst=dst, max_pages=max_pages, max_bytes=max_bytes)
+            return src
 
         return wrapper
 
@@ -1,31 +1,84 @@
 # -*- coding: utf-8 -*-
 
+import atexit
 import gc
 import logging
 import os
+import queue
+import shutil
+import socket
+import subprocess
+import tempfile
+import threading
+import time
+from abc import ABC, abstractmethod
+from concurrent.futures import Future
 from contextlib import contextmanager
-from functools import wraps
+from functools import lru_cache, wraps
 from pathlib import Path
+from typing import Dict, Iterable, Iterator, List, Tuple
 
-from win32com import client
+from ._classify_files import pdf_path
+from ._trace import active, carry, count, span, using
 
 # Set up basic configuration for logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 
+# Suffixes of the documents that are converted
+WORD_SUFFIXES = ('.docx', '.doc')
+# Seconds allowed for converting a single document
+DEFAULT_TIMEOUT = 120
+# Seconds allowed for a LibreOffice listener to accept connections
+STARTUP_TIMEOUT = 60
+
+
+@lru_cache(maxsize=None)
+def win32com_client():
+    """
+    Import win32com.client on first use, or return None when not running on Windows.
+    """
+    try:
+        from win32com import client
+    except ImportError:  # Not running on Windows
+        return None
+    return client
+
+
+@lru_cache(maxsize=None)
+def uno_bindings():
+    """
+    Import the LibreOffice Python bindings on first use.
+
+    :return: The uno module and the PropertyValue struct, or None when the bindings are not installed.
+    """
+    try:
+        import uno
+        from com.sun.star.beans import PropertyValue
+    except ImportError:  # LibreOffice Python bindings are not installed
+        return None
+    return uno, PropertyValue
+
 
 @contextmanager
 def open_word_application():
     """
-    Context manager for opening Word applications
+    Context manager for opening Word applications.
+
+    A failure to start Word, or to initialise COM, is raised to the caller.
     """
     word = None
+    # COM must be initialised in every thread that drives Word, not only the main thread;
+    # without pywin32 the ImportError is raised before anything needs releasing
+    import pythoncom
+    pythoncom.CoInitialize()
     try:
-        word = client.DispatchEx("Word.Application")
+        word = win32com_client().DispatchEx("Word.Application")
         word.Visible = False
         word.AutomationSecurity = 3  # Disable macros
         yield word
     except Exception as e:
         logging.error(f"An error occurred while working with Word.Application: {e}")
+        raise
     finally:
         if word is not None:
             try:
@@ -36,6 +89,520 @@ def open_word_application():
                 # Collect garbage to make sure Word.Application properly shuts down
                 word = None
                 gc.collect()
+        pythoncom.CoUninitialize()
+
+
+class Converter(ABC):
+    """
+    Base class for PDF converters.
+
+    A converter is used as a context manager and converts a batch of files with convert_many,
+    or a stream of files with convert_iter.
+    """
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def close(self) -> None:
+        """Release the resources held by the converter."""
+
+    @abstractmethod
+    def convert_iter(self, files: Iterable[Path]) -> Iterator[Tuple[Path, str | None]]:
+        """
+        Convert files to PDF next to the originals, reporting each file as soon as it is done.
+
+        :param files: The files to convert; may be a generator that blocks until the next file exists.
+        :return: An iterator of (file, error message or None) pairs, in completion order.
+        """
+
+    def convert_many(self, files: Iterable[Path]) -> List[Tuple[Path, str]]:
+        """
+        Convert files to PDF next to the originals.
+
+        :param files: The files to convert.
+        :return: A list of (file, error message) pairs for the files that failed.
+        """
+        return [(file, error) for file, error in self.convert_iter(files) if error is not None]
+
+
+def export_with_word(word, file: Path) -> Path:
+    """
+    Export one document to PDF through a running Word application, into the PDF folder if it is filed.
+
+    :param word: The Word.Application COM object.
+    :param file: The document to convert.
+    :return: The path of the PDF.
+    """
+    with span('convert', 'document', file=file.name):
+        # Open Word file
+        doc = word.Documents.Open(file.as_posix(), ReadOnly=True)
+        # Convert the file to PDF and save it as a new file
+        pdf_name = pdf_path(file)
+        doc.ExportAsFixedFormat(str(pdf_name), ExportFormat=17, Item=7, CreateBookmarks=1)
+        doc.Close()
+    count('files.converted')
+    return pdf_name
+
+
+class WordConverter(Converter):
+    """
+    Convert documents through a Word.Application COM server (Windows only).
+    """
+
+    def convert_iter(self, files: Iterable[Path]) -> Iterator[Tuple[Path, str | None]]:
+        with open_word_application() as word:
+            for file in files:
+                try:
+                    pdf_name = export_with_word(word, file)
+                    logging.info(f'Converted {file} to {pdf_name}')
+                except Exception as error:
+                    logging.error(f'Failed to convert {file} to PDF: {error}')
+                    yield file, str(error)
+                else:
+                    yield file, None
+
+
+def find_soffice() -> str | None:
+    """
+    Locate the LibreOffice executable.
+
+    :return: The OA_SOFFICE environment variable, or the first soffice/libreoffice found on PATH.
+    """
+    return os.environ.get('OA_SOFFICE') or shutil.which('soffice') or shutil.which('libreoffice')
+
+
+def free_port() -> int:
+    """
+    Ask the operating system for an unused local TCP port.
+    """
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+class OfficeWorker(threading.Thread):
+    """
+    A thread that owns one headless LibreOffice process and converts jobs from a shared queue.
+
+    With the LibreOffice Python bindings available, the process is started once in listener mode
+    and documents are converted over UNO. Otherwise each document is converted by a one-shot
+    ``soffice --convert-to`` call that reuses the worker's own warm user profile.
+    A conversion that exceeds the timeout kills the process; a crashed process is restarted
+    before the next job.
+
+    :param jobs: The queue of (file, future, tracer) jobs shared by the pool.
+    :param soffice: The LibreOffice executable.
+    :param timeout: Seconds allowed for converting a single document.
+    """
+
+    def __init__(self, jobs: queue.Queue, soffice: str, timeout: float):
+        super().__init__(daemon=True)
+        self.jobs = jobs
+        self.soffice = soffice
+        self.timeout = timeout
+        self.profile = tempfile.TemporaryDirectory(prefix='oa_soffice_')
+        self.process: subprocess.Popen | None = None
+        self.desktop = None
+
+    @property
+    def profile_url(self) -> str:
+        return Path(self.profile.name).as_uri()
+
+    def start_office(self) -> None:
+        """Start the listener process and connect to it."""
+        port = free_port()
+        self.process = subprocess.Popen(
+            [self.soffice, '--headless', '--invisible', '--nologo', '--norestore', '--nodefault',
+             f'-env:UserInstallation={self.profile_url}',
+             f'--accept=socket,host=127.0.0.1,port={port};urp;StarOffice.ComponentContext'],
+            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+        uno, _ = uno_bindings()
+        local = uno.getComponentContext()
+        resolver = local.ServiceManager.createInstanceWithContext('com.sun.star.bridge.UnoUrlResolver', local)
+        deadline = time.monotonic() + STARTUP_TIMEOUT
+        while True:
+            try:
+                context = resolver.resolve(
+                    f'uno:socket,host=127.0.0.1,port={port};urp;StarOffice.ComponentContext')
+                break
+            except Exception:
+                if self.process.poll() is not None or time.monotonic() > deadline:
+                    self.stop_office()
+                    raise RuntimeError('LibreOffice listener failed to start')
+                time.sleep(0.2)
+        self.desktop = context.ServiceManager.createInstanceWithContext('com.sun.star.frame.Desktop', context)
+        logging.info(f'LibreOffice worker listening on port {port}')
+
+    def stop_office(self) -> None:
+        """Terminate the listener process, killing it if it does not exit."""
+        self.desktop = None
+        if self.process is not None and self.process.poll() is None:
+            self.process.terminate()
+            try:
+                self.process.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                self.process.kill()
+        self.process = None
+
+    def convert_with_uno(self, file: Path) -> None:
+        """Convert one document through the listener, killing the process on timeout."""
+        if self.process is None or self.process.poll() is not None:
+            self.start_office()
+
+        _, PropertyValue = uno_bindings()
+        hidden = PropertyValue(Name='Hidden', Value=True)
+        read_only = PropertyValue(Name='ReadOnly', Value=True)
+        pdf_filter = PropertyValue(Name='FilterName', Value='writer_pdf_Export')
+
+        process = self.process
+        watchdog = threading.Timer(self.timeout, process.kill)
+        watchdog.start()
+        try:
+            doc = self.desktop.loadComponentFromURL(file.resolve().as_uri(), '_blank', 0, (hidden, read_only))
+            try:
+                doc.storeToURL(pdf_path(file).resolve().as_uri(), (pdf_filter,))
+            finally:
+                doc.close(True)
+        except Exception:
+            # The bridge is unusable after a crash or a kill; restart on the next job
+            self.stop_office()
+            raise
+        finally:
+            watchdog.cancel()
+
+    def convert_with_cli(self, file: Path) -> None:
+        """Convert one document with a one-shot soffice call using the worker's profile."""
+        # soffice exits with 0 even when it fails to convert, so a PDF left by an earlier run would pass
+        pdf_path(file).unlink(missing_ok=True)
+        subprocess.run(
+            [self.soffice, '--headless', '--invisible', '--nologo', '--norestore',
+             f'-env:UserInstallation={self.profile_url}',
+             '--convert-to', 'pdf', '--outdir', str(pdf_path(file).parent), str(file)],
+            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, timeout=self.timeout, check=True)
+        if not pdf_path(file).exists():
+            raise RuntimeError('LibreOffice did not produce a PDF')
+
+    def run(self) -> None:
+        if uno_bindings() is not None:
+            # The listener is started with the worker, so the first document does not wait for it
+            try:
+                self.start_office()
+            except Exception as error:
+                logging.warning(f'LibreOffice worker failed to start, retrying on the first job: {error}')
+        while True:
+            job = self.jobs.get()
+            try:
+                if job is None:
+                    return
+                file, future, tracer = job
+                if not future.set_running_or_notify_cancel():
+                    continue
+                # Spans and counters go to the run that submitted the job
+                with using(tracer):
+                    try:
+                        with span('convert', 'document', file=file.name):
+                            if uno_bindings() is not None:
+                                self.convert_with_uno(file)
+                            else:
+                                self.convert_with_cli(file)
+                    except Exception as error:
+                        future.set_exception(error)
+                    else:
+                        count('files.converted')
+                        future.set_result(pdf_path(file))
+            finally:
+                self.jobs.task_done()
+
+    def close(self) -> None:
+        self.stop_office()
+        self.profile.cleanup()
+
+
+class WordWorker(threading.Thread):
+    """
+    A thread that owns one Word application and converts jobs from a shared queue.
+
+    Word is driven over COM from this thread only, so a pool of these workers can be fed from any thread
+    and Word stays open between batches. When Word fails to start, the next job fails with that error
+    instead of waiting in the queue, and Word is started again for the job after it.
+
+    :param jobs: The queue of (file, future, tracer) jobs shared by the pool.
+    """
+
+    def __init__(self, jobs: queue.Queue):
+        super().__init__(daemon=True)
+        self.jobs = jobs
+
+    def run(self) -> None:
+        while True:
+            try:
+                with open_word_application() as word:
+                    if self.serve(word):
+                        return
+            except Exception as error:
+                logging.error(f'Word worker failed to start: {error}')
+                if self.fail_next(error):
+                    return
+
+    def serve(self, word) -> bool:
+        """
+        Convert jobs through a running Word application.
+
+        :return: True once the pool has asked the worker to stop.
+        """
+        while True:
+            job = self.jobs.get()
+            try:
+                if job is None:
+                    return True
+                file, future, tracer = job
+                if not future.set_running_or_notify_cancel():
+                    continue
+                with using(tracer):
+                    try:
+                        future.set_result(export_with_word(word, file))
+                    except Exception as error:
+                        future.set_exception(error)
+            finally:
+                self.jobs.task_done()
+
+    def fail_next(self, error: Exception) -> bool:
+        """
+        Fail the next job with the error that stopped Word from starting.
+
+        :return: True if the pool asked the worker to stop instead.
+        """
+        job = self.jobs.get()
+        try:
+            if job is None:
+                return True
+            _, future, _ = job
+            if future.set_running_or_notify_cancel():
+                future.set_exception(error)
+            return False
+        finally:
+            self.jobs.task_done()
+
+    def close(self) -> None:
+        """Word is closed by run when the worker stops."""
+
+
+class WorkerPool(Converter):
+    """
+    A pool of long-lived worker threads converting documents in parallel.
+
+    Jobs go through a bounded queue, so submitting blocks once the workers fall behind.
+
+    :param workers: The number of workers.
+    :param queue_size: The maximum number of pending jobs. Defaults to twice the number of workers.
+    """
+
+    def __init__(self, workers: int, queue_size: int | None = None):
+        self.jobs = queue.Queue(maxsize=queue_size or 2 * workers)
+        self.workers = [self.create_worker() for _ in range(workers)]
+        self.closed = False
+        for worker in self.workers:
+            worker.start()
+
+    @abstractmethod
+    def create_worker(self) -> threading.Thread:
+        """Return a worker thread taking (file, future, tracer) jobs from self.jobs."""
+
+    def submit(self, file: Path) -> Future:
+        """
+        Queue a document for conversion.
+
+        :param file: The document to convert.
+        :return: A future resolving to the path of the PDF.
+        """
+        if self.closed:
+            raise RuntimeError(f'Cannot submit to a closed {type(self).__name__}')
+        future = Future()
+        self.jobs.put((file, future, active()))
+        return future
+
+    def convert_iter(self, files: Iterable[Path]) -> Iterator[Tuple[Path, str | None]]:
+        # A feeder thread submits files as they arrive while completions are yielded here;
+        # submit blocks once the bounded job queue is full, which throttles the producer
+        done = queue.Queue()
+        fed = []
+
+        def feed():
+            try:
+                for file in files:
+                    future = self.submit(file)
+                    future.add_done_callback(lambda future, file=file: done.put((file, future)))
+                    fed.append(file)
+            except BaseException as error:
+                done.put(error)
+            else:
+                done.put(None)
+
+        feeder = threading.Thread(target=carry(feed), daemon=True)
+        feeder.start()
+
+        finished, total, failure = 0, None, None
+        while total is None or finished < total:
+            item = done.get()
+            if item is None or isinstance(item, BaseException):
+                # Every file has been submitted; wait for the remaining completions
+                total, failure = len(fed), item
+                continue
+            file, future = item
+            finished += 1
+            try:
+                pdf_name = future.result()
+                logging.info(f'Converted {file} to {pdf_name}')
+            except Exception as error:
+                logging.error(f'Failed to convert {file} to PDF: {error}')
+                yield file, str(error)
+            else:
+                yield file, None
+        feeder.join()
+        if failure is not None:
+            raise failure
+
+    def close(self) -> None:
+        if self.closed:
+            return
+        self.closed = True
+        for _ in self.workers:
+            self.jobs.put(None)
+        for worker in self.workers:
+            worker.join()
+            worker.close()
+
+
+class OfficePool(WorkerPool):
+    """
+    A pool of long-lived headless LibreOffice workers converting documents in parallel.
+
+    Documents are converted over UNO by listeners that stay up between documents when the LibreOffice
+    Python bindings (the ``uno`` module) are importable, e.g. with the Python shipped with LibreOffice
+    or the python3-uno package. Without them each document starts a one-shot ``soffice --convert-to``
+    process, which pays the LibreOffice startup for every document.
+
+    :param workers: The number of worker processes. Defaults to the number of CPUs.
+    :param timeout: Seconds allowed for converting a single document.
+    :param queue_size: The maximum number of pending jobs. Defaults to twice the number of workers.
+    :param soffice: The LibreOffice executable. Defaults to find_soffice().
+    """
+
+    def __init__(self, workers: int | None = None, timeout: float = DEFAULT_TIMEOUT,
+                 queue_size: int | None = None, soffice: str | None = None):
+        self.soffice = soffice or find_soffice()
+        if self.soffice is None:
+            raise FileNotFoundError('LibreOffice executable not found; set OA_SOFFICE')
+        self.timeout = timeout
+        if uno_bindings() is None:
+            logging.warning('LibreOffice Python bindings not found; every document starts its own soffice process')
+        super().__init__(workers or os.cpu_count() or 1, queue_size)
+
+    def create_worker(self) -> threading.Thread:
+        return OfficeWorker(self.jobs, self.soffice, self.timeout)
+
+
+class WordPool(WorkerPool):
+    """
+    Word applications kept open in worker threads, so conversions skip the Word startup (Windows only).
+
+    :param workers: The number of Word instances. Defaults to 1.
+    :param queue_size: The maximum number of pending jobs. Defaults to twice the number of workers.
+    """
+
+    def __init__(self, workers: int = 1, queue_size: int | None = None):
+        if win32com_client() is None:
+            raise FileNotFoundError('Word automation is not available; install pywin32')
+        super().__init__(workers, queue_size)
+
+    def create_worker(self) -> threading.Thread:
+        return WordWorker(self.jobs)
+
+
+# Process-wide pools, started on first use so the startup cost is paid once
+_shared_pools: Dict[type, WorkerPool] = {}
+_shared_pool_lock = threading.Lock()
+# Keep Word open between runs instead of starting it for each run
+_keep_warm = False
+
+
+def shared(pool_type: type) -> WorkerPool:
+    """
+    Return the process-wide pool of a type, starting it on first use.
+
+    :param pool_type: OfficePool or WordPool.
+    """
+    with _shared_pool_lock:
+        pool = _shared_pools.get(pool_type)
+        if pool is None or pool.closed:
+            pool = _shared_pools[pool_type] = pool_type()
+            atexit.register(pool.close)
+        return pool
+
+
+def shared_pool() -> OfficePool:
+    """
+    Return the process-wide OfficePool, starting it on first use.
+    """
+    return shared(OfficePool)
+
+
+def keep_warm() -> WorkerPool | None:
+    """
+    Start the converter of default_converter now and keep it running between runs, for long-lived processes.
+
+    :return: The started pool, or None when no converter is available.
+    """
+    global _keep_warm
+    _keep_warm = True
+    try:
+        with default_converter() as converter:
+            return converter
+    except FileNotFoundError as error:
+        logging.warning(f'No PDF converter to keep warm: {error}')
+        return None
+
+
+@contextmanager
+def default_converter():
+    """
+    Yield the converter for this platform: Word over COM when available, otherwise the shared LibreOffice pool.
+    """
+    if win32com_client() is not None and not _keep_warm:
+        with WordConverter() as converter:
+            yield converter
+    elif win32com_client() is not None:
+        yield shared(WordPool)
+    else:
+        # The shared pool outlives the batch and is closed at interpreter exit
+        yield shared_pool()
+
+
+def convert_directory(path: Path, converter: Converter | None = None) -> List[Tuple[Path, str]]:
+    """
+    Convert every Word document directly inside a directory to PDF.
+
+    :param path: The directory containing the Word files.
+    :param converter: The converter to use. Defaults to default_converter().
+    :return: A list of (file, error message) pairs for the files that failed.
+    """
+    # Get the list of files to convert
+    files = [file for file in path.iterdir()
+             if not file.name.startswith('~$') and
+             file.suffix.lower() in WORD_SUFFIXES]
+    if not files:
+        # Nothing to start a converter for
+        return []
+
+    with span('convert_to_pdf', 'stage', documents=len(files)):
+        if converter is not None:
+            return converter.convert_many(files)
+        with default_converter() as converter:
+            return converter.convert_many(files)
 
 
 def convert_to_pdf(func):
@@ -73,23 +640,10 @@ def convert_to_pdf(func):
             logging.error('Invalid file path: {}. The path does not point to a directory.'.format(path))
             return
 
-        # Get the list of files to convert
-        files = (file for file in path.iterdir()
-                 if not file.name.startswith('~$') and
-                 file.suffix.lower() in ('.docx', '.doc'))
-
-        with open_word_application() as word:
-            for file in files:
-                try:
-                    # Open Word file
-                    doc = word.Documents.Open(file.as_posix(), ReadOnly=True)
-                    # Convert the file to PDF and save it as a new file
-                    pdf_name = file.with_suffix('.pdf')
-                    doc.ExportAsFixedFormat(str(pdf_name), ExportFormat=17, Item=7, CreateBookmarks=1)
-                    doc.Close()
-                    logging.info(f'Converted {file} to {pdf_name}')
-                except Exception as error:
-                    logging.error(f'Failed to convert {file} to PDF: {error}')
+        try:
+            convert_directory(path)
+        except FileNotFoundError as error:
+            logging.error(f'No PDF converter available: {error}')
         # Return the file directory
         return path
 
@@ -0,0 +1,245 @@
+# -*- coding: utf-8 -*-
+
+import argparse
+import logging
+import os
+import secrets
+import sys
+import tempfile
+import traceback
+from multiprocessing import AuthenticationError
+from multiprocessing.connection import Client, Listener
+from pathlib import Path
+from typing import Any, Dict
+
+# Overrides the address the daemon listens on and the clients connect to
+ADDRESS_ENV = 'OA_DAEMON_ADDRESS'
+# Shared secret authenticating the clients; only the user owning it can submit jobs
+KEY_FILE = Path.home() / '.oa_daemon.key'
+
+
+def default_address() -> str:
+    """
+    Return the address of the daemon: a named pipe on Windows, otherwise a Unix socket in the temp directory.
+    """
+    if os.environ.get(ADDRESS_ENV):
+        return os.environ[ADDRESS_ENV]
+    if sys.platform == 'win32':
+        return r'\\.\pipe\oa_daemon'
+    return os.path.join(tempfile.gettempdir(), f'oa_daemon_{os.getuid()}.sock')
+
+
+def address_family(address: str) -> str:
+    return 'AF_PIPE' if address.startswith('\\\\') else 'AF_UNIX'
+
+
+def auth_key(create: bool = False) -> bytes | None:
+    """
+    Return the key shared by the daemon and its clients.
+
+    :param create: Create the key file if it does not exist.
+    :return: The key, or None if there is none and create is False.
+    """
+    try:
+        return KEY_FILE.read_bytes()
+    except FileNotFoundError:
+        if not create:
+            return None
+    key = secrets.token_hex(32).encode('ascii')
+    # Readable by the owner only
+    fd = os.open(KEY_FILE, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+    with os.fdopen(fd, 'wb') as file:
+        file.write(key)
+    return key
+
+
+def submit(job: Dict[str, Any], address: str | None = None) -> Dict[str, Any]:
+    """
+    Send a job to the daemon and wait for its reply.
+
+    :param job: The job, see Daemon.handle.
+    :param address: The daemon address. Defaults to default_address().
+    :return: The reply of the daemon.
+    :raises ConnectionError: If no daemon is listening at the address.
+    """
+    address = address or default_address()
+    key = auth_key()
+    if key is None:
+        raise ConnectionError('No daemon key; the daemon has never been started')
+    if address_family(address) == 'AF_UNIX' and not os.path.exists(address):
+        raise ConnectionError(f'No daemon listening on {address}')
+    try:
+        connection = Client(address, family=address_family(address), authkey=key)
+    except (AuthenticationError, OSError, EOFError) as error:
+        raise ConnectionError(f'No daemon listening on {address}: {error}') from None
+    with connection:
+        connection.send(job)
+        return connection.recv()
+
+
+def ping(address: str | None = None) -> bool:
+    """
+    Return whether a daemon answers at the address.
+
+    :param address: The daemon address. Defaults to default_address().
+    """
+    try:
+        return submit({'command': 'ping'}, address).get('ok', False)
+    except (ConnectionError, OSError, EOFError):
+        return False
+
+
+def run_local(data, only: bool, workers: int, backend: str) -> Dict[str, Any]:
+    """
+    Run a job in this process and return the reply the daemon would send.
+
+    :param data: The register data, or a list of registers.
+    :param only: Passed to TemplateEngine.
+    :param workers: The number of rendering processes.
+    :param backend: 'excel' or 'headless'.
+    """
+    from .engine import TemplateEngine
+
+    try:
+        report = TemplateEngine(data, only=only, workers=workers, backend=backend).run()
+    except Exception as error:
+        logging.exception(f'Job failed: {error}')
+        return {'ok': False, 'error': str(error), 'traceback': traceback.format_exc()}
+    result = report.result
+    if isinstance(result, (list, tuple)):
+        result = [str(item) for item in result]
+    elif result is not None:
+        result = str(result)
+    return {'ok': True, 'result': result, 'report': report.to_dict()}
+
+
+def run_job(data, only: bool = False, workers: int | None = None, backend: str = 'excel',
+            address: str | None = None) -> Dict[str, Any]:
+    """
+    Run a job through the daemon when one is listening, otherwise in this process.
+
+    :param data: The register data, or a list of registers.
+    :param only: Passed to TemplateEngine.
+    :param workers: The number of rendering processes. Defaults to 1 in the daemon, which renders
+        in its own process with the templates already compiled, and to the CPU count when the
+        job runs locally.
+    :param backend: 'excel' or 'headless'.
+    :param address: The daemon address. Defaults to default_address().
+    :return: {'ok': True, 'result': the result folder(s), 'report': the run report as a dict},
+        or {'ok': False, 'error': message, 'traceback': text}.
+    """
+    job = {'data': data, 'only': only, 'workers': 1 if workers is None else workers, 'backend': backend}
+    try:
+        reply = submit(job, address)
+    except (ConnectionError, OSError, EOFError) as error:
+        logging.info(f'Running locally: {error}')
+        # Without the daemon's warm cache, rendering across processes pays off again
+        return run_local(data, only, (os.cpu_count() or 1) if workers is None else workers, backend)
+    if not reply.get('ok'):
+        logging.error(f"Daemon job failed: {reply.get('error')}")
+    return reply
+
+
+class Daemon:
+    """
+    A long-lived process keeping the OA package, the parsed templates and the converter warm.
+
+    Jobs are handled one at a time in the thread that started the daemon, since the office
+    applications are automated through COM and two runs would compete for the same result folders.
+
+    :param address: The address to listen on. Defaults to default_address().
+    """
+
+    def __init__(self, address: str | None = None):
+        self.address = address or default_address()
+        self.running = False
+
+    def warm_up(self) -> None:
+        """Import the stage modules, compile the Word templates and start the converter."""
+        from . import engine, _pipeline, _vat, _pil  # noqa: F401
+        from ._biff import load_biff_template
+        from ._convert2pdf import keep_warm
+        from ._docxtpl import CACHE_SIZE, TEMPLATE_CACHE
+        from ._pil import TPL_2018, TPL_2019
+        from ._search import template_registry
+
+        for info in template_registry().templates('word')[:CACHE_SIZE]:
+            try:
+                TEMPLATE_CACHE.get(info.path.resolve())
+            except Exception as error:
+                logging.warning(f'Cannot preload template {info.path}: {error}')
+        for template in (TPL_2018, TPL_2019):
+            if template.exists():
+                load_biff_template(template)
+        keep_warm()
+
+    def handle(self, job: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Handle one job.
+
+        :param job: {'command': 'ping'} or {'command': 'shutdown'}, or a run:
+            {'data': registers, 'only': bool, 'workers': int, 'backend': str}.
+        :return: The reply sent back to the client.
+        """
+        command = job.get('command', 'run')
+        if command == 'ping':
+            return {'ok': True, 'pid': os.getpid()}
+        if command == 'shutdown':
+            self.running = False
+            return {'ok': True}
+        if command != 'run' or 'data' not in job:
+            return {'ok': False, 'error': f'Unknown job: {command}'}
+        return run_local(job['data'], job.get('only', False), job.get('workers', 1), job.get('backend', 'excel'))
+
+    def serve(self) -> None:
+        """Accept and handle jobs until a shutdown job arrives."""
+        if ping(self.address):
+            raise RuntimeError(f'A daemon is already listening on {self.address}')
+        family = address_family(self.address)
+        if family == 'AF_UNIX' and os.path.exists(self.address):
+            # Left behind by a daemon that did not shut down cleanly
+            os.unlink(self.address)
+
+        self.warm_up()
+        with Listener(self.address, family=family, authkey=auth_key(create=True)) as listener:
+            logging.info(f'OA daemon listening on {self.address}')
+            self.running = True
+            while self.running:
+                try:
+                    connection = listener.accept()
+                except (AuthenticationError, OSError, EOFError) as error:
+                    # A client that failed to authenticate or went away
+                    logging.warning(f'Rejected connection: {error}')
+                    continue
+                with connection:
+                    try:
+                        job = connection.recv()
+                        connection.send(self.handle(job))
+                    except (OSError, EOFError) as error:
+                        logging.warning(f'Lost connection: {error}')
+        logging.info('OA daemon stopped')
+
+
+def main(argv=None) -> None:
+    parser = argparse.ArgumentParser(prog='python -m OA._daemon',
+                                     description='Keep OA warm and run the jobs submitted by the Excel buttons.')
+    parser.add_argument('--address', help='named pipe or Unix socket to listen on')
+    parser.add_argument('--stop', action='store_true', help='stop the running daemon')
+    parser.add_argument('--ping', action='store_true', help='report whether a daemon is running')
+    args = parser.parse_args(argv)
+
+    if args.stop:
+        try:
+            submit({'command': 'shutdown'}, args.address)
+        except ConnectionError as error:
+            parser.exit(1, f'{error}\n')
+    elif args.ping:
+        alive = ping(args.address)
+        print('running' if alive else 'not running')
+        parser.exit(0 if alive else 1)
+    else:
+        Daemon(args.address).serve()
+
+
+if __name__ == '__main__':
+    main()
@@ -1,9 +1,30 @@
 # -*- coding: utf-8 -*-
 
 import contextlib
+import threading
+from collections import OrderedDict
+from io import BytesIO
 from pathlib import Path
+from typing import Dict, NamedTuple, Optional, Tuple
+from zipfile import ZipFile, ZipInfo
 
+from docx import Document
+from docx.opc.pkgwriter import PackageWriter
 from docxtpl import DocxTemplate
+from jinja2 import Environment
+
+from ._trace import count
+from ._ziputil import RawZipWriter, clone_info, read_raw
+
+# Default number of compiled templates kept in memory
+CACHE_SIZE = 16
+# The private PackageWriter steps write_package drives, as in python-docx 1.x; when a release
+# drops them, templates are saved by DocxTemplate.save without reusing the compressed members
+PACKAGE_WRITER_STEPS = ('_write_content_types_stream', '_write_pkg_rels', '_write_parts')
+REUSE_MEMBERS = all(hasattr(PackageWriter, step) for step in PACKAGE_WRITER_STEPS)
+# Number of compiled Jinja sources and patched XML parts kept per template; a document has a
+# body, headers and footers, so only a template with unusually many parts reaches it
+PART_CACHE_SIZE = 32
 
 
 def get_filename_extension(path: Path):
@@ -21,13 +42,251 @@ def get_filename_extension(path: Path):
     return filename, extension
 
 
+def lru_get(entries: OrderedDict, key, load, maxsize: int = PART_CACHE_SIZE):
+    """
+    Returns the cached value of a key, loading and inserting it if it is missing.
+
+    Parameters:
+    - entries (OrderedDict): The cache, least recently used first.
+    - key: The key.
+    - load (callable): Computes the value of a missing key.
+    - maxsize (int): The number of entries kept.
+    """
+    try:
+        entries.move_to_end(key)
+        return entries[key]
+    except KeyError:
+        value = entries[key] = load()
+        while len(entries) > maxsize:
+            entries.popitem(last=False)
+        return value
+
+
+class CachingEnvironment(Environment):
+    """
+    A Jinja environment that compiles each template source only once.
+
+    docxtpl hands the patched XML of every part to ``from_string`` on each render,
+    so the compiled template is memoized by its source text, keeping the PART_CACHE_SIZE
+    most recently used.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._compiled: OrderedDict[str, object] = OrderedDict()
+
+    def from_string(self, source, globals=None, template_class=None):
+        if globals is not None or template_class is not None or not isinstance(source, str):
+            return super().from_string(source, globals=globals, template_class=template_class)
+        return lru_get(self._compiled, source, lambda: super(CachingEnvironment, self).from_string(source))
+
+
+class TemplateMember(NamedTuple):
+    """A member of the template package: its pristine serialization and its stored bytes."""
+    blob: bytes
+    info: ZipInfo
+    raw: bytes
+
+
+class MemberCollector:
+    """A package writer for python-docx that keeps the serialized members in memory."""
+
+    def __init__(self):
+        self.members: Dict[str, bytes] = {}
+
+    def write(self, pack_uri, blob: bytes) -> None:
+        self.members[pack_uri.membername] = blob
+
+    def close(self) -> None:
+        pass
+
+
+class ReusingPkgWriter:
+    """
+    A package writer for python-docx that copies members unchanged since the template from its
+    stored, already compressed bytes, and compresses only the members that changed.
+
+    Parameters:
+    - pkg_file: The path or binary file to write.
+    - originals (Dict[str, TemplateMember]): The members of the template by member name.
+    """
+
+    def __init__(self, pkg_file, originals: Dict[str, TemplateMember]):
+        self._zipf = RawZipWriter(pkg_file)
+        self.originals = originals
+
+    def write(self, pack_uri, blob: bytes) -> None:
+        name = pack_uri.membername
+        original = self.originals.get(name)
+        if original is not None and original.blob == blob:
+            self._zipf.write_raw(clone_info(original.info), original.raw)
+            count('members.reused')
+        else:
+            self._zipf.writestr(name, blob)
+            count('members.compressed')
+
+    def close(self) -> None:
+        self._zipf.close()
+
+
+def write_package(writer, document) -> None:
+    """
+    Serializes a python-docx document through a package writer, in the order python-docx saves it.
+    Only called when REUSE_MEMBERS is true.
+
+    Parameters:
+    - writer: A MemberCollector or ReusingPkgWriter.
+    - document: The python-docx Document.
+    """
+    package = document.part.package
+    parts = package.parts
+    for part in parts:
+        part.before_marshal()
+    try:
+        PackageWriter._write_content_types_stream(writer, parts)
+        PackageWriter._write_pkg_rels(writer, package.rels)
+        PackageWriter._write_parts(writer, parts)
+    finally:
+        writer.close()
+
+
+class CompiledDocxTemplate(DocxTemplate):
+    """
+    A DocxTemplate that keeps the template package in memory and reuses its compiled form.
+
+    The raw ``.docx`` bytes are read once; every render starts from a pristine document parsed
+    from those bytes, while the patched body XML and the compiled Jinja templates are shared
+    between renders. Saving copies every package member the render left unchanged (styles,
+    fonts, theme, media) from the template's compressed bytes, so only the rendered parts
+    are compressed again.
+
+    A render mutates the instance, so whoever renders and saves a shared instance holds its lock,
+    as docx_tpl_file does.
+
+    Parameters:
+    - path (Path): The path to the template file.
+    - blob (bytes): The raw content of the template file.
+    """
+
+    def __init__(self, path: Path, blob: bytes):
+        super().__init__(path)
+        self.blob = blob
+        self.jinja_env = CachingEnvironment()
+        self._patched: OrderedDict[str, str] = OrderedDict()
+        self.lock = threading.RLock()
+        self._body_xml: Optional[str] = None
+        self._originals: Optional[Dict[str, TemplateMember]] = None
+
+    def init_docx(self, reload: bool = True):
+        if not self.docx or (self.is_rendered and reload):
+            # Parse a pristine copy from memory instead of re-reading the file from disk
+            self.docx = Document(BytesIO(self.blob))
+            self.is_rendered = False
+
+    def patch_xml(self, src_xml):
+        return lru_get(self._patched, src_xml, lambda: super(CompiledDocxTemplate, self).patch_xml(src_xml))
+
+    def build_xml(self, context, jinja_env=None):
+        # The body of a pristine document never changes, so it is serialized and patched once
+        if self._body_xml is None:
+            self._body_xml = self.patch_xml(self.get_xml())
+        return self.render_xml_part(self._body_xml, self.docx._part, context, jinja_env)
+
+    def render(self, context, jinja_env=None, autoescape=False):
+        if jinja_env is None and not autoescape:
+            jinja_env = self.jinja_env
+        super().render(context, jinja_env=jinja_env, autoescape=autoescape)
+
+    @property
+    def originals(self) -> Dict[str, TemplateMember]:
+        """The members of the template, keyed by member name, as python-docx serializes them unrendered."""
+        if self._originals is None:
+            collector = MemberCollector()
+            write_package(collector, Document(BytesIO(self.blob)))
+            originals = {}
+            stream = BytesIO(self.blob)
+            with ZipFile(stream) as archive:
+                infos = archive.infolist()
+            for info in infos:
+                if info.filename in collector.members:
+                    originals[info.filename] = TemplateMember(collector.members[info.filename], info,
+                                                              read_raw(stream, info))
+            self._originals = originals
+        return self._originals
+
+    def save(self, filename, *args, **kwargs):
+        # Saving without rendering must also start from the in-memory copy
+        if not self.is_saved and not self.is_rendered:
+            self.init_docx(reload=False)
+        # Replaced pictures and zip members are rewritten by docxtpl after saving
+        if not REUSE_MEMBERS or args or kwargs or self.pics_to_replace or self.crc_to_new_media \
+                or self.crc_to_new_embedded or self.zipname_to_replace:
+            super().save(filename, *args, **kwargs)
+            return
+        write_package(ReusingPkgWriter(filename, self.originals), self.docx)
+        self.is_saved = True
+
+
+class TemplateCache:
+    """
+    An LRU cache of compiled DOCX templates keyed by path and modification time.
+
+    Parameters:
+    - maxsize (int): The maximum number of templates kept in memory.
+    """
+
+    def __init__(self, maxsize: int = CACHE_SIZE):
+        self.maxsize = maxsize
+        self._entries: OrderedDict[Tuple[Path, int], CompiledDocxTemplate] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, path: Path) -> CompiledDocxTemplate:
+        """
+        Returns the compiled template for the given path, loading it if it is missing or stale.
+
+        Parameters:
+        - path (Path): The resolved path to the template file.
+
+        Returns:
+        - CompiledDocxTemplate: The cached template.
+        """
+        key = (path, path.stat().st_mtime_ns)
+        with self._lock:
+            template = self._entries.get(key)
+            if template is not None:
+                self._entries.move_to_end(key)
+                return template
+
+            # Drop older versions of the same file before inserting the new one
+            for stale in [k for k in self._entries if k[0] == path]:
+                del self._entries[stale]
+
+            template = self._entries[key] = CompiledDocxTemplate(path, path.read_bytes())
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+            return template
+
+    def clear(self) -> None:
+        """Removes all cached templates."""
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+
+# Process-wide template cache
+TEMPLATE_CACHE = TemplateCache()
+
+
 @contextlib.contextmanager
-def docx_tpl_file(path):
+def docx_tpl_file(path, cache: bool = True):
     """
     A context manager for handling a DocxTemplate file.
 
     Parameters:
     - path (Path): The path to the template file.
+    - cache (bool): Whether to reuse a compiled template from TEMPLATE_CACHE. Defaults to True.
 
     Raises:
     - ValueError: If the file is not a .docx file.
@@ -35,7 +294,8 @@ def docx_tpl_file(path):
     - RuntimeError: For other errors, preventing sensitive information leakage.
 
     Yields:
-    - DocxTemplate: A DocxTemplate object for the file.
+    - DocxTemplate: A DocxTemplate object for the file. A cached template is locked for the block,
+      so threads sharing it render and save one at a time.
     """
     full_path = path.resolve()
     filename, ext = get_filename_extension(full_path)
@@ -45,9 +305,13 @@ def docx_tpl_file(path):
         raise ValueError(f"Invalid file type: {filename}. Only .docx files are supported.")
 
     try:
-        # Create a DocxTemplate object from the template file
-        docx = DocxTemplate(full_path)
-        yield docx
+        # Reuse the compiled template, or create a DocxTemplate object from the template file
+        if cache:
+            docx = TEMPLATE_CACHE.get(full_path)
+            with docx.lock:
+                yield docx
+        else:
+            yield DocxTemplate(full_path)
     except FileNotFoundError:
         raise FileNotFoundError(f"File not found: {full_path}")
     except Exception as error:
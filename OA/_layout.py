@@ -0,0 +1,96 @@
+# -*- coding: utf-8 -*-
+
+import os
+import re
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Tuple
+
+# The directory result folders are created in; defaults to the Desktop
+OUTPUT_ROOT_ENV = 'OA_OUTPUT_ROOT'
+# The shard folders between the root and a result folder, separated by '/', e.g. 'template/company'
+OUTPUT_LAYOUT_ENV = 'OA_OUTPUT_LAYOUT'
+
+# template: the template name; company: the unified social credit code; period: the years of the run
+SHARD_KEYS = ('template', 'company', 'period')
+# Shard folder for runs without the value a shard key needs
+UNKNOWN = '_'
+# Characters kept in shard folder names; create_result_folder accepts the same set
+UNSAFE = re.compile(r'[^a-zA-Z0-9\-_（）\u4e00-\u9fa5]')
+
+
+def output_root() -> Path:
+    """Return the directory configured through OA_OUTPUT_ROOT, or the Desktop."""
+    root = os.environ.get(OUTPUT_ROOT_ENV)
+    return Path(root).expanduser() if root else Path.home() / 'Desktop'
+
+
+def shard_name(value: Any) -> str:
+    """
+    Return a folder name for a shard value.
+
+    :param value: The template name, credit code or period label.
+    """
+    name = UNSAFE.sub('_', str(value).strip()) if value not in (None, '') else ''
+    return name or UNKNOWN
+
+
+def period_label(timeseries) -> str | None:
+    """
+    Return the years a run covers, e.g. '2024' or '2023-2024'.
+
+    :param timeseries: An object with Start and End dates, or None.
+    """
+    start, end = getattr(timeseries, 'Start', None), getattr(timeseries, 'End', None)
+    if not hasattr(start, 'year') or not hasattr(end, 'year'):
+        return None
+    return str(start.year) if start.year == end.year else f'{start.year}-{end.year}'
+
+
+@dataclass(frozen=True)
+class OutputLayout:
+    """
+    Where the result folders of a run go: below a root, in one folder per shard key.
+
+    With no shard keys every result folder sits directly in the root, as on the Desktop before.
+
+    :param root: The output root.
+    :param shards: Shard keys from SHARD_KEYS, outermost first.
+    """
+    root: Path
+    shards: Tuple[str, ...] = ()
+
+    def __post_init__(self):
+        unknown = [key for key in self.shards if key not in SHARD_KEYS]
+        if unknown:
+            raise ValueError(f'Unknown shard keys {unknown}; expected some of {SHARD_KEYS}')
+
+    def parent(self, template=None, company=None, timeseries=None) -> Path:
+        """
+        Return the directory a result folder is created in.
+
+        :param template: The template name.
+        :param company: The unified social credit code (CC).
+        :param timeseries: The Start and End of the run.
+        """
+        values = {'template': template, 'company': company, 'period': period_label(timeseries)}
+        return self.root.joinpath(*(shard_name(values[key]) for key in self.shards))
+
+    def create(self, name: str, template=None, company=None, timeseries=None) -> Path:
+        """
+        Create the result folder called name and return its path.
+
+        :param name: The result folder name.
+        :param template: The template name.
+        :param company: The unified social credit code (CC).
+        :param timeseries: The Start and End of the run.
+        """
+        from .common import create_result_folder
+
+        return create_result_folder(self.parent(template, company, timeseries), target_folder_name=name)
+
+
+def output_layout() -> OutputLayout:
+    """Return the layout configured through OA_OUTPUT_ROOT and OA_OUTPUT_LAYOUT."""
+    shards = tuple(key.strip() for key in os.environ.get(OUTPUT_LAYOUT_ENV, '').split('/') if key.strip())
+    return OutputLayout(output_root(), shards)
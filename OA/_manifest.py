@@ -0,0 +1,203 @@
+# -*- coding: utf-8 -*-
+
+import hashlib
+import json
+import logging
+import os
+from contextlib import contextmanager
+from functools import lru_cache
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Tuple, Union
+
+# File stored in each result folder, mapping output file names to the digest of their inputs
+MANIFEST_NAME = '.oa_manifest.json'
+# File locked while a manifest is saved, so concurrent runs on a folder merge their entries
+LOCK_NAME = '.oa_manifest.lock'
+# Bookkeeping files of a result folder, which are not outputs
+MANIFEST_FILES = (MANIFEST_NAME, LOCK_NAME)
+# Manifests that also list the files each output was filed as
+MANIFEST_VERSION = 2
+
+
+@lru_cache(maxsize=64)
+def _file_digest(path: Path, mtime_ns: int, size: int) -> str:
+    digest = hashlib.sha256()
+    with open(path, 'rb') as stream:
+        while chunk := stream.read(1 << 20):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def template_digest(path: Union[str, Path]) -> str:
+    """
+    Return the SHA-256 of a template file, cached until the file changes.
+
+    Args:
+        path: The template file.
+
+    Returns:
+        str: The hex digest.
+    """
+    path = Path(path).resolve()
+    stat = path.stat()
+    return _file_digest(path, stat.st_mtime_ns, stat.st_size)
+
+
+def record_digest(template: str, mapping: Dict[str, Any], output_format: str) -> str:
+    """
+    Return the digest identifying one output: the template, the values written into it and the format.
+
+    Args:
+        template: The template digest.
+        mapping: The values rendered into the template.
+        output_format: The output format, including the backend where it affects the result.
+
+    Returns:
+        str: The hex digest.
+    """
+    payload = json.dumps([template, mapping, output_format], sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+@contextmanager
+def locked(path: Path):
+    """
+    Hold an exclusive lock on a file while the block runs, against other processes and threads.
+
+    Args:
+        path: The lock file; created if missing and left in place.
+    """
+    with open(path, 'a+b') as stream:
+        if os.name == 'nt':
+            import msvcrt
+
+            # LK_LOCK retries for about ten seconds before raising OSError
+            stream.seek(0)
+            msvcrt.locking(stream.fileno(), msvcrt.LK_LOCK, 1)
+            try:
+                yield
+            finally:
+                stream.seek(0)
+                msvcrt.locking(stream.fileno(), msvcrt.LK_UNLCK, 1)
+        else:
+            import fcntl
+
+            fcntl.flock(stream.fileno(), fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(stream.fileno(), fcntl.LOCK_UN)
+
+
+def read_manifest(path: Path) -> Tuple[Dict[str, str], Dict[str, List[str]]]:
+    """
+    Read the entries and the listed files of a manifest.
+
+    Args:
+        path: The manifest file.
+
+    Returns:
+        The digests and the files by output name; empty when the manifest is missing or unreadable.
+    """
+    try:
+        data = json.loads(path.read_text(encoding='utf-8'))
+    except FileNotFoundError:
+        return {}, {}
+    except (OSError, ValueError) as error:
+        # A damaged manifest only costs a full rebuild
+        logging.warning(f'Ignoring unreadable manifest {path}: {error}')
+        return {}, {}
+    if data.get('version') == MANIFEST_VERSION:
+        return data['entries'], data['outputs']
+    # Written before the files were listed
+    return data, {}
+
+
+class Manifest:
+    """
+    The digests of the outputs in one result folder, and the files each output was filed as.
+
+    An output is current when its recorded digest matches and every file derived from it exists.
+    The listed files let later steps find the outputs of a folder without walking it.
+    Saving merges the recorded outputs into the manifest on disk under a file lock, so runs
+    sharing a folder keep each other's entries.
+    """
+
+    def __init__(self, folder: Path):
+        self.folder = Path(folder)
+        self.path = self.folder / MANIFEST_NAME
+        self.entries, self.outputs = read_manifest(self.path)
+        # The outputs recorded since the manifest was read or saved
+        self.recorded = set()
+        self.changed = False
+
+    def is_current(self, name: str, digest: str, outputs: Iterable[Path]) -> bool:
+        return self.entries.get(name) == digest and all(output.exists() for output in outputs)
+
+    def record(self, name: str, digest: str, outputs: Iterable[Path] = ()) -> None:
+        """
+        Record the digest of an output and the files it was filed as.
+
+        Args:
+            name: The output file name.
+            digest: The record digest.
+            outputs: The files derived from the output, inside the result folder.
+        """
+        files = sorted(Path(output).relative_to(self.folder).as_posix() for output in outputs)
+        if self.entries.get(name) != digest or self.outputs.get(name) != files:
+            self.entries[name] = digest
+            self.outputs[name] = files
+            self.recorded.add(name)
+            self.changed = True
+
+    def files(self, suffix: str) -> Optional[List[Path]]:
+        """
+        Return the existing files with a suffix recorded for the outputs, sorted by path.
+
+        Args:
+            suffix: The file suffix, e.g. '.pdf'.
+
+        Returns:
+            The files, or None when some output was recorded without its files and the folder must be walked.
+        """
+        if not self.entries or any(name not in self.outputs for name in self.entries):
+            return None
+        files = {self.folder / file for files in self.outputs.values() for file in files if file.endswith(suffix)}
+        return sorted(file for file in files if file.exists())
+
+    def save(self) -> None:
+        if not self.changed:
+            return
+        with locked(self.folder / LOCK_NAME):
+            # Another run may have saved since this one read the manifest: keep its outputs
+            entries, outputs = read_manifest(self.path)
+            for name in self.recorded:
+                entries[name], outputs[name] = self.entries[name], self.outputs[name]
+            data = {'version': MANIFEST_VERSION, 'entries': entries, 'outputs': outputs}
+            temporary = self.path.with_suffix('.tmp')
+            temporary.write_text(json.dumps(data, ensure_ascii=False, indent=1, sort_keys=True), encoding='utf-8')
+            os.replace(temporary, self.path)
+        self.entries, self.outputs = entries, outputs
+        self.recorded.clear()
+        self.changed = False
+
+
+class Manifests:
+    """
+    The manifests of every result folder touched by a run, loaded on first use and saved on exit.
+    """
+
+    def __init__(self):
+        self.folders: Dict[Path, Manifest] = {}
+
+    def __getitem__(self, folder: Path) -> Manifest:
+        if folder not in self.folders:
+            self.folders[folder] = Manifest(folder)
+        return self.folders[folder]
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        for manifest in self.folders.values():
+            manifest.save()
@@ -0,0 +1,310 @@
+# -*- coding: utf-8 -*-
+
+import json
+import logging
+import os
+from itertools import islice
+from pathlib import Path
+from typing import Any, Dict, Iterable, Iterator, List, Tuple, Union
+
+import pandas as pd
+
+# Worksheet names
+TASK_SHEET = '任务'  # Task
+PERFORMANCE_SHEET = '绩效'  # Performance
+STATS_SHEET = '统计'  # Statistic
+MONTHLY_SHEET = '月度统计'  # Monthly statistic
+STATS_TABLE = 'Stats'
+MONTHLY_TABLE = 'MonthlyStats'
+
+# Columns
+KEYS = ['产品名称', '客户名称']
+DATE_SOURCE = '完成时间'
+DATE_FORMAT = '%Y-%m-%d %H:%M:%S'
+TASK_COLUMNS = ['产品名称', '客户名称', '负责人', '协作人', 'Date', '服务金额']  # 任务工作表
+STATS_COLUMNS = ['产品名称', '客户名称', '负责人', '协作人', 'Date', '服务金额', '提成基数', '预计提成']
+MONTH = '月份'
+MONTHLY_COLUMNS = [MONTH, '负责人', '任务数', '服务金额']
+
+# Rows of the task sheet read at a time
+CHUNK_ROWS = 10000
+
+# File next to the output holding the digest and the aggregate of every month
+CACHE_SUFFIX = '.payroll.json'
+
+
+def parse_dates(frame: pd.DataFrame, column: str = DATE_SOURCE) -> pd.DataFrame:
+    """
+    Add the Date column, parsed from a text column in one vectorized pass.
+
+    :param frame: The task rows.
+    :param column: The column holding '%Y-%m-%d %H:%M:%S' text or datetimes.
+    """
+    return frame.assign(Date=pd.to_datetime(frame[column], format=DATE_FORMAT).dt.normalize())
+
+
+def task_frame(chunks: Iterable[pd.DataFrame]) -> pd.DataFrame:
+    """
+    Build the task table from chunks of the task sheet, parsing the dates of each chunk as it is read.
+
+    :param chunks: DataFrames holding consecutive rows of the task sheet.
+    """
+    parts = [parse_dates(chunk.dropna(how='all'))[TASK_COLUMNS] for chunk in chunks]
+    if not parts:
+        return pd.DataFrame(columns=TASK_COLUMNS)
+    return pd.concat(parts, ignore_index=True).convert_dtypes()
+
+
+def performance_frame(frame: pd.DataFrame) -> pd.DataFrame:
+    """
+    Sum the expected commission and average the commission base of every product and client.
+
+    :param frame: The rows of the performance sheet.
+    """
+    return (frame.convert_dtypes()
+            .groupby(KEYS, as_index=False, sort=False)  # 分组字典不设为索引
+            .agg({'预计提成': 'sum', '提成基数': 'mean'}))
+
+
+def stats_frame(tasks: pd.DataFrame, performance: pd.DataFrame) -> pd.DataFrame:
+    """
+    Join the tasks with the commission of their product and client, sorted by date.
+
+    :param tasks: The task table.
+    :param performance: The aggregated performance table.
+    """
+    result = pd.merge(left=tasks, right=performance, how='outer', on=KEYS)  # 并集
+    return result.sort_values(by=['Date'], ascending=True, ignore_index=True).loc[:, STATS_COLUMNS]
+
+
+def month_labels(tasks: pd.DataFrame) -> pd.Series:
+    """Return the 'YYYY-MM' month of every task."""
+    return tasks['Date'].dt.strftime('%Y-%m')
+
+
+def month_digests(tasks: pd.DataFrame) -> Dict[str, str]:
+    """
+    Return a digest of the rows of every month, independent of their order.
+
+    :param tasks: The task table.
+    """
+    hashes = pd.util.hash_pandas_object(tasks[TASK_COLUMNS], index=False)
+    grouped = hashes.groupby(month_labels(tasks).to_numpy())
+    sizes, totals = grouped.size(), grouped.sum()
+    return {month: f'{sizes[month]}:{totals[month]}' for month in sizes.index}
+
+
+def aggregate_months(tasks: pd.DataFrame) -> pd.DataFrame:
+    """
+    Count the tasks and sum the service amounts of every month and person in charge.
+
+    :param tasks: The task rows of the months to aggregate.
+    """
+    monthly = (tasks.assign(**{MONTH: month_labels(tasks)})
+               # Tasks without a person in charge are counted too, in a row of their own
+               .groupby([MONTH, '负责人'], as_index=False, sort=True, dropna=False)
+               .agg(任务数=('服务金额', 'size'), 服务金额=('服务金额', 'sum')))
+    return monthly.loc[:, MONTHLY_COLUMNS]
+
+
+class MonthlyCache:
+    """
+    The digest and the aggregated rows of every month from the previous run.
+
+    :param path: The cache file; None keeps the cache in memory only.
+    """
+
+    def __init__(self, path: Path | None):
+        self.path = path
+        self.months: Dict[str, Dict[str, Any]] = {}
+        if path is None:
+            return
+        try:
+            self.months = json.loads(path.read_text(encoding='utf-8'))
+        except FileNotFoundError:
+            pass
+        except (OSError, ValueError) as error:
+            # A damaged cache only costs a full aggregation
+            logging.warning(f'Ignoring unreadable payroll cache {path}: {error}')
+
+    def save(self) -> None:
+        if self.path is None:
+            return
+        temporary = self.path.with_suffix('.tmp')
+        temporary.write_text(json.dumps(self.months, ensure_ascii=False, default=str), encoding='utf-8')
+        os.replace(temporary, self.path)
+
+
+def monthly_frame(tasks: pd.DataFrame, cache: MonthlyCache) -> pd.DataFrame:
+    """
+    Aggregate the tasks by month, recomputing only the months whose rows changed since the cached run.
+
+    :param tasks: The task table.
+    :param cache: The aggregates of the previous run; updated in place.
+    """
+    digests = month_digests(tasks)
+    changed = [month for month, digest in digests.items() if cache.months.get(month, {}).get('digest') != digest]
+    if changed:
+        fresh = aggregate_months(tasks[month_labels(tasks).isin(changed)])
+        for month, rows in fresh.groupby(MONTH, sort=False):
+            # Missing values are stored as null, so they read back as missing
+            rows = rows.astype(object).where(rows.notna(), None)
+            cache.months[month] = {'digest': digests[month], 'rows': rows.to_dict(orient='records')}
+    # Months without tasks anymore are dropped
+    cache.months = {month: cache.months[month] for month in sorted(digests)}
+    logging.info(f'Aggregated {len(changed)} of {len(digests)} months')
+
+    rows = [row for entry in cache.months.values() for row in entry['rows']]
+    return pd.DataFrame(rows, columns=MONTHLY_COLUMNS).convert_dtypes()
+
+
+def compute(tasks: pd.DataFrame, performance: pd.DataFrame, cache: MonthlyCache) -> Tuple[pd.DataFrame, pd.DataFrame]:
+    """
+    Return the stats table and the monthly table.
+
+    :param tasks: The task table, with parsed dates.
+    :param performance: The rows of the performance sheet.
+    :param cache: The monthly aggregates of the previous run.
+    """
+    stats = stats_frame(tasks, performance_frame(performance))
+    monthly = monthly_frame(tasks, cache)
+    cache.save()
+    return stats, monthly
+
+
+def cache_path(target: Path) -> Path | None:
+    """Return the cache file of an output file, or None if the output has no folder yet."""
+    # Resolved, so an output in the working directory, e.g. out.xlsx, gets its cache too
+    target = Path(target).resolve()
+    if not target.parent.is_dir():
+        return None
+    return target.with_name(f'.{target.stem}{CACHE_SUFFIX}')
+
+
+def output_frame(frame: pd.DataFrame) -> pd.DataFrame:
+    """Return the frame as written out, with dates instead of midnight timestamps."""
+    if 'Date' not in frame:
+        return frame
+    return frame.assign(Date=frame['Date'].dt.date)
+
+
+# Excel mode
+def sheet_chunks(sheet, chunk_rows: int = CHUNK_ROWS) -> Iterator[pd.DataFrame]:
+    """
+    Read the used range of a worksheet in blocks of rows, the first row holding the headers.
+
+    :param sheet: An xlwings sheet.
+    :param chunk_rows: Rows per block.
+    """
+    used = sheet.used_range
+    first_row, first_col = used.row, used.column
+    last_row, last_col = first_row + used.rows.count - 1, first_col + used.columns.count - 1
+    header = sheet.range((first_row, first_col), (first_row, last_col)).options(ndim=1).value
+    for start in range(first_row + 1, last_row + 1, chunk_rows):
+        end = min(start + chunk_rows - 1, last_row)
+        values = sheet.range((start, first_col), (end, last_col)).options(ndim=2).value
+        yield pd.DataFrame(values, columns=header)
+
+
+def write_sheet(book, name: str, table: str, frame: pd.DataFrame) -> None:
+    """
+    Write a frame as a table, reusing the worksheet and the table if they exist.
+
+    :param book: An xlwings book.
+    :param name: The worksheet name.
+    :param table: The table name.
+    :param frame: The data.
+    """
+    if name in [sheet.name for sheet in book.sheets]:
+        sheet = book.sheets[name]
+        if table in [existing.name for existing in sheet.tables]:
+            sheet.tables[table].update(frame, index=False)
+            sheet.autofit()
+            return
+        sheet.clear()
+    else:
+        sheet = book.sheets.add(name)
+    sheet.tables.add(source=sheet['A1'], name=table).update(frame, index=False)
+    sheet.autofit()
+
+
+def stats_from_book(book, chunk_rows: int = CHUNK_ROWS) -> Tuple[pd.DataFrame, pd.DataFrame]:
+    """
+    Compute the payroll stats of an open workbook and write them to its 统计 and 月度统计 sheets.
+
+    :param book: An xlwings book with the 任务 and 绩效 sheets.
+    :param chunk_rows: Rows of the task sheet read at a time.
+    :return: The stats table and the monthly table.
+    """
+    tasks = task_frame(sheet_chunks(book.sheets[TASK_SHEET], chunk_rows))
+    performance = pd.concat(list(sheet_chunks(book.sheets[PERFORMANCE_SHEET], chunk_rows)), ignore_index=True)
+    stats, monthly = compute(tasks, performance, MonthlyCache(cache_path(Path(book.fullname))))
+    write_sheet(book, STATS_SHEET, STATS_TABLE, output_frame(stats))
+    write_sheet(book, MONTHLY_SHEET, MONTHLY_TABLE, monthly)
+    return stats, monthly
+
+
+# File mode
+def workbook_chunks(path: Path, sheet_name: str, chunk_rows: int = CHUNK_ROWS) -> Iterator[pd.DataFrame]:
+    """
+    Stream a worksheet of an .xlsx file in blocks of rows, without loading the whole workbook.
+
+    :param path: The workbook.
+    :param sheet_name: The worksheet name.
+    :param chunk_rows: Rows per block.
+    """
+    from openpyxl import load_workbook
+
+    book = load_workbook(path, read_only=True, data_only=True)
+    try:
+        rows = book[sheet_name].iter_rows(values_only=True)
+        header = next(rows, None)
+        if header is None:
+            return
+        while block := list(islice(rows, chunk_rows)):
+            yield pd.DataFrame(block, columns=header)
+    finally:
+        book.close()
+
+
+def file_chunks(path: Path, sheet_name: str, chunk_rows: int = CHUNK_ROWS) -> Iterator[pd.DataFrame]:
+    """Read a worksheet of an .xlsx file, or a .csv file, in blocks of rows."""
+    if path.suffix.lower() == '.csv':
+        return pd.read_csv(path, chunksize=chunk_rows)
+    return workbook_chunks(path, sheet_name, chunk_rows)
+
+
+def write_file(path: Path, frames: List[Tuple[str, pd.DataFrame]]) -> None:
+    """
+    Write (sheet name, frame) pairs to an .xlsx file, replacing those sheets if it exists,
+    or each frame to its own .csv file named after the sheet.
+    """
+    if path.suffix.lower() == '.csv':
+        for index, (name, frame) in enumerate(frames):
+            target = path if index == 0 else path.with_name(f'{path.stem}_{name}{path.suffix}')
+            frame.to_csv(target, index=False, encoding='utf-8-sig')
+        return
+    options = {'mode': 'a', 'if_sheet_exists': 'replace'} if path.exists() else {'mode': 'w'}
+    with pd.ExcelWriter(path, engine='openpyxl', **options) as writer:
+        for name, frame in frames:
+            frame.to_excel(writer, sheet_name=name, index=False)
+
+
+def stats_from_files(tasks: Union[str, Path], output: Union[str, Path], performance: Union[str, Path, None] = None,
+                     chunk_rows: int = CHUNK_ROWS) -> Tuple[pd.DataFrame, pd.DataFrame]:
+    """
+    Compute the payroll stats from files, without an Excel process.
+
+    :param tasks: An .xlsx workbook with the 任务 sheet, or a .csv file of tasks.
+    :param output: The .xlsx workbook (which may be the input) or .csv file to write.
+    :param performance: The workbook or .csv file holding the 绩效 rows. Defaults to tasks.
+    :param chunk_rows: Rows of the task sheet read at a time.
+    :return: The stats table and the monthly table.
+    """
+    tasks, output = Path(tasks), Path(output)
+    performance = Path(performance) if performance else tasks
+    task_table = task_frame(file_chunks(tasks, TASK_SHEET, chunk_rows))
+    performance_table = pd.concat(list(file_chunks(performance, PERFORMANCE_SHEET, chunk_rows)), ignore_index=True)
+    stats, monthly = compute(task_table, performance_table, MonthlyCache(cache_path(output)))
+    write_file(output, [(STATS_SHEET, output_frame(stats)), (MONTHLY_SHEET, monthly)])
+    return stats, monthly
@@ -0,0 +1,188 @@
+# -*- coding: utf-8 -*-
+
+import hashlib
+import logging
+from pathlib import Path
+from typing import Dict, List, Tuple
+
+from PyPDF2 import PdfReader, PdfWriter
+from PyPDF2.generic import ArrayObject, DictionaryObject, IndirectObject, NullObject, StreamObject
+
+from ._classify_files import MERGED_PDF_FOLDER_NAME, iter_pdf_files
+from ._trace import count, span
+
+# Default limits of one merged file; 0 disables a limit, so a folder is merged into one file unless
+# the caller opts into splitting, which bounds the memory of merging to one part
+MAX_PAGES = 0
+MAX_BYTES = 0
+# Name of a merged file that fits in one part, and the prefix of the numbered parts
+MERGED_NAME = 'Merged_Pdf'
+# deduplicate_objects rewrites the object table of PdfWriter and hashes the encoded data of streams,
+# both private in PyPDF2 3.x; when a release changes them, merged files are written without deduplication
+DEDUPLICATE = isinstance(getattr(PdfWriter(), '_objects', None), list) and hasattr(StreamObject, '_data')
+
+
+def create_merged_pdf_dir(src_dir: Path) -> Path:
+    """
+    Create a directory for merged PDFs.
+    :param src_dir: Path to the source directory.
+    :return: Path to the merged PDF directory.
+    """
+    # Create the path for the merged PDF directory
+    merged_pdf_dir = src_dir / MERGED_PDF_FOLDER_NAME
+    merged_pdf_dir.mkdir(parents=True, exist_ok=True)
+    return merged_pdf_dir
+
+
+def _content_key(obj: StreamObject) -> Tuple:
+    """
+    Build a hashable key from a stream's dictionary and its encoded data.
+    :param obj: The stream object.
+    :return: A key that is equal for streams with identical content.
+    """
+    entries = tuple(sorted((str(key), repr(value)) for key, value in obj.items()))
+    return entries, hashlib.sha1(obj._data).digest()
+
+
+def _remap_references(obj, remap: Dict[int, IndirectObject]):
+    """
+    Replace references to duplicate objects in place.
+    :param obj: A PDF object to walk.
+    :param remap: Mapping from duplicate object numbers to the retained reference.
+    :return: The object, or its replacement if it is itself a remapped reference.
+    """
+    if isinstance(obj, IndirectObject):
+        return remap.get(obj.idnum, obj)
+    if isinstance(obj, DictionaryObject):
+        for key, value in obj.items():
+            obj[key] = _remap_references(value, remap)
+    elif isinstance(obj, ArrayObject):
+        for index, value in enumerate(obj):
+            obj[index] = _remap_references(value, remap)
+    return obj
+
+
+def deduplicate_objects(writer: PdfWriter) -> int:
+    """
+    Share identical streams (embedded fonts, images, forms) between the merged documents.
+
+    Filings rendered from the same template embed the same fonts and images, so every
+    duplicate stream is replaced by a reference to its first occurrence.
+    Does nothing when DEDUPLICATE is false.
+    :param writer: The PDF writer holding the merged pages.
+    :return: The number of objects removed.
+    """
+    if not DEDUPLICATE:
+        return 0
+    objects = writer._objects
+    seen: Dict[Tuple, IndirectObject] = {}
+    remap: Dict[int, IndirectObject] = {}
+    for index, obj in enumerate(objects):
+        if isinstance(obj, StreamObject):
+            retained = seen.setdefault(_content_key(obj), IndirectObject(index + 1, 0, writer))
+            if retained.idnum != index + 1:
+                remap[index + 1] = retained
+
+    if remap:
+        for index, obj in enumerate(objects):
+            if index + 1 in remap:
+                objects[index] = NullObject()
+            else:
+                _remap_references(obj, remap)
+    return len(remap)
+
+
+def write_merged_part(writer: PdfWriter, target_pdf_path: Path) -> int:
+    """
+    Deduplicate and write one merged PDF, then release the writer.
+    :param writer: The PDF writer holding the merged pages.
+    :param target_pdf_path: Path of the merged file.
+    :return: The number of shared objects deduplicated.
+    """
+    try:
+        with span('merge part', 'document', file=target_pdf_path.name):
+            removed = deduplicate_objects(writer)
+            writer.write(target_pdf_path)
+        count('files.merged')
+        count('bytes.merged', target_pdf_path.stat().st_size)
+        return removed
+    finally:
+        writer.close()
+
+
+def clear_merged_files(merged_pdf_dir: Path) -> None:
+    """
+    Remove the merged files of a previous run, so no stale numbered part is left behind.
+    :param merged_pdf_dir: The merged PDF directory.
+    """
+    for stale in merged_pdf_dir.glob(f'{MERGED_NAME}*.pdf'):
+        stale.unlink()
+
+
+def merge_and_write_pdf_files(src_directory: Path, pdf_files: List[Path] | None = None,
+                              max_pages: int | None = None, max_bytes: int | None = None) -> List[Path]:
+    """
+    Merge multiple PDF files in a directory and write the merged file.
+
+    Inputs are read one at a time and closed after their pages are appended. When max_pages or
+    max_bytes is set, the output is split into numbered parts, and each part is written and released
+    as soon as it is full, so memory is bounded by the size of one part rather than the whole batch.
+    The merged files of a previous run are removed first.
+    :param src_directory: Path to the directory containing PDF files to merge.
+    :param pdf_files: The PDF files to merge. Defaults to iter_pdf_files(src_directory).
+    :param max_pages: Maximum number of pages per merged file. Defaults to MAX_PAGES: 0, no limit.
+    :param max_bytes: Maximum total input size in bytes per merged file. Defaults to MAX_BYTES: 0, no limit.
+    :return: List of merged file paths.
+    """
+    max_pages = MAX_PAGES if max_pages is None else max_pages
+    max_bytes = MAX_BYTES if max_bytes is None else max_bytes
+    # Create the directory for merged PDFs
+    merged_pdf_path = create_merged_pdf_dir(src_directory)
+    clear_merged_files(merged_pdf_path)
+    pdf_files = iter_pdf_files(src_directory) if pdf_files is None else pdf_files
+
+    parts: List[Path] = []
+    removed: List[int] = []
+    merger, pages, size = None, 0, 0
+
+    def flush():
+        # Set the path for the target PDF part
+        target_pdf_path = merged_pdf_path / f'{MERGED_NAME}_{len(parts) + 1:03}.pdf'
+        removed.append(write_merged_part(merger, target_pdf_path))
+        parts.append(target_pdf_path)
+
+    try:
+        for pdf_path in pdf_files:
+            with open(pdf_path, 'rb') as stream:
+                reader = PdfReader(stream)
+                page_count, length = len(reader.pages), pdf_path.stat().st_size
+                # Start a new part when this file would overflow the current one
+                if merger is not None and pages and (
+                        (max_pages and pages + page_count > max_pages) or
+                        (max_bytes and size + length > max_bytes)):
+                    flush()
+                    merger = None
+                if merger is None:
+                    # Create a PDF merger
+                    merger, pages, size = PdfWriter(), 0, 0
+                merger.append(reader)
+                pages, size = pages + page_count, size + length
+        if merger is not None:
+            flush()
+            merger = None
+
+    except Exception as error:
+        logging.error(f'Error merging PDFs: {error}')
+        raise
+    finally:
+        # Close the merger
+        if merger is not None:
+            merger.close()
+
+    # A single part keeps the historical file name
+    if len(parts) == 1:
+        parts = [parts[0].replace(merged_pdf_path / f'{MERGED_NAME}.pdf')]
+    for part, shared in zip(parts, removed):
+        logging.info(f'Merged PDF file created at {part} ({shared} shared objects deduplicated)')
+    return parts
+
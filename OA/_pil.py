@@ -4,10 +4,13 @@ from collections import namedtuple
 from pathlib import Path
 from typing import NamedTuple
 
-import xlwings as xw
-
-from ._autozip import auto_zip
+from ._autozip import auto_zip, zip_destination, zip_directory
+from ._backends import BACKENDS, EXCEL_BACKEND, HEADLESS_BACKEND
+from ._biff import load_biff_template
+from ._manifest import Manifests, record_digest, template_digest
 from ._search import TEMPLATE_DIR
+from ._sink import Sink
+from ._trace import count, span
 
 # Constants for individual income tax script configuration
 TPL_2018: Path = TEMPLATE_DIR.joinpath('Excel/2018.xls')
@@ -24,8 +27,19 @@ class EXCEL(NamedTuple):
 Period = namedtuple('Period', ['Start', 'End'])
 
 
-@auto_zip
-def generate_personal_income_tax(register, periods, output_folder):
+def template_for(period) -> Path:
+    """Return the template matching the start year of the period."""
+    # Determine the template year based on the start year of the period
+    anchor = 2018 if period.Start.year < 2019 else 2019
+    return getattr(EXCEL, f'Template_{anchor}')
+
+
+def output_path_for(output_folder: Path, period) -> Path:
+    """Construct the output file path based on the period."""
+    return output_folder / f'{period.Start.year}_{period.Start.month:02}.xls'
+
+
+def generate_personal_income_tax(register, periods, output_folder, backend=EXCEL_BACKEND, sink: Sink | None = None):
     """
     Generate personal income tax for a specified period of time.
 
@@ -33,36 +47,145 @@ def generate_personal_income_tax(register, periods, output_folder):
         register (dict): Registration information.
         periods (list): List of period tuples with start and end dates.
         output_folder (Path): Folder to save output Excel files.
+        backend (str): 'excel' to drive an Excel process, or 'headless' to patch the XLS record stream directly.
+        sink (Sink, optional): Write the workbooks into this sink, one folder per year, instead of zipping
+            them in output_folder. Needs the headless backend.
 
     Returns:
-        Path: The output folder path.
+        Path: The output folder path, or Path() for the root of the sink.
     """
-    # Launch Excel in the background
-    with xw.App(visible=False, add_book=False) as app:
-        app.display_alerts = False
-        app.screen_updating = False
+    if backend not in BACKENDS:
+        raise ValueError(f"Invalid backend: {backend}. Expected one of {BACKENDS}")
 
-        for period in map(lambda x: Period._make(x), periods):
-            # Merge period information into register
-            register |= period._asdict()
+    if sink is not None:
+        if backend != HEADLESS_BACKEND:
+            raise ValueError('Only the headless backend can write into a sink')
+        with span('generate_personal_income_tax', 'stage', backend=backend):
+            write_into_sink(register, periods, sink)
+        return Path()
 
-            # Determine the template year based on the start year of the period
-            anchor = 2018 if (year := period.Start.year) < 2019 else 2019
+    return generate_into_folder(register, periods, output_folder, backend)
 
-            # Open the corresponding Excel workbook
-            wb = app.books.open(getattr(EXCEL, f'Template_{anchor}'))
-            sht = wb.sheets[0]
 
-            # Fill in the Excel sheet with the registration information
-            for k, v in register.items():
-                sht.range(k).value = v
+@auto_zip
+def generate_into_folder(register, periods, output_folder, backend=EXCEL_BACKEND):
+    """Write the workbooks of every period into output_folder, then zip them."""
+    with span('generate_personal_income_tax', 'stage', backend=backend):
+        if backend == HEADLESS_BACKEND:
+            write_with_biff(register, periods, output_folder)
+        else:
+            write_with_excel(register, periods, output_folder)
+    return output_folder
 
-            # Construct the output file path based on the period
-            month = period.Start.month
-            output_path = output_folder / f'{year}_{month:02}.xls'
 
-            # Save and close the workbook
-            wb.save(output_path)
-            wb.close()
+def generate_personal_income_tax_batch(jobs, backend=EXCEL_BACKEND):
+    """
+    Generate personal income tax for many registers, starting the backend once.
 
-    return output_folder
+    Args:
+        jobs (list): (register, periods, output folder) triples, one per company.
+        backend (str): 'excel' to drive one Excel process for all companies, or 'headless'.
+
+    Returns:
+        list: The output folder paths, each zipped like generate_personal_income_tax.
+    """
+    if backend not in BACKENDS:
+        raise ValueError(f"Invalid backend: {backend}. Expected one of {BACKENDS}")
+
+    with span('generate_personal_income_tax', 'stage', backend=backend, companies=len(jobs)):
+        if backend == HEADLESS_BACKEND:
+            for register, periods, output_folder in jobs:
+                write_with_biff(register, periods, output_folder)
+        else:
+            write_many_with_excel(jobs)
+    return [zip_directory(output_folder) for _, _, output_folder in jobs]
+
+
+def pending_periods(register, periods, output_folder, backend, manifests):
+    """
+    Return (values, template, filename, digest) for every period whose archive is not current.
+
+    The digest covers the template bytes, the register merged with the period and the backend.
+    """
+    pending = []
+    for period in map(lambda x: Period._make(x), periods):
+        # Merge period information into register
+        register |= period._asdict()
+        values = dict(register)
+        template, filename = template_for(period), output_path_for(output_folder, period)
+        digest = record_digest(template_digest(template), values, f'xls:{backend}')
+        if manifests[output_folder].is_current(filename.name, digest, [zip_destination(filename)]):
+            count('files.skipped')
+            continue
+        pending.append((values, template, filename, digest))
+    return pending
+
+
+def write_with_biff(register, periods, output_folder) -> None:
+    """Write every period whose archive is not current by patching the XLS record stream directly."""
+    with Manifests() as manifests:
+        for values, template_path, filename, digest in pending_periods(
+                register, periods, output_folder, HEADLESS_BACKEND, manifests):
+            # The template is parsed once and every period is written as a patched copy
+            with span('template load', 'document', template=template_path.name):
+                template = load_biff_template(template_path)
+            with span('save', 'document', file=filename.name):
+                template.save(values, filename)
+            count('files.rendered')
+            count('bytes.rendered', filename.stat().st_size)
+            manifests[output_folder].record(filename.name, digest, [zip_destination(filename)])
+
+
+def write_into_sink(register, periods, sink: Sink) -> None:
+    """Write the workbook of every period straight into a sink, in a folder named after its year."""
+    for period in map(lambda x: Period._make(x), periods):
+        values = register | period._asdict()
+        template_path = template_for(period)
+        with span('template load', 'document', template=template_path.name):
+            template = load_biff_template(template_path)
+        name = output_path_for(Path(str(period.Start.year)), period).as_posix()
+        with span('save', 'document', file=name):
+            workbook = template.render_file(values)
+        sink.write(name, workbook)
+        count('files.rendered')
+        count('bytes.rendered', len(workbook))
+
+
+def write_with_excel(register, periods, output_folder) -> None:
+    """Write every period through an Excel process."""
+    write_many_with_excel([(register, periods, output_folder)])
+
+
+def write_many_with_excel(jobs) -> None:
+    """Write every period of every (register, periods, output folder) job through one Excel process.
+    Periods whose archives are current are skipped, and Excel is not started when none is left."""
+    with Manifests() as manifests:
+        pending = [(output_folder, period) for register, periods, output_folder in jobs
+                   for period in pending_periods(register, periods, output_folder, EXCEL_BACKEND, manifests)]
+        if not pending:
+            return
+
+        import xlwings as xw
+
+        # Launch Excel in the background
+        with xw.App(visible=False, add_book=False) as app:
+            app.display_alerts = False
+            app.screen_updating = False
+
+            for output_folder, (values, template, filename, digest) in pending:
+                # Open the corresponding Excel workbook
+                with span('template load', 'document', template=template.name):
+                    wb = app.books.open(template)
+                    sht = wb.sheets[0]
+
+                # Fill in the Excel sheet with the registration information
+                with span('render', 'document', file=filename.name):
+                    for k, v in values.items():
+                        sht.range(k).value = v
+
+                # Save and close the workbook
+                with span('save', 'document', file=filename.name):
+                    wb.save(filename)
+                    wb.close()
+                count('files.rendered')
+                manifests[output_folder].record(filename.name, digest, [zip_destination(filename)])
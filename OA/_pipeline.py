@@ -0,0 +1,319 @@
+# -*- coding: utf-8 -*-
+
+import logging
+import queue
+import threading
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from pathlib import Path
+from typing import Any, Dict, Iterable, Iterator, List, Set, Tuple, Union
+
+from ._classify_files import (DIRECTORY_NAMES, MERGED_PDF_FOLDER_NAME, categorized_path, create_directories,
+                              iter_pdf_files, move_file_to_dst, placed_path, remove_empty_dirs)
+from ._convert2pdf import Converter, default_converter
+from ._manifest import Manifests
+from ._render import (PARALLEL_THRESHOLD, pending_jobs, record_rendered, render_shard, report_failures,
+                      traced_render_shard)
+from ._trace import active, carry, span
+
+# Documents waiting between two stages; a full queue blocks the stage upstream
+QUEUE_SIZE = 16
+# Documents rendered per task when rendering across processes
+CHUNK_SIZE = 8
+# Seconds between checks for a failed stage while waiting on a queue
+POLL_INTERVAL = 0.1
+# Marks the end of a stage's output
+DONE = object()
+
+
+class PipelineAborted(Exception):
+    """Raised inside a stage when another stage has failed."""
+
+
+class Pipeline:
+    """
+    Runs stages in threads connected by bounded queues.
+
+    The first error raised by a stage stops the others and is re-raised by join.
+    """
+
+    def __init__(self):
+        self.aborted = threading.Event()
+        self.errors: List[BaseException] = []
+        self.threads: List[threading.Thread] = []
+
+    def put(self, channel: queue.Queue, item) -> None:
+        """Put an item downstream, blocking while the queue is full."""
+        while True:
+            try:
+                channel.put(item, timeout=POLL_INTERVAL)
+                return
+            except queue.Full:
+                if self.aborted.is_set():
+                    raise PipelineAborted
+
+    def drain(self, channel: queue.Queue) -> Iterator:
+        """Yield the items of an upstream queue until the stage feeding it is done."""
+        while True:
+            try:
+                item = channel.get(timeout=POLL_INTERVAL)
+            except queue.Empty:
+                if self.aborted.is_set():
+                    raise PipelineAborted
+                continue
+            if item is DONE:
+                return
+            yield item
+
+    def start(self, name: str, target, *args, output: queue.Queue | None = None) -> None:
+        """Run a stage in its own thread; its output queue is closed when it returns."""
+
+        def run():
+            try:
+                target(*args)
+            except PipelineAborted:
+                pass
+            except BaseException as error:
+                self.errors.append(error)
+                self.aborted.set()
+            finally:
+                if output is not None:
+                    try:
+                        self.put(output, DONE)
+                    except PipelineAborted:
+                        pass
+
+        thread = threading.Thread(target=carry(run), name=f'oa-{name}', daemon=True)
+        thread.start()
+        self.threads.append(thread)
+
+    def join(self) -> None:
+        for thread in self.threads:
+            thread.join()
+        if self.errors:
+            raise self.errors[0]
+
+
+class Arrivals:
+    """
+    The PDFs to merge for one result folder, released in file name order as soon as they are filed.
+
+    :param expected: Every PDF of the merged output, sorted as iter_pdf_files sorts them.
+    :param pending: The PDFs still being produced by this run.
+    :param pipeline: The pipeline, to stop waiting when it fails.
+    """
+
+    def __init__(self, expected: List[Path], pending: Set[Path], pipeline: Pipeline):
+        self.expected = expected
+        self.pending = pending
+        self.pipeline = pipeline
+        self.settled: Dict[Path, bool] = {}
+        self.condition = threading.Condition()
+
+    def settle(self, pdf: Path, filed: bool) -> None:
+        """Report that a pending PDF was filed, or will not be produced."""
+        with self.condition:
+            self.settled[pdf] = filed
+            self.condition.notify_all()
+
+    def __iter__(self) -> Iterator[Path]:
+        for pdf in self.expected:
+            if pdf in self.pending:
+                with self.condition:
+                    while pdf not in self.settled:
+                        if self.pipeline.aborted.is_set():
+                            raise PipelineAborted
+                        self.condition.wait(POLL_INTERVAL)
+                if not self.settled[pdf]:
+                    continue
+            yield pdf
+
+
+def render_stage(pipeline: Pipeline, path: Union[str, Path], jobs: List[Tuple[Dict[str, Any], Path]], workers: int,
+                 output: queue.Queue, failures: List[Tuple[Path, str]]) -> None:
+    """Render the documents straight into the Word folders and emit (filename, error) pairs as they are saved."""
+
+    def place(chunk):
+        return [(mapping, placed_path(filename)) for mapping, filename in chunk]
+
+    def emit(chunk, chunk_failures):
+        # Failures name the placed documents; the stages downstream use the names in the result folder
+        errors = dict(chunk_failures)
+        for _, filename in chunk:
+            error = errors.get(placed_path(filename))
+            if error is not None:
+                failures.append((filename, error))
+            pipeline.put(output, (filename, error))
+
+    with span('render_docx', 'stage', documents=len(jobs), workers=workers):
+        if workers <= 1 or len(jobs) < PARALLEL_THRESHOLD:
+            for job in jobs:
+                emit([job], render_shard(path, place([job])))
+            return
+
+        # Keep a few chunks in flight per process, so rendering also waits when the converter falls behind
+        tracer = active()
+        chunks = iter([jobs[i:i + CHUNK_SIZE] for i in range(0, len(jobs), CHUNK_SIZE)])
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            running = {}
+            while True:
+                while len(running) < 2 * workers and (chunk := next(chunks, None)) is not None:
+                    task = traced_render_shard if tracer is not None else render_shard
+                    running[executor.submit(task, path, place(chunk))] = chunk
+                if not running:
+                    return
+                finished, _ = wait(running, timeout=POLL_INTERVAL, return_when=FIRST_COMPLETED)
+                if pipeline.aborted.is_set():
+                    raise PipelineAborted
+                for future in finished:
+                    chunk, result = running.pop(future), future.result()
+                    if tracer is not None:
+                        result, spans, counters = result
+                        tracer.merge(spans, counters)
+                    emit(chunk, result)
+
+
+def convert_stage(pipeline: Pipeline, converter: Converter | None, source: queue.Queue, output: queue.Queue) -> None:
+    """
+    Convert each rendered document as soon as it arrives; failed renders pass straight through.
+
+    Without a PDF converter the documents are kept as DOCX only: this is logged once rather than
+    reported as a failure of every document, as convert_to_pdf does.
+    """
+
+    names: Dict[Path, Path] = {}
+
+    def rendered() -> Iterable[Path]:
+        for filename, error in pipeline.drain(source):
+            if error is None:
+                # The converters write the PDF of a placed document into the PDF folder
+                document = placed_path(filename)
+                names[document] = filename
+                yield document
+            else:
+                pipeline.put(output, (filename, error))
+
+    def convert(active_converter: Converter) -> None:
+        with span('convert_to_pdf', 'stage'):
+            for document, error in active_converter.convert_iter(rendered()):
+                pipeline.put(output, (names.pop(document), error))
+
+    if converter is not None:
+        convert(converter)
+        return
+    try:
+        # Entered in this thread, since Word automation belongs to the thread that started it
+        context = default_converter()
+        started = context.__enter__()
+    except FileNotFoundError as error:
+        logging.warning(f'No PDF converter available, keeping the Word documents only: {error}')
+        for item in pipeline.drain(source):
+            pipeline.put(output, item)
+        return
+    try:
+        convert(started)
+    finally:
+        context.__exit__(None, None, None)
+
+
+def file_stage(pipeline: Pipeline, source: queue.Queue, arrivals: Dict[Path, Arrivals],
+               failures: List[Tuple[Path, str]]) -> None:
+    """Check that each PDF arrived in the PDF folder, then hand it to the merger."""
+    with span('categorize_files', 'stage'):
+        for filename, error in pipeline.drain(source):
+            folder = filename.parent
+            pdf = categorized_path(folder, filename.with_suffix('.pdf').name)
+            # A converter that ignores the PDF folder leaves the PDF next to the document
+            stray = placed_path(filename).with_suffix('.pdf')
+            if error is None and not pdf.exists() and stray.exists():
+                move_file_to_dst(stray, pdf.parent)
+            filed = error is None and pdf.exists()
+            if error is not None:
+                failures.append((filename, error))
+            if folder in arrivals:
+                arrivals[folder].settle(pdf, filed)
+
+
+def merge_stage(arrivals: Dict[Path, Arrivals], max_pages: int | None, max_bytes: int | None) -> None:
+    """Merge the PDFs of each folder, appending every file as soon as it and all files before it are filed."""
+    # PyPDF2 is only loaded when there is something to merge
+    from ._pdfmerge import merge_and_write_pdf_files
+
+    for folder, pdf_files in arrivals.items():
+        with span('merge', 'stage', documents=len(pdf_files.expected)):
+            merge_and_write_pdf_files(folder, pdf_files=pdf_files, max_pages=max_pages, max_bytes=max_bytes)
+
+
+def plan_merges(pipeline: Pipeline, folders: List[Path], pending: List[Tuple[Dict[str, Any], Path]]
+                ) -> Dict[Path, Arrivals]:
+    """Decide which folders get a merged PDF, keeping the rules of categorize_directory."""
+    arrivals = {}
+    for folder in folders:
+        pdfs = {categorized_path(folder, filename.with_suffix('.pdf').name)
+                for _, filename in pending if filename.parent == folder}
+        merged_pdf_dir = folder / MERGED_PDF_FOLDER_NAME
+        if not pdfs and merged_pdf_dir.is_dir() and any(merged_pdf_dir.iterdir()):
+            logging.info('Merged PDF is current')
+            continue
+        expected = sorted(set(iter_pdf_files(folder)) | pdfs)
+        # Do not merge if there's only one file
+        if len(expected) < 2:
+            logging.warning('No additional PDF files')
+            continue
+        arrivals[folder] = Arrivals(expected, pdfs, pipeline)
+    return arrivals
+
+
+def run_pipeline(path: Union[str, Path], jobs: List[Tuple[Dict[str, Any], Path]], workers: int = 1,
+                 merge: bool = True, incremental: bool = True, converter: Converter | None = None,
+                 queue_size: int = QUEUE_SIZE, max_pages: int | None = None,
+                 max_bytes: int | None = None) -> List[Tuple[Path, str]]:
+    """
+    Render, convert, file and merge documents as a streaming pipeline.
+
+    Each stage runs in its own thread and takes documents from a bounded queue as soon as the
+    previous stage emits them, so conversion starts with the first rendered document and merging
+    with the first filed PDF. A full queue blocks the stage upstream. The result folders end up
+    as after convert_to_pdf and categorize_files(merge=True).
+
+    Args:
+        path: The template file's path.
+        jobs: (mapping, filename) pairs; the filenames may lie in several result folders.
+        workers: The number of processes used for rendering. Defaults to 1 (serial).
+        merge: Merge the PDFs of each result folder. Defaults to True.
+        incremental: Skip the records whose outputs are current. Defaults to True.
+        converter: The PDF converter. Defaults to default_converter().
+        queue_size: The maximum number of documents waiting between two stages.
+        max_pages: Split the merged PDF every max_pages pages. Defaults to MAX_PAGES of OA._pdfmerge: 0, no limit.
+        max_bytes: Split the merged PDF every max_bytes bytes of input. Defaults to MAX_BYTES of OA._pdfmerge: 0, no limit.
+
+    Returns:
+        A list of (filename, error message) pairs for the documents that failed to render or convert.
+    """
+    folders = list(dict.fromkeys(filename.parent for _, filename in jobs))
+    dir_names = [create_directories(src_dir_fd=folder, dst_dir_fds=DIRECTORY_NAMES) for folder in folders]
+
+    with Manifests() as manifests:
+        pending, digests = pending_jobs(path, jobs, manifests) if incremental else (jobs, {})
+
+        pipeline = Pipeline()
+        arrivals = plan_merges(pipeline, folders, pending) if merge else {}
+        render_failures, convert_failures = [], []
+        rendered, converted = queue.Queue(maxsize=queue_size), queue.Queue(maxsize=queue_size)
+
+        pipeline.start('render', render_stage, pipeline, path, pending, workers, rendered, render_failures,
+                       output=rendered)
+        pipeline.start('convert', convert_stage, pipeline, converter, rendered, converted, output=converted)
+        pipeline.start('file', file_stage, pipeline, converted, arrivals, convert_failures)
+        if arrivals:
+            pipeline.start('merge', merge_stage, arrivals, max_pages, max_bytes)
+        pipeline.join()
+
+        report_failures(render_failures, total=len(pending))
+        record_rendered(manifests, digests, render_failures)
+
+    for names in dir_names:
+        remove_empty_dirs(dir_names=names)
+    # Nothing is merged when every pending conversion failed
+    remove_empty_dirs(dir_names=[folder / MERGED_PDF_FOLDER_NAME for folder in arrivals])
+    failed = {filename for filename, _ in render_failures}
+    return render_failures + [failure for failure in convert_failures if failure[0] not in failed]
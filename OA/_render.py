@@ -1,12 +1,53 @@
 # -*- coding: utf-8 -*-
 
+import logging
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import ExitStack
 from datetime import date
 from pathlib import Path
-from typing import Any, Dict, Iterable, Union
+from typing import Any, Dict, Iterable, List, Tuple, Union
 
-from ._classify_files import categorize_files
-from ._convert2pdf import convert_to_pdf
+from more_itertools import divide
+
+from ._classify_files import categorized_path
 from ._docxtpl import docx_tpl_file
+from ._manifest import Manifests, record_digest, template_digest
+from ._sink import Sink, write_directory
+from ._trace import Span, active, count, span, tracing
+
+
+# Documents below which rendering stays serial: a worker process re-imports the stage and
+# compiles the template again, which costs more than it saves on a single company's filings
+PARALLEL_THRESHOLD = 48
+
+
+class RenderError(RuntimeError):
+    """
+    Raised after a run in which documents failed to render or convert; lists every failure.
+
+    Args:
+        failures: (filename, error message) pairs.
+        total: The number of documents of the run.
+    """
+
+    def __init__(self, failures: List[Tuple[Path, str]], total: int):
+        self.failures = sorted(failures)
+        self.total = total
+        lines = '\n'.join(f'  {filename.name}: {message}' for filename, message in self.failures)
+        super().__init__(f'{len(failures)} of {total} documents failed:\n{lines}')
+
+
+def raise_for_failures(failures: List[Tuple[Path, str]], total: int) -> None:
+    """
+    Raises a RenderError if any document failed.
+
+    Args:
+        failures: (filename, error message) pairs.
+        total: The number of documents of the run.
+    """
+    if failures:
+        raise RenderError(failures, total)
 
 
 def convert_date(data: Dict[str, Any]) -> Dict[str, Any]:
@@ -67,27 +108,250 @@ def default_fmt(mapping: Dict[str, Any]) -> str:
     return safe_format(fmt, mapping)
 
 
-@categorize_files(merge=True)
-@convert_to_pdf
-def render_docx(initial_data: Iterable[Dict[str, Any]], path: Union[str, Path], out_fd: Path, label: str):
+def build_filenames(initial_data: Iterable[Dict[str, Any]], out_fd: Path, label: str) -> List[Tuple[Dict[str, Any], Path]]:
+    """
+    Pairs each mapping with its output filename.
+
+    Names that would collide are suffixed with a running number in input order,
+    so the result does not depend on how the records are later distributed.
+
+    Args:
+        initial_data: Data for rendering the template.
+        out_fd: The output directory.
+        label: The worksheet label.
+
+    Returns:
+        A list of (mapping, filename) pairs.
+    """
+    jobs, seen = [], {}
+    for mapping in initial_data:
+        filename = out_fd.joinpath(tax_fmt(mapping) if label == 'Tax' else default_fmt(mapping))
+        count = seen[filename] = seen.get(filename, 0) + 1
+        if count > 1:
+            filename = filename.with_stem(f'{filename.stem}_{count}')
+        jobs.append((mapping, filename))
+    return jobs
+
+
+def render_shard(path: Union[str, Path], jobs: List[Tuple[Dict[str, Any], Path]]) -> List[Tuple[Path, str]]:
+    """
+    Renders a shard of records with one template.
+
+    The template comes from the per-process template cache, so each worker compiles it once.
+
+    Args:
+        path: The template file's path.
+        jobs: (mapping, filename) pairs to render.
+
+    Returns:
+        A list of (filename, error message) pairs for the records that failed.
+    """
+    failures = []
+    with ExitStack() as stack:
+        with span('template load', 'document', template=Path(path).name):
+            docx = stack.enter_context(docx_tpl_file(Path(path)))
+        for mapping, filename in jobs:
+            try:
+                # Render the DOCX template with converted dates
+                with span('render', 'document', file=filename.name):
+                    docx.render(convert_date(mapping))
+                # Save the rendered DOCX file
+                with span('save', 'document', file=filename.name):
+                    docx.save(filename)
+                count('files.rendered')
+                count('bytes.rendered', filename.stat().st_size)
+            except Exception as error:
+                failures.append((filename, f'{type(error).__name__}: {error}'))
+    return failures
+
+
+def traced_render_shard(path: Union[str, Path], jobs: List[Tuple[Dict[str, Any], Path]]
+                        ) -> Tuple[List[Tuple[Path, str]], List[Span], Dict[str, int]]:
+    """
+    Renders a shard in a worker process and returns what it traced, for merging into the parent's tracer.
+
+    Returns:
+        The failures, the recorded spans and the counters.
+    """
+    with tracing() as tracer:
+        failures = render_shard(path, jobs)
+    return failures, tracer.spans, dict(tracer.counters)
+
+
+def report_failures(failures: List[Tuple[Path, str]], total: int) -> None:
+    """
+    Logs an aggregated report of the records that failed to render.
+
+    Args:
+        failures: (filename, error message) pairs.
+        total: The number of records that were rendered.
+    """
+    if not failures:
+        logging.info(f'Rendered {total} documents')
+        return
+    lines = '\n'.join(f'  {filename.name}: {message}' for filename, message in sorted(failures))
+    logging.error(f'{len(failures)} of {total} documents failed to render:\n{lines}')
+
+
+def render_jobs(path: Union[str, Path], jobs: List[Tuple[Dict[str, Any], Path]], workers: int = 1,
+                incremental: bool = True) -> List[Tuple[Path, str]]:
+    """
+    Renders (mapping, filename) pairs with one template, serially or across a process pool.
+
+    With incremental, a record is skipped when the manifest of its result folder shows that the same
+    template and values already produced its filed DOCX and PDF, so only new or changed records are
+    rendered, converted and merged.
+
+    Args:
+        path: The template file's path.
+        jobs: (mapping, filename) pairs to render.
+        workers: The number of processes used for rendering. Defaults to 1 (serial).
+        incremental: Skip the records whose outputs are current. Defaults to True.
+
+    Returns:
+        A list of (filename, error message) pairs for the records that failed.
+    """
+    if not incremental:
+        return render_all(path, jobs, workers=workers)
+
+    with Manifests() as manifests:
+        pending, digests = pending_jobs(path, jobs, manifests)
+        failures = render_all(path, pending, workers=workers)
+        record_rendered(manifests, digests, failures)
+    return failures
+
+
+def pending_jobs(path: Union[str, Path], jobs: List[Tuple[Dict[str, Any], Path]],
+                 manifests: Manifests) -> Tuple[List[Tuple[Dict[str, Any], Path]], Dict[Path, str]]:
+    """
+    Drops the jobs whose filed DOCX and PDF were produced from the same template and values.
+
+    Args:
+        path: The template file's path.
+        jobs: (mapping, filename) pairs.
+        manifests: The manifests of the result folders.
+
+    Returns:
+        The jobs left to render, and the digest of each of them by filename.
+    """
+    template = template_digest(path)
+    pending, digests = [], {}
+    for mapping, filename in jobs:
+        digest = record_digest(template, convert_date(mapping), 'docx')
+        outputs = (categorized_path(filename.parent, filename.name),
+                   categorized_path(filename.parent, filename.with_suffix('.pdf').name))
+        if manifests[filename.parent].is_current(filename.name, digest, outputs):
+            count('files.skipped')
+            continue
+        pending.append((mapping, filename))
+        digests[filename] = digest
+
+    if len(pending) < len(jobs):
+        logging.info(f'Skipped {len(jobs) - len(pending)} of {len(jobs)} documents that are current')
+    return pending, digests
+
+
+def record_rendered(manifests: Manifests, digests: Dict[Path, str], failures: List[Tuple[Path, str]]) -> None:
+    """
+    Records the digests of the documents that rendered successfully, with their filed DOCX and PDF.
+    """
+    failed = {filename for filename, _ in failures}
+    for filename, digest in digests.items():
+        if filename not in failed:
+            outputs = (categorized_path(filename.parent, filename.name),
+                       categorized_path(filename.parent, filename.with_suffix('.pdf').name))
+            manifests[filename.parent].record(filename.name, digest, outputs)
+
+
+def render_all(path: Union[str, Path], jobs: List[Tuple[Dict[str, Any], Path]], workers: int = 1) -> List[Tuple[Path, str]]:
+    """
+    Renders every (mapping, filename) pair, serially or across a process pool, and reports the failures.
+    """
+    if not jobs:
+        return []
+    if workers > 1 and len(jobs) >= PARALLEL_THRESHOLD:
+        # Shard the records across a process pool, keeping the input order within each shard
+        shards = [list(shard) for shard in divide(min(workers, len(jobs)), jobs)]
+        tracer = active()
+        with span('render_docx', 'stage', documents=len(jobs), workers=len(shards)), \
+                ProcessPoolExecutor(max_workers=len(shards)) as executor:
+            if tracer is None:
+                results = executor.map(render_shard, [path] * len(shards), shards)
+            else:
+                # Worker processes trace on their own; their spans are merged here
+                results = []
+                for shard_failures, spans, counters in executor.map(traced_render_shard, [path] * len(shards), shards):
+                    tracer.merge(spans, counters)
+                    results.append(shard_failures)
+            failures = [failure for result in results for failure in result]
+    else:
+        with span('render_docx', 'stage', documents=len(jobs), workers=1):
+            failures = render_shard(path, jobs)
+
+    report_failures(failures, total=len(jobs))
+    return failures
+
+
+def render_to_sink(path: Union[str, Path], jobs: List[Tuple[Dict[str, Any], Path]], sink: Sink,
+                   workers: int = 1) -> None:
+    """
+    Renders (mapping, filename) pairs with one template and writes the documents, their PDFs and
+    the merged PDF into a sink.
+
+    The converters read and write files, so the pipeline runs in a scratch directory that is
+    removed afterwards; the sink receives its Word, PDF and merged PDF folders.
+
+    Args:
+        path: The template file's path.
+        jobs: (mapping, filename) pairs to render.
+        sink: Receives the outputs.
+        workers: The number of processes used for rendering. Defaults to 1 (serial).
+
+    Raises:
+        RenderError: If a document failed to render or convert; nothing is written to the sink then.
+    """
+    from ._pipeline import run_pipeline
+
+    with tempfile.TemporaryDirectory(prefix='oa_sink_') as scratch:
+        scratch = Path(scratch)
+        failures = run_pipeline(path, [(mapping, scratch / filename.name) for mapping, filename in jobs],
+                                workers=workers, incremental=False)
+        raise_for_failures(failures, len(jobs))
+        write_directory(sink, scratch)
+
+
+def render_docx(initial_data: Iterable[Dict[str, Any]], path: Union[str, Path], out_fd: Path, label: str,
+                workers: int = 1, sink: Sink | None = None):
     """
     Renders a DOCX template with given data and saves it to a specified path.
 
+    Rendering, PDF conversion, filing into the Word and PDF folders and merging run as one
+    streaming pipeline, so each document moves on as soon as the previous stage is done with it.
+    With a sink, the same folders are written into it instead of out_fd.
+
     Args:
         initial_data: Data for rendering the template.
         path: The template file's path.
         out_fd: The output directory.
         label: The worksheet label.
+        workers: The number of processes used for rendering, from PARALLEL_THRESHOLD documents on.
+            Defaults to 1 (serial).
+        sink: Write the documents into this sink instead of out_fd. Defaults to None.
+
+    Returns:
+        The output directory, or Path() for the root of the sink.
+
+    Raises:
+        RenderError: If a document failed to render or convert, once every other document is done.
+            Without a PDF converter the documents are kept as DOCX and only a warning is logged.
     """
-    # Open the template document
-    with docx_tpl_file(path) as docx:
-        # Iterate over the initial data
-        for mapping in initial_data:
-            # Render the DOCX template with converted dates
-            docx.render(convert_date(mapping))
-            # Generate the filename based on the label
-            filename = out_fd.joinpath(tax_fmt(mapping) if label == 'Tax' else default_fmt(mapping))
-            # Save the rendered DOCX file
-            docx.save(filename)
+    if sink is not None:
+        render_to_sink(path, build_filenames(initial_data, out_fd, label), sink, workers=workers)
+        return Path()
+
+    from ._pipeline import run_pipeline
+
+    jobs = build_filenames(initial_data, out_fd, label)
+    raise_for_failures(run_pipeline(path, jobs, workers=workers), len(jobs))
     # Return the output directory Path object
     return out_fd
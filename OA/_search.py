@@ -1,12 +1,220 @@
 # -*- coding: utf-8 -*-
 
+import logging
+import os
+import re
+import threading
+from collections import namedtuple
+from dataclasses import dataclass
+from functools import lru_cache
 from pathlib import Path
-from typing import Optional
+from typing import Dict, FrozenSet, Iterable, List, Optional, Tuple
+from zipfile import BadZipFile, ZipFile
 
 # Define base directories
 BASE_DIR = Path(__file__).parent.resolve()  # The directory containing this script.
 TEMPLATE_DIR = BASE_DIR / 'Template'  # The directory for storing templates.
 
+# Extra template directories, separated by os.pathsep; they take precedence over TEMPLATE_DIR
+TEMPLATE_PATH_ENV = 'OA_TEMPLATE_PATH'
+
+# Template kinds by file suffix
+KINDS = {'docx': 'word', 'xlsx': 'excel', 'xls': 'excel'}
+
+# Parts of a Word document that may hold placeholders
+DOCX_PARTS = re.compile(r'word/(document|header\d*|footer\d*)\.xml')
+XML_TAG = re.compile(r'<[^>]+>')
+# {{ name }}, {%p if name %} and {%tr for row in name %}, as docxtpl writes them
+VARIABLE = re.compile(r'\{\{-?\s*([A-Za-z_]\w*)')
+STATEMENT = re.compile(r'\{%-?[a-z]{0,2}\s+(?:if|elif|for\s+([\w\s,]+?)\s+in)\s+([A-Za-z_]\w*)')
+
+# Names a template takes from the data (defined names for .xls workbooks), and the cells it writes
+TemplateMetadata = namedtuple('TemplateMetadata', ['placeholders', 'cells'])
+
+
+def docx_placeholders(path: Path) -> FrozenSet[str]:
+    """
+    Return the top-level names a Word template reads, skipping its loop variables.
+
+    :param path: The template file.
+    """
+    names, loop_variables = set(), set()
+    with ZipFile(path) as archive:
+        for part in archive.namelist():
+            if not DOCX_PARTS.fullmatch(part):
+                continue
+            text = XML_TAG.sub('', archive.read(part).decode('utf-8'))
+            names.update(VARIABLE.findall(text))
+            for targets, source in STATEMENT.findall(text):
+                names.add(source)
+                loop_variables.update(target.strip() for target in targets.split(',') if target.strip())
+    return frozenset(names - loop_variables)
+
+
+@lru_cache(maxsize=64)
+def _metadata(path: Path, mtime_ns: int, size: int) -> TemplateMetadata:
+    suffix = path.suffix.lower().lstrip('.')
+    try:
+        if suffix == 'docx':
+            return TemplateMetadata(docx_placeholders(path), ())
+        if suffix == 'xls':
+            from ._biff import load_biff_template
+            names = load_biff_template(path).names
+            return TemplateMetadata(frozenset(name for name, _ in names),
+                                    tuple(sorted({cell for cells in names.values() for cell in cells})))
+        if suffix == 'xlsx':
+            from ._sentence import LAYOUTS, PERIOD_FIELDS, REGISTER_FIELDS, layout_cells
+            if path.name in LAYOUTS:
+                return TemplateMetadata(frozenset(REGISTER_FIELDS + PERIOD_FIELDS), tuple(layout_cells(path.name)))
+    except (BadZipFile, KeyError, OSError, ValueError) as error:
+        logging.warning(f'Cannot read the metadata of template {path}: {error}')
+    return TemplateMetadata(frozenset(), ())
+
+
+@dataclass(frozen=True)
+class TemplateInfo:
+    """
+    One indexed template file.
+
+    :param name: The file name without its suffix.
+    :param suffix: The lower-case suffix without the dot.
+    :param kind: 'word' or 'excel', or the suffix for other files.
+    :param path: The template file.
+    :param root: The template directory it was found in.
+    """
+    name: str
+    suffix: str
+    kind: str
+    path: Path
+    root: Path
+
+    @property
+    def metadata(self) -> TemplateMetadata:
+        """The placeholders and target cells, read once per version of the file."""
+        stat = self.path.stat()
+        return _metadata(self.path, stat.st_mtime_ns, stat.st_size)
+
+    @property
+    def placeholders(self) -> FrozenSet[str]:
+        return self.metadata.placeholders
+
+    @property
+    def cells(self) -> Tuple:
+        return self.metadata.cells
+
+    def missing_fields(self, fields: Iterable[str]) -> List[str]:
+        """
+        Return the placeholders of the template that fields does not provide.
+
+        :param fields: The keys of the input data.
+        """
+        return sorted(self.placeholders.difference(fields))
+
+
+class TemplateRegistry:
+    """
+    An index of the templates under some directories, keyed by name and suffix.
+
+    The directories are scanned once; a lookup only compares the modification times of the
+    scanned directories and scans again when one of them changed. When a name and suffix
+    occur more than once, the first root wins and the duplicates are reported by ambiguities.
+
+    :param roots: The template directories, in order of precedence.
+    """
+
+    def __init__(self, roots: Iterable[Path]):
+        self.roots = [Path(root).resolve() for root in roots]
+        self._index: Dict[Tuple[str, str], List[TemplateInfo]] = {}
+        self._stamps: Dict[Path, int] = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _stamp(directory: Path) -> int:
+        try:
+            return directory.stat().st_mtime_ns
+        except FileNotFoundError:
+            return -1
+
+    def _stale(self) -> bool:
+        return not self._stamps or any(self._stamp(directory) != stamp for directory, stamp in self._stamps.items())
+
+    def _scan(self) -> None:
+        index, stamps = {}, {}
+        for root in self.roots:
+            stamps[root] = self._stamp(root)
+            for directory, dirnames, filenames in os.walk(root):
+                dirnames.sort()
+                stamps[Path(directory)] = self._stamp(Path(directory))
+                for filename in sorted(filenames):
+                    # Skip Office lock files and hidden files
+                    if filename.startswith(('~$', '.')):
+                        continue
+                    path = Path(directory, filename)
+                    suffix = path.suffix.lower().lstrip('.')
+                    info = TemplateInfo(path.stem, suffix, KINDS.get(suffix, suffix), path, root)
+                    index.setdefault((info.name, suffix), []).append(info)
+
+        for (name, suffix), matches in index.items():
+            if len({info.root for info in matches}) < len(matches):
+                logging.warning(f'Ambiguous template {name}.{suffix}: {", ".join(str(i.path) for i in matches)}')
+        self._index, self._stamps = index, stamps
+
+    def refresh(self, force: bool = False) -> None:
+        """
+        Scan the directories again if any of them changed.
+
+        :param force: Scan even if nothing changed.
+        """
+        with self._lock:
+            if force or self._stale():
+                self._scan()
+
+    def get(self, name: str, suffix: str = 'docx') -> Optional[TemplateInfo]:
+        """
+        Return the template with a name and suffix, or None if there is none.
+
+        :param name: The file name without its suffix.
+        :param suffix: The file suffix. Defaults to 'docx'.
+        """
+        self.refresh()
+        matches = self._index.get((name, suffix.lower().lstrip('.')))
+        return matches[0] if matches else None
+
+    def templates(self, kind: str | None = None) -> List[TemplateInfo]:
+        """
+        Return the templates that win their lookups, optionally only those of one kind.
+
+        :param kind: 'word' or 'excel'. Defaults to every kind.
+        """
+        self.refresh()
+        return [matches[0] for matches in self._index.values() if kind is None or matches[0].kind == kind]
+
+    def ambiguities(self) -> Dict[Tuple[str, str], List[Path]]:
+        """Return every name and suffix found more than once, with all of its files."""
+        self.refresh()
+        return {key: [info.path for info in matches] for key, matches in self._index.items() if len(matches) > 1}
+
+
+def template_roots() -> List[Path]:
+    """Return the directories configured through OA_TEMPLATE_PATH, followed by TEMPLATE_DIR."""
+    extra = [Path(entry) for entry in os.environ.get(TEMPLATE_PATH_ENV, '').split(os.pathsep) if entry]
+    return extra + [TEMPLATE_DIR]
+
+
+_registries: Dict[Tuple[Path, ...], TemplateRegistry] = {}
+
+
+def template_registry(path: str | None = None) -> TemplateRegistry:
+    """
+    Return the shared registry of a template directory, or of the configured template directories.
+
+    :param path: The directory to index. Defaults to template_roots().
+    """
+    roots = (Path(path).resolve(),) if path else tuple(root.resolve() for root in template_roots())
+    if roots not in _registries:
+        _registries[roots] = TemplateRegistry(roots)
+    return _registries[roots]
+
 
 def search_template_file(name: str, suffix: str = 'docx', path: str | None = None) -> Optional[Path]:
     """
@@ -17,15 +225,11 @@ def search_template_file(name: str, suffix: str = 'docx', path: str | None = Non
     - name (str): The base name of the file to search for.
     - suffix (str, optional): The file suffix (extension) to look for. Defaults to 'docx'.
     - path (Optional[str], optional): The directory to search within.
-    If not specified, searches within the default template directory.
+    If not specified, searches within the configured template directories.
 
     Returns:
     - Optional[Path]: The path to the found file, or None if no matching file is found.
     """
-    # Determine the directory to search in: either the provided path or the default template directory.
-    search_path = Path(path) if path else TEMPLATE_DIR
-    # Use rglob to recursively search for files matching the specified name and suffix.
-    template_files = search_path.rglob(f"{name}.{suffix}")
-
-    # Attempt to return the first matching file, if any. Otherwise, return None.
-    return next(template_files, None)
+    # Look the file up in the index of the directory instead of walking it on every call.
+    info = template_registry(path).get(name, suffix)
+    return info.path if info else None
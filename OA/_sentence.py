@@ -1,64 +1,91 @@
 # -*- coding: utf-8 -*-
 
-from dataclasses import dataclass, InitVar, field
-from string import Template
-from typing import Any
-
-
-@dataclass
-class Taxpayer:
-    """纳税人基类 Taxpayer base class."""
-    database: InitVar[Any] = None
-    __name: str = field(init=False)
-    __code: str = field(init=False)
-    __date: str = field(init=False)
-    __agent: str = field(init=False)
-    __agent_id: str = field(init=False)
-
-    def __post_init__(self, database):
-        if database:
-            self.__name = Template('纳税人名称:$CN').substitute(CN=database['CN'])  # 纳税人名称
-            self.__code = Template('纳税人识别号(统一社会信用代码):$CC').substitute(CC=database['CC'])  # 纳税人识别号
-            self.__date = Template('$Date').substitute(Date=database['Date'])  # 填报日期
-            self.__agent = Template('经办人:$Ag').substitute(Ag=database['Name'])  # 经办人
-            self.__agent_id = Template('经办人身份证号码:$AID').substitute(AID=database['IDN'])  # 经办人身份证号码
-
-
-@dataclass
-class SmallScale(Taxpayer):
-    """小规模纳税人 Small-scale taxpayer."""
-    A4: str = field(init=False)
-    A5: str = field(init=False)
-    G6: str = field(init=False)
-    G40: str = field(init=False)
-    A41: str = field(init=False)
-    A42: str = field(init=False)
-
-    def __post_init__(self, database):
-        super().__post_init__(database)
-        self.A4 = self._Taxpayer__name  # 纳税人名称
-        self.A5 = self._Taxpayer__code  # 纳税人识别号
-        self.G6 = self._Taxpayer__date  # 填报日期
-        self.G40 = self._Taxpayer__date  # 填报日期
-        self.A41 = self._Taxpayer__agent  # 经办人
-        self.A42 = self._Taxpayer__agent_id  # 经办人身份证号码
-
-
-@dataclass
-class General(Taxpayer):
-    """一般纳税人 General taxpayer"""
-    A6: str = field(init=False)
-    A7: str = field(init=False)
-    U5: str = field(init=False)
-    AK54: str = field(init=False)
-    A55: str = field(init=False)
-    A56: str = field(init=False)
-
-    def __post_init__(self, database):
-        super().__post_init__(database)
-        self.A7 = self._Taxpayer__name  # 纳税人名称
-        self.A6 = self._Taxpayer__code  # 纳税人识别号
-        self.U5 = self._Taxpayer__date  # 填报日期
-        self.AK54 = self._Taxpayer__date  # 填报日期
-        self.A55 = self._Taxpayer__agent  # 经办人
-        self.A56 = self._Taxpayer__agent_id  # 经办人身份证号码
+from typing import Any, Callable, Dict, Iterable, List, Mapping, Tuple
+
+# Register keys written by every taxpayer layout, and the keys of the period of tax payment
+REGISTER_FIELDS = ('CN', 'CC', 'Date', 'Name', 'IDN')
+PERIOD_FIELDS = ('Start', 'End')
+
+# Text written into the return, by the role of the cell
+FORMATS = {
+    'name': '纳税人名称:{CN}',  # 纳税人名称
+    'code': '纳税人识别号(统一社会信用代码):{CC}',  # 纳税人识别号
+    'date': '{Date}',  # 填报日期
+    'agent': '经办人:{Name}',  # 经办人
+    'agent_id': '经办人身份证号码:{IDN}',  # 经办人身份证号码
+    'period': '税款所属期：{Start:%Y年%m月%d日}至{End:%Y年%m月%d日}',  # 税款所属期
+}
+
+# 小规模纳税人 Small-scale taxpayer: cell -> role
+SMALL_SCALE = {
+    'A4': 'name',
+    'A5': 'code',
+    'G6': 'date',
+    'G40': 'date',
+    'A41': 'agent',
+    'A42': 'agent_id',
+    'A6': 'period',
+}
+
+# 一般纳税人 General taxpayer: cell -> role
+GENERAL = {
+    'A6': 'code',
+    'A7': 'name',
+    'U5': 'date',
+    'AK54': 'date',
+    'A55': 'agent',
+    'A56': 'agent_id',
+    'A5': 'period',
+}
+
+
+class CellMap:
+    """
+    A taxpayer layout compiled into the cells of the return and the formatter of each.
+
+    The format strings are bound once, so the values of a record are produced by one call per
+    cell, without intermediate objects.
+
+    :param layout: The role of every cell, see FORMATS.
+    """
+    __slots__ = ('cells', 'formatters')
+
+    def __init__(self, layout: Mapping[str, str]):
+        self.cells: Tuple[str, ...] = tuple(layout)
+        self.formatters: Tuple[Callable[[Mapping[str, Any]], str], ...] = tuple(
+            FORMATS[role].format_map for role in layout.values())
+
+    def __iter__(self):
+        return zip(self.cells, self.formatters)
+
+    def __len__(self):
+        return len(self.cells)
+
+    def values(self, mapping: Mapping[str, Any]) -> Dict[str, str]:
+        """
+        Return the cell values of one record.
+
+        :param mapping: The register data merged with one period.
+        """
+        return dict(zip(self.cells, [formatter(mapping) for formatter in self.formatters]))
+
+    def values_many(self, mappings: Iterable[Mapping[str, Any]]) -> List[Dict[str, str]]:
+        """
+        Return the cell values of many records at once.
+
+        :param mappings: The register data merged with each period.
+        """
+        cells, formatters = self.cells, self.formatters
+        return [dict(zip(cells, [formatter(mapping) for formatter in formatters])) for mapping in mappings]
+
+
+# Compiled taxpayer layouts, keyed by workbook name
+LAYOUTS = {
+    '小规模.xlsx': CellMap(SMALL_SCALE),
+    '一般纳税人.xlsx': CellMap(GENERAL),
+}
+
+
+def layout_cells(name: str) -> list:
+    """Return every cell written for the workbook called name."""
+    return list(LAYOUTS[name].cells)
@@ -0,0 +1,205 @@
+# -*- coding: utf-8 -*-
+
+import hashlib
+import tarfile
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from io import BytesIO
+from pathlib import Path, PurePosixPath
+from typing import BinaryIO, Dict, Iterator, Tuple, Union
+from zipfile import ZipFile, ZipInfo, ZIP_DEFLATED, ZIP_STORED
+
+from ._autozip import DIGEST_PREFIX
+from ._classify_files import categorized_path
+from ._trace import count, span
+
+# Outputs that are zip packages already and gain nothing from being deflated again
+STORED_SUFFIXES = ('.docx', '.xlsx', '.zip')
+# Archive suffixes recognized by open_sink, and the tarfile compression each one selects
+TAR_SUFFIXES = {'.tar': '', '.tgz': 'gz', '.gz': 'gz', '.bz2': 'bz2', '.xz': 'xz'}
+
+
+class Sink(ABC):
+    """
+    Receives the files a stage produces, each written once as a whole.
+
+    Names are relative POSIX paths, e.g. 'PDF/24_0331.pdf'. A sink is a context manager and is
+    closed when the block exits.
+    """
+
+    @abstractmethod
+    def write(self, name: str, data: bytes) -> None:
+        """
+        Adds one file.
+
+        Args:
+            name: The relative path of the file.
+            data: The file content.
+        """
+
+    def close(self) -> None:
+        """Flushes and releases the sink."""
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+
+class DirectorySink(Sink):
+    """
+    Writes the files below a directory, as the stages do without a sink.
+
+    Args:
+        path: The directory.
+    """
+
+    def __init__(self, path: Union[str, Path]):
+        self.path = Path(path)
+
+    def write(self, name: str, data: bytes) -> None:
+        target = self.path / name
+        target.parent.mkdir(parents=True, exist_ok=True)
+        target.write_bytes(data)
+        count('bytes.written', len(data))
+
+
+class ZipSink(Sink):
+    """
+    Writes the files as members of a zip archive.
+
+    Each member records the SHA-256 of its content in its comment, as auto_zip does, and
+    packages that are compressed already (DOCX, XLSX) are stored instead of deflated again.
+
+    Args:
+        target: The archive path, or a writable binary stream.
+        compresslevel: The zlib compression level. Defaults to 6.
+    """
+
+    def __init__(self, target: Union[str, Path, BinaryIO], compresslevel: int = 6):
+        self.target = target
+        self.archive = ZipFile(target, 'w', compression=ZIP_DEFLATED, compresslevel=compresslevel)
+
+    def write(self, name: str, data: bytes) -> None:
+        zinfo = ZipInfo(name, time.localtime()[:6])
+        zinfo.compress_type = ZIP_STORED if Path(name).suffix.lower() in STORED_SUFFIXES else ZIP_DEFLATED
+        zinfo.external_attr = 0o644 << 16
+        zinfo.comment = (DIGEST_PREFIX + hashlib.sha256(data).hexdigest()).encode('ascii')
+        with span('zip', 'document', file=name):
+            self.archive.writestr(zinfo, data)
+        count('files.zipped')
+
+    def close(self) -> None:
+        self.archive.close()
+
+
+class TarSink(Sink):
+    """
+    Writes the files as members of a tar stream, which never seeks and so can go to a pipe or socket.
+
+    Args:
+        target: The archive path, or a writable binary stream.
+        compression: '', 'gz', 'bz2' or 'xz'. Defaults to 'gz'.
+    """
+
+    def __init__(self, target: Union[str, Path, BinaryIO], compression: str = 'gz'):
+        mode = f'w|{compression}'
+        if isinstance(target, (str, Path)):
+            self.archive = tarfile.open(name=target, mode=mode)
+        else:
+            self.archive = tarfile.open(fileobj=target, mode=mode)
+
+    def write(self, name: str, data: bytes) -> None:
+        member = tarfile.TarInfo(name)
+        member.size, member.mtime, member.mode = len(data), int(time.time()), 0o644
+        with span('tar', 'document', file=name):
+            self.archive.addfile(member, BytesIO(data))
+        count('files.archived')
+
+    def close(self) -> None:
+        self.archive.close()
+
+
+class MemorySink(Sink):
+    """
+    Keeps the files in memory, in the order they were written, to hand them to the next stage.
+    """
+
+    def __init__(self):
+        self.files: Dict[str, bytes] = OrderedDict()
+
+    def write(self, name: str, data: bytes) -> None:
+        self.files[name] = data
+
+    def items(self) -> Iterator[Tuple[str, bytes]]:
+        """Yields (name, content) pairs."""
+        return iter(self.files.items())
+
+    def copy_to(self, sink: Sink) -> Sink:
+        """
+        Writes every file into another sink.
+
+        Args:
+            sink: The receiving sink.
+
+        Returns:
+            The receiving sink.
+        """
+        for name, data in self.items():
+            sink.write(name, data)
+        return sink
+
+
+def open_sink(target: Union[str, Path, None]) -> Sink:
+    """
+    Returns the sink for a target: a zip or tar archive by suffix, a directory otherwise, or memory for None.
+
+    Args:
+        target: The archive or directory path, or None.
+
+    Returns:
+        The sink, to be closed by the caller.
+    """
+    if target is None:
+        return MemorySink()
+    path = Path(target)
+    suffix = path.suffix.lower()
+    if suffix == '.zip':
+        return ZipSink(path)
+    if suffix in TAR_SUFFIXES and (suffix in ('.tar', '.tgz') or path.stem.lower().endswith('.tar')):
+        return TarSink(path, compression=TAR_SUFFIXES[suffix])
+    return DirectorySink(path)
+
+
+def write_directory(sink: Sink, folder: Path, prefix: str = '') -> Sink:
+    """
+    Writes every file below a directory into a sink, under its path relative to the directory.
+
+    The manifests that make reruns incremental stay behind, since a sink is written once.
+
+    Args:
+        sink: The receiving sink.
+        folder: The directory.
+        prefix: A folder to put the members in, e.g. a result folder name.
+
+    Returns:
+        The receiving sink.
+    """
+    from ._manifest import MANIFEST_FILES
+
+    for path in sorted(folder.rglob('*')):
+        if path.is_file() and path.name not in MANIFEST_FILES:
+            sink.write((PurePosixPath(prefix) / path.relative_to(folder).as_posix()).as_posix(), path.read_bytes())
+    return sink
+
+
+def member_name(name: str) -> str:
+    """
+    Returns the member name of an output, in the PDF, Word or Excel folder categorize_files would file it in.
+
+    Args:
+        name: The output file name.
+    """
+    return categorized_path(Path(), name).as_posix()
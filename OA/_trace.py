@@ -0,0 +1,198 @@
+# -*- coding: utf-8 -*-
+
+import json
+import os
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import asdict, dataclass, field
+from functools import wraps
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Union
+
+
+@dataclass(frozen=True)
+class Span:
+    """One timed section of a run. Times are perf_counter seconds, comparable across processes."""
+    name: str
+    category: str
+    start: float
+    duration: float
+    pid: int
+    tid: int
+    args: Dict[str, Any] = field(default_factory=dict)
+
+
+@dataclass
+class StageStats:
+    """Aggregated timings of all spans sharing a name."""
+    count: int = 0
+    total: float = 0.0
+    max: float = 0.0
+
+    def add(self, duration: float) -> None:
+        self.count += 1
+        self.total += duration
+        self.max = max(self.max, duration)
+
+
+@dataclass
+class RunReport:
+    """
+    The structured report of one traced run.
+
+    Attributes:
+        result: The result folder of the run, or the list of result folders of a batch;
+            relative to the sink when the run writes into one.
+        wall: Wall time of the whole run, in seconds.
+        stages: Timings aggregated by span name.
+        counters: Files and bytes counted by the stages.
+        spans: Every recorded span, in start order.
+        origin: The perf_counter value at which the run started.
+    """
+    result: Any
+    wall: float
+    stages: Dict[str, StageStats]
+    counters: Dict[str, int]
+    spans: List[Span]
+    origin: float
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Return the report as JSON-serializable data, with span starts relative to the run."""
+        return {
+            'result': None if self.result is None else str(self.result),
+            'wall': round(self.wall, 6),
+            'stages': {name: asdict(stats) for name, stats in self.stages.items()},
+            'counters': dict(self.counters),
+            'spans': [dict(asdict(span), start=round(span.start - self.origin, 6)) for span in self.spans],
+        }
+
+    def write_json(self, path: Union[str, Path]) -> Path:
+        """Write the report as JSON."""
+        path = Path(path)
+        path.write_text(json.dumps(self.to_dict(), ensure_ascii=False, indent=2, default=str), encoding='utf-8')
+        return path
+
+    def write_chrome_trace(self, path: Union[str, Path]) -> Path:
+        """Write the spans in the Chrome trace event format, viewable in chrome://tracing or Perfetto."""
+        events = [{
+            'name': span.name,
+            'cat': span.category,
+            'ph': 'X',
+            'ts': (span.start - self.origin) * 1e6,
+            'dur': span.duration * 1e6,
+            'pid': span.pid,
+            'tid': span.tid,
+            'args': span.args,
+        } for span in self.spans]
+        end = self.wall * 1e6
+        events.extend({'name': name, 'ph': 'C', 'ts': end, 'pid': os.getpid(), 'args': {name: value}}
+                      for name, value in self.counters.items())
+
+        path = Path(path)
+        path.write_text(json.dumps({'traceEvents': events, 'displayTimeUnit': 'ms'},
+                                   ensure_ascii=False, default=str), encoding='utf-8')
+        return path
+
+
+class Tracer:
+    """Collects spans and counters from every thread of a run."""
+
+    def __init__(self):
+        self.origin = time.perf_counter()
+        self.spans: List[Span] = []
+        self.counters: Counter = Counter()
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def span(self, name: str, category: str = 'stage', **args):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            record = Span(name, category, start, time.perf_counter() - start,
+                          os.getpid(), threading.get_ident(), args)
+            with self._lock:
+                self.spans.append(record)
+
+    def count(self, name: str, value: int = 1) -> None:
+        with self._lock:
+            self.counters[name] += value
+
+    def merge(self, spans: Iterable[Span], counters: Dict[str, int]) -> None:
+        """Add the spans and counters recorded by another tracer, e.g. in a worker process."""
+        with self._lock:
+            self.spans.extend(spans)
+            self.counters.update(counters)
+
+    def report(self, result: Any = None) -> RunReport:
+        """Build the report of everything recorded so far."""
+        with self._lock:
+            spans = sorted(self.spans, key=lambda span: span.start)
+            counters = dict(self.counters)
+        stages: Dict[str, StageStats] = {}
+        for span in spans:
+            stages.setdefault(span.name, StageStats()).add(span.duration)
+        return RunReport(result=result, wall=time.perf_counter() - self.origin, stages=stages,
+                         counters=counters, spans=spans, origin=self.origin)
+
+
+# The tracer of the run in progress in this context; None when tracing is off.
+# Runs in different threads, e.g. concurrent daemon jobs, each see their own tracer.
+_active: ContextVar[Optional[Tracer]] = ContextVar('oa_tracer', default=None)
+
+
+def active() -> Optional[Tracer]:
+    """Return the tracer of the run in progress, if any."""
+    return _active.get()
+
+
+@contextmanager
+def using(tracer: Optional[Tracer]):
+    """Make a tracer the active one while the block runs, e.g. in a thread working for a run."""
+    token = _active.set(tracer)
+    try:
+        yield tracer
+    finally:
+        _active.reset(token)
+
+
+def tracing():
+    """Record spans and counters of a new tracer while the block runs."""
+    return using(Tracer())
+
+
+def carry(func):
+    """
+    Bind a callable to the tracer active now, for running it in another thread.
+
+    New threads and pool threads do not inherit the tracer of the thread that starts them.
+    """
+    tracer = _active.get()
+
+    @wraps(func)
+    def wrapper(*args, **kwargs):
+        with using(tracer):
+            return func(*args, **kwargs)
+
+    return wrapper
+
+
+@contextmanager
+def span(name: str, category: str = 'stage', **args):
+    """Time the block as a span of the active tracer; does nothing when tracing is off."""
+    tracer = _active.get()
+    if tracer is None:
+        yield
+        return
+    with tracer.span(name, category, **args):
+        yield
+
+
+def count(name: str, value: int = 1) -> None:
+    """Add to a counter of the active tracer; does nothing when tracing is off."""
+    tracer = _active.get()
+    if tracer is not None:
+        tracer.count(name, value)
@@ -0,0 +1,277 @@
+# -*- coding: utf-8 -*-
+
+import logging
+import re
+from collections import namedtuple
+from datetime import date
+from typing import Any, Callable, Dict, FrozenSet, Iterable, List, Optional, Sequence, Tuple
+
+from ._sentence import PERIOD_FIELDS, REGISTER_FIELDS
+from ._trace import count, span
+from .timeperiod import MONTHS_PER_PERIOD, NO_FREQ, _as_date
+
+# 统一社会信用代码 (GB 32100-2015): the characters allowed and the weights of the first 17, 3^i mod 31
+CC_CHARS = '0123456789ABCDEFGHJKLMNPQRTUWXY'
+CC_WEIGHTS = tuple(3 ** i % 31 for i in range(17))
+CC_PATTERN = re.compile(rf'[{CC_CHARS}]{{18}}')
+# 纳税人识别号 issued before the unified codes: 15 characters (region and organization code),
+# or 20 (an identity card number and two digits); they carry no check character of their own
+LEGACY_TAXPAYER_PATTERN = re.compile(r'[0-9A-Z]{15}|[0-9A-Z]{20}')
+# 居民身份证号码 (GB 11643-1999): the weights of the first 17 digits and the check characters
+IDN_WEIGHTS = (7, 9, 10, 5, 8, 4, 2, 1, 6, 3, 7, 9, 10, 5, 8, 4, 2)
+IDN_CHECKS = '10X98765432'
+IDN_PATTERN = re.compile(r'\d{17}[\dX]')
+
+# The templates filled by the Excel stages; every other template is a Word document
+VAT_TEMPLATES = ('小规模', '一般纳税人')
+PIT_TEMPLATE = '个税压缩包'
+# Register keys the personal income tax workbooks need; every key is written to the cell of that name
+PIT_FIELDS = REGISTER_FIELDS + ('LP',)
+PIT_WORKBOOK = '2019'
+# Keys that choose the template and the periods instead of being written
+CONTROL_FIELDS = ('Template', 'Freq')
+PERIOD_KEYS = ('Start', 'End', 'Freq')
+
+# One problem found in the input: the record index, the company name, the field and what is wrong
+Issue = namedtuple('Issue', ['row', 'company', 'field', 'message'])
+
+
+class ValidationError(ValueError):
+    """
+    Raised before a run starts when some records are invalid; lists every problem found.
+
+    :param issues: The problems, in record order.
+    """
+
+    def __init__(self, issues: Sequence[Issue]):
+        self.issues = list(issues)
+        super().__init__(format_issues(self.issues))
+
+
+def format_issues(issues: Sequence[Issue]) -> str:
+    """
+    Return a report with one line per problem.
+
+    :param issues: The problems found.
+    """
+    lines = '\n'.join(f'  record {issue.row + 1} ({issue.company or "?"}) {issue.field}: {issue.message}'
+                      for issue in issues)
+    return f'{len(issues)} problem{"s" if len(issues) > 1 else ""} in the input:\n{lines}'
+
+
+def _is_blank(value: Any) -> bool:
+    return value is None or (isinstance(value, float) and value != value) or str(value).strip() == ''
+
+
+def is_blank_record(record: Dict[str, Any]) -> bool:
+    """
+    Return whether a record holds nothing but the template and frequency, like the empty
+    rows a worksheet table ends with.
+
+    :param record: The record.
+    """
+    return all(_is_blank(value) for key, value in record.items() if key.capitalize() not in CONTROL_FIELDS)
+
+
+def cc_check_char(code: str) -> str:
+    """
+    Return the check character of a unified social credit code.
+
+    :param code: The first 17 characters of the code.
+    """
+    total = sum(CC_CHARS.index(char) * weight for char, weight in zip(code, CC_WEIGHTS))
+    return CC_CHARS[(31 - total % 31) % 31]
+
+
+def idn_check_char(number: str) -> str:
+    """
+    Return the check character of a resident identity card number.
+
+    :param number: The first 17 digits of the number.
+    """
+    return IDN_CHECKS[sum(int(digit) * weight for digit, weight in zip(number, IDN_WEIGHTS)) % 11]
+
+
+def check_cc(value: Any) -> Optional[str]:
+    """
+    Return what is wrong with a taxpayer identification number, or None if it is valid.
+
+    Unified social credit codes (18 characters) are checked against their check character;
+    the 15 and 20 character numbers issued before them are only checked for their form.
+
+    :param value: The code.
+    """
+    code = str(value).strip().upper()
+    if len(code) in (15, 20):
+        if LEGACY_TAXPAYER_PATTERN.fullmatch(code):
+            return None
+        return f'{value!r} is not a 15 or 20 character taxpayer number'
+    if not CC_PATTERN.fullmatch(code):
+        return f'{value!r} is neither 18 characters of {CC_CHARS} nor a 15 or 20 character taxpayer number'
+    if cc_check_char(code[:17]) != code[17]:
+        return f'{value!r} has check character {code[17]}, expected {cc_check_char(code[:17])}'
+    return None
+
+
+def check_idn(value: Any) -> Optional[str]:
+    """
+    Return what is wrong with a resident identity card number, or None if it is valid.
+
+    :param value: The number.
+    """
+    number = str(value).strip().upper()
+    if not IDN_PATTERN.fullmatch(number):
+        return f'{value!r} is not 17 digits and a check digit'
+    try:
+        date(int(number[6:10]), int(number[10:12]), int(number[12:14]))
+    except ValueError:
+        return f'{value!r} has no valid date of birth'
+    if idn_check_char(number[:17]) != number[17]:
+        return f'{value!r} has check digit {number[17]}, expected {idn_check_char(number[:17])}'
+    return None
+
+
+def check_date(value: Any) -> Optional[str]:
+    """
+    Return what is wrong with a date of the period, or None if it is valid.
+
+    :param value: A date, a datetime or an ISO 8601 string.
+    """
+    try:
+        _as_date(value)
+    except (TypeError, ValueError):
+        return f'{value!r} is not a date'
+    return None
+
+
+def check_freq(value: Any) -> Optional[str]:
+    """
+    Return what is wrong with a frequency, or None if it is valid.
+
+    :param value: The frequency.
+    """
+    if value == NO_FREQ or value in MONTHS_PER_PERIOD:
+        return None
+    return f'{value!r} is not one of {(*MONTHS_PER_PERIOD, NO_FREQ)}'
+
+
+# Checks of the fields that are filled in, by field
+FIELD_CHECKS: Dict[str, Callable[[Any], Optional[str]]] = {
+    'CC': check_cc,
+    'IDN': check_idn,
+    'Start': check_date,
+    'End': check_date,
+    'Freq': check_freq,
+}
+
+
+def template_fields(template: str) -> Tuple[FrozenSet[str], Optional[FrozenSet[str]], Optional[str]]:
+    """
+    Return the fields a template needs and accepts, or what is wrong with the template name.
+
+    :param template: The template name.
+    :return: (needed, accepted, None), where accepted is None when any field is accepted,
+        or (empty, None, message) when there is no such template.
+    """
+    from ._search import template_registry
+
+    if template == PIT_TEMPLATE:
+        # Both backends write every key into the workbook, so a key without a cell fails the run
+        info = template_registry().get(PIT_WORKBOOK, 'xls')
+        if info is None:
+            return frozenset(), None, f'no template {PIT_WORKBOOK}.xls'
+        return frozenset(PIT_FIELDS), info.placeholders, None
+    suffix = 'xlsx' if template in VAT_TEMPLATES else 'docx'
+    info = template_registry().get(str(template), suffix)
+    if info is None:
+        return frozenset(), None, f'no template {template}.{suffix}'
+    return info.placeholders, None, None
+
+
+def check_records(records: Sequence[Dict[str, Any]], template: Optional[str] = None,
+                  periods: bool = True) -> List[Issue]:
+    """
+    Check every record in one pass and return the problems found, in record order.
+
+    The records are read as columns: each field check runs over its whole column, and the
+    placeholders of a template are compared once per template and set of fields.
+
+    :param records: The records, as TemplateEngine iterates them.
+    :param template: The template of the records that do not name their own.
+    :param periods: Whether each record holds its own Start, End and Freq, as with only=True.
+    :return: The problems, empty when every record is valid.
+    """
+    issues = []
+    with span('validate', 'run', records=len(records)):
+        names = [record.get('CN') for record in records]
+        for row, name in enumerate(names):
+            if _is_blank(name):
+                issues.append(Issue(row, None, 'CN', 'company name is missing'))
+
+        for field, check in FIELD_CHECKS.items():
+            column = [record.get(field) for record in records]
+            for row, value in enumerate(column):
+                if _is_blank(value):
+                    if periods and field in PERIOD_KEYS:
+                        issues.append(Issue(row, names[row], field, 'is missing'))
+                    continue
+                message = check(value)
+                if message is not None:
+                    issues.append(Issue(row, names[row], field, message))
+
+        if periods:
+            starts, ends = [record.get('Start') for record in records], [record.get('End') for record in records]
+            for row, (start, end) in enumerate(zip(starts, ends)):
+                if check_date(start) is None and check_date(end) is None and _as_date(start) > _as_date(end):
+                    issues.append(Issue(row, names[row], 'Start', f'{start} is after End {end}'))
+
+        # Records providing the same fields to the same template share one comparison
+        groups: Dict[Tuple[Any, FrozenSet[str]], List[int]] = {}
+        for row, record in enumerate(records):
+            fields = frozenset(record).union(PERIOD_FIELDS if periods else ()).difference(CONTROL_FIELDS)
+            groups.setdefault((record.get('Template') or template, fields), []).append(row)
+        known = {}
+        for (name, fields), rows in groups.items():
+            if name is None:
+                # Without a template only a single worksheet run has nothing to render
+                if periods:
+                    issues.extend(Issue(row, names[row], 'Template', 'is missing') for row in rows)
+                continue
+            if name not in known:
+                known[name] = template_fields(name)
+            needed, accepted, message = known[name]
+            messages = [message] if message else []
+            missing = sorted(needed.difference(fields))
+            if missing:
+                messages.append(f'{name} needs {", ".join(missing)}')
+            unknown = sorted(fields.difference(accepted)) if accepted is not None else []
+            if unknown:
+                messages.append(f'{name} has no cell for {", ".join(unknown)}')
+            issues.extend(Issue(row, names[row], 'Template', message) for row in rows for message in messages)
+
+    issues.sort(key=lambda issue: issue.row)
+    count('records.validated', len(records))
+    count('records.invalid', len({issue.row for issue in issues}))
+    return issues
+
+
+def validate_records(records: Iterable[Dict[str, Any]], template: Optional[str] = None,
+                     periods: bool = True) -> List[Dict[str, Any]]:
+    """
+    Check every record before anything is rendered, and report all problems at once.
+
+    Blank records, such as the empty rows at the end of a worksheet table, are dropped.
+
+    :param records: The records, as TemplateEngine iterates them.
+    :param template: The template of the records that do not name their own.
+    :param periods: Whether each record holds its own Start, End and Freq, as with only=True.
+    :return: The records that are not blank, as a list.
+    :raises ValidationError: If any record is invalid.
+    """
+    records = [record for record in records if not is_blank_record(record)]
+    issues = check_records(records, template, periods)
+    if issues:
+        error = ValidationError(issues)
+        logging.error(str(error))
+        raise error
+    return records
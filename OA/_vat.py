@@ -1,55 +1,189 @@
 # -*- coding: utf-8 -*-
 
-from dataclasses import asdict
 from pathlib import Path
-from typing import Union
+from typing import Any, Dict, Iterable, List, Tuple, Union
 
-import xlwings as xw
-
-from ._classify_files import categorize_files
+from ._backends import BACKENDS, EXCEL_BACKEND, HEADLESS_BACKEND
+from ._classify_files import categorize_files, categorized_path
 from ._convert2pdf import convert_to_pdf
-from ._sentence import SmallScale, General
+from ._manifest import Manifests, record_digest, template_digest
+from ._sink import Sink, member_name
+from ._sentence import LAYOUTS, layout_cells
+from ._trace import count, span
+from ._xlsx import XlsxTemplate
+from ._xlsxpdf import SheetPdf
 
+MAIN_SHEET = '主表'
 
-# Decorators for file categorization and PDF conversion
-@categorize_files(merge=True)
-@convert_to_pdf
-def fill_sheet(path: Path, fullname: Union[str, Path], data):
+
+def build_record(name: str, mapping: Dict[str, Any]) -> Dict[str, Any]:
+    """Build the cell values of one period for the workbook called name.
+
+    Args:
+        name: The workbook name, '小规模.xlsx' or '一般纳税人.xlsx'.
+        mapping: The register data merged with one period.
+
+    Returns:
+        The cell values keyed by cell reference.
+    """
+    return LAYOUTS[name].values(mapping)
+
+
+def pending_periods(fullname: Path, jobs: Iterable[Tuple[Path, Iterable]], backend: str,
+                    manifests: Manifests) -> List[Tuple[Path, Dict[str, Any], str, Tuple[Path, Path]]]:
+    """Return (filename, cell values, digest, (workbook, PDF)) for every period whose filed outputs are not current.
+
+    The digest covers the template bytes, the cell values and the backend, so a rerun only
+    writes the periods whose data changed. The workbook and PDF paths lie in the Excel and PDF
+    folders of the result folder, which are created here so the outputs are written in place.
+    """
+    template = template_digest(fullname)
+    layout = LAYOUTS[fullname.name]
+    pending = []
+    for path, data in jobs:
+        data = list(data)
+        for mapping, values in zip(data, layout.values_many(data)):
+            filename = path / f'{mapping["End"]:%y_%m%d}.xlsx'
+            digest = record_digest(template, values, f'xlsx:{backend}')
+            outputs = (categorized_path(path, filename.name), categorized_path(path, filename.with_suffix('.pdf').name))
+            if manifests[path].is_current(filename.name, digest, outputs):
+                count('files.skipped')
+                continue
+            pending.append((filename, values, digest, outputs))
+
+    for directory in {output.parent for *_, outputs in pending for output in outputs}:
+        directory.mkdir(exist_ok=True)
+    return pending
+
+
+def fill_many_with_excel(fullname: Union[str, Path], jobs: Iterable[Tuple[Path, Iterable]]) -> None:
+    """Fill the workbook through one Excel process for every (output folder, periods) job,
+    exporting each period to PDF. Periods whose outputs are current are skipped."""
+    fullname = Path(fullname)
+    with Manifests() as manifests:
+        pending = pending_periods(fullname, jobs, EXCEL_BACKEND, manifests)
+        if not pending:
+            return
+
+        import xlwings as xw
+
+        with xw.App(visible=False, add_book=False) as app:  # Launch Excel in the background
+            wb = app.books.open(fullname=fullname)  # Open the workbook
+            sheet = wb.sheets[MAIN_SHEET]  # Access the main worksheet
+
+            for filename, values, digest, (workbook, pdf) in pending:
+                # Fill in the worksheet with the data, including the period of tax payment
+                with span('render', 'document', file=filename.name):
+                    for key, value in values.items():
+                        sheet.range(key).value = value
+
+                # Convert the worksheet to PDF and save
+                with span('convert', 'document', file=filename.name):
+                    sheet.to_pdf(path=pdf)
+
+                # Save the workbook
+                with span('save', 'document', file=filename.name):
+                    wb.save(path=workbook)
+                count('files.rendered')
+                manifests[filename.parent].record(filename.name, digest, (workbook, pdf))
+
+            # 关闭工作簿
+            wb.close()  # Close the workbook
+
+
+def fill_many_headless(fullname: Union[str, Path], jobs: Iterable[Tuple[Path, Iterable]]) -> None:
+    """Fill the workbook by writing the sheet XML directly, without an office process.
+
+    The template is opened and its printed layout drawn once; one workbook and one PDF are
+    written per period of every (output folder, periods) job whose output is not current.
+    """
+    fullname = Path(fullname)
+    with Manifests() as manifests:
+        pending = pending_periods(fullname, jobs, HEADLESS_BACKEND, manifests)
+        if not pending:
+            return
+
+        with span('template load', 'document', template=fullname.name):
+            template = XlsxTemplate(fullname, sheet_name=MAIN_SHEET, cells=layout_cells(fullname.name))
+            printout = SheetPdf(fullname, sheet_name=MAIN_SHEET, cells=layout_cells(fullname.name))
+
+        for filename, values, digest, (workbook, pdf) in pending:
+            with span('save', 'document', file=filename.name):
+                template.save(values, workbook)
+            count('files.rendered')
+            count('bytes.rendered', workbook.stat().st_size)
+            # Draw the period's cells onto the pre-rendered page instead of printing through Excel
+            with span('convert', 'document', file=filename.name):
+                printout.save(values, pdf)
+            count('files.converted')
+            manifests[filename.parent].record(filename.name, digest, (workbook, pdf))
+
+
+def fill_into_sink(fullname: Union[str, Path], data, sink: Sink) -> None:
+    """Write the workbook and PDF of every period straight into a sink, in their Excel and PDF folders."""
+    fullname = Path(fullname)
+    data = list(data)
+    with span('template load', 'document', template=fullname.name):
+        template = XlsxTemplate(fullname, sheet_name=MAIN_SHEET, cells=layout_cells(fullname.name))
+        printout = SheetPdf(fullname, sheet_name=MAIN_SHEET, cells=layout_cells(fullname.name))
+
+    for mapping, values in zip(data, LAYOUTS[fullname.name].values_many(data)):
+        stem = f'{mapping["End"]:%y_%m%d}'
+        with span('save', 'document', file=f'{stem}.xlsx'):
+            workbook = template.render_file(values)
+        sink.write(member_name(f'{stem}.xlsx'), workbook)
+        count('files.rendered')
+        count('bytes.rendered', len(workbook))
+        with span('convert', 'document', file=f'{stem}.xlsx'):
+            sink.write(member_name(f'{stem}.pdf'), printout.render(values))
+        count('files.converted')
+
+
+def fill_with_excel(path: Path, fullname: Union[str, Path], data) -> None:
+    """Fill the workbook through an Excel process and export each period to PDF."""
+    fill_many_with_excel(fullname, [(path, data)])
+
+
+def fill_headless(path: Path, fullname: Union[str, Path], data) -> None:
+    """Fill the workbook by writing the sheet XML directly and export each period to PDF, without an office process."""
+    fill_many_headless(fullname, [(path, data)])
+
+
+def fill_sheet(path: Path, fullname: Union[str, Path], data, backend: str = EXCEL_BACKEND, sink: Sink | None = None):
     """Fill the sheet with data.
 
     Args:
         path: The directory path where the output files will be saved.
         fullname: The full path name of the Excel workbook to be processed.
         data: The data to be filled into the Excel workbook.
-    """
-    with xw.App(visible=False, add_book=False) as app:  # Launch Excel in the background
-        wb = app.books.open(fullname=fullname)  # Open the workbook
-        sheet = wb.sheets['主表']  # Access the main worksheet
-
-        # Determine the starting cell based on workbook name
-        cell = 'A6' if wb.name == '小规模.xlsx' else 'A5'
+        backend: 'excel' to drive an Excel process, or 'headless' to write the workbook and PDF files directly.
+        sink: Write the workbooks and PDFs into this sink instead of path; needs the headless backend.
 
-        for mapping in data:
-            # Choose the taxpayer type based on workbook name
-            if wb.name == '小规模.xlsx':  # For small scale taxpayers
-                record = asdict(SmallScale(database=mapping))
-            elif wb.name == '一般纳税人.xlsx':  # For general taxpayers
-                record = asdict(General(database=mapping))
-
-            # Fill in the worksheet with the data
-            for key, value in filter(lambda kv: not kv[0].startswith('_Taxpayer'), record.items()):
-                sheet.range(key).value = value
+    Returns:
+        Path: The directory path, or Path() for the root of the sink.
+    """
+    if backend not in BACKENDS:
+        raise ValueError(f"Invalid backend: {backend}. Expected one of {BACKENDS}")
 
-            # Update the period of tax payment
-            sheet.range(cell).value = f'税款所属期：{mapping["Start"]:%Y年%m月%d日}至{mapping["End"]:%Y年%m月%d日}'
+    if sink is not None:
+        if backend != HEADLESS_BACKEND:
+            raise ValueError('Only the headless backend can write into a sink')
+        with span('fill_sheet', 'stage', backend=backend):
+            fill_into_sink(fullname, data, sink)
+        return Path()
 
-            # Convert the worksheet to PDF and save
-            sheet.to_pdf(path=path / f'{mapping["End"]:%y_%m%d}.pdf')
+    return fill_directory(path, fullname, data, backend)
 
-            # Save the workbook
-            wb.save(path=path / f'{mapping["End"]:%y_%m%d}.xlsx')
 
-        # 关闭工作簿
-        wb.close()  # Close the workbook
+# Decorators for file categorization and PDF conversion
+@categorize_files(merge=True)
+@convert_to_pdf
+def fill_directory(path: Path, fullname: Union[str, Path], data, backend: str = EXCEL_BACKEND):
+    """Fill the sheet with data in the directory path, then file and merge the outputs."""
+    with span('fill_sheet', 'stage', backend=backend):
+        if backend == HEADLESS_BACKEND:
+            fill_headless(path, fullname, data)
+        else:
+            fill_with_excel(path, fullname, data)
 
     return path
@@ -0,0 +1,251 @@
+# -*- coding: utf-8 -*-
+
+import posixpath
+import re
+from datetime import date, datetime
+from io import BytesIO
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Tuple, Union
+from xml.sax.saxutils import escape, quoteattr
+from zipfile import ZipFile, ZIP_DEFLATED
+
+# Relationship and workbook parts inside an XLSX package
+WORKBOOK_PART = 'xl/workbook.xml'
+WORKBOOK_RELS_PART = 'xl/_rels/workbook.xml.rels'
+
+# Regular expressions used to locate parts of the sheet XML
+CELL_REF_PATTERN = re.compile(r'^([A-Z]+)(\d+)$')
+ROW_PATTERN = r'<row r="{row}"[^>]*?(/>|>.*?</row>)'
+CELL_PATTERN = r'<c r="{ref}"[^>]*?(/>|>.*?</c>)'
+STYLE_PATTERN = re.compile(r'\ss="(\d+)"')
+
+
+def column_index(letters: str) -> int:
+    """
+    Converts column letters to a 1-based column index.
+
+    Args:
+        letters: The column letters, e.g. 'AK'.
+
+    Returns:
+        The column index.
+    """
+    index = 0
+    for char in letters:
+        index = index * 26 + ord(char) - ord('A') + 1
+    return index
+
+
+def split_ref(ref: str) -> Tuple[str, int]:
+    """
+    Splits a cell reference into its column letters and row number.
+
+    Args:
+        ref: The cell reference, e.g. 'A41'.
+
+    Returns:
+        A tuple of (column letters, row number).
+
+    Raises:
+        ValueError: If the reference is not a single A1-style cell.
+    """
+    match = CELL_REF_PATTERN.match(ref)
+    if match is None:
+        raise ValueError(f'Invalid cell reference: {ref}')
+    return match.group(1), int(match.group(2))
+
+
+def cell_xml(ref: str, style: str | None, value: Any) -> str:
+    """
+    Serializes a single cell.
+
+    Strings are written as inline strings so the shared string table never has to be rewritten.
+
+    Args:
+        ref: The cell reference.
+        style: The style index of the template cell, if any.
+        value: The cell value.
+
+    Returns:
+        The cell XML.
+    """
+    attrs = f' r="{ref}"' + (f' s="{style}"' if style is not None else '')
+    if value is None:
+        return f'<c{attrs}/>'
+    if isinstance(value, bool):
+        return f'<c{attrs} t="b"><v>{int(value)}</v></c>'
+    if isinstance(value, (int, float)):
+        return f'<c{attrs}><v>{value!r}</v></c>'
+    if isinstance(value, (date, datetime)):
+        value = f'{value:%Y-%m-%d}'
+    return f'<c{attrs} t="inlineStr"><is><t xml:space="preserve">{escape(str(value))}</t></is></c>'
+
+
+class XlsxTemplate:
+    """
+    An XLSX workbook template filled by direct XML manipulation, without an Excel process.
+
+    The package is read once. The target sheet is indexed once for the requested cells,
+    and every call to :meth:`save` splices the new cell values into that XML and writes a new workbook.
+
+    Args:
+        fullname: The path to the template workbook.
+        sheet_name: The name of the worksheet to fill.
+        cells: The cell references that will be written.
+    """
+
+    def __init__(self, fullname: Union[str, Path], sheet_name: str, cells: Iterable[str]):
+        self.fullname = Path(fullname)
+        self.name = self.fullname.name
+
+        with ZipFile(self.fullname) as archive:
+            self.members: List[Tuple[Any, bytes]] = [(info, archive.read(info)) for info in archive.infolist()]
+
+        parts = {info.filename: data for info, data in self.members}
+        self.sheet_part = self._resolve_sheet_part(parts, sheet_name)
+        # Ask Excel to recalculate formulas depending on the filled cells when the file is opened
+        self.workbook_xml = self._force_full_calc(parts[WORKBOOK_PART].decode('utf-8'))
+        self.chunks, self.slots = self._index_cells(parts[self.sheet_part].decode('utf-8'), cells)
+
+    @staticmethod
+    def _resolve_sheet_part(parts: Dict[str, bytes], sheet_name: str) -> str:
+        """Finds the part name of the worksheet called sheet_name."""
+        workbook = parts[WORKBOOK_PART].decode('utf-8')
+        match = re.search(rf'<sheet\s[^>]*name={quoteattr(sheet_name)}[^>]*?r:id="([^"]+)"', workbook)
+        if match is None:
+            raise KeyError(f'Worksheet not found: {sheet_name}')
+
+        rels = parts[WORKBOOK_RELS_PART].decode('utf-8')
+        for relation in re.findall(r'<Relationship\s[^>]*/>', rels):
+            if f'Id="{match.group(1)}"' in relation:
+                target = re.search(r'Target="([^"]+)"', relation).group(1)
+                return target.lstrip('/') if target.startswith('/') else posixpath.join('xl', target)
+        raise KeyError(f'Worksheet part not found: {sheet_name}')
+
+    @staticmethod
+    def _force_full_calc(workbook: str) -> str:
+        """Sets fullCalcOnLoad on the workbook calculation properties."""
+        if 'fullCalcOnLoad' in workbook:
+            return workbook
+        if '<calcPr' in workbook:
+            return workbook.replace('<calcPr', '<calcPr fullCalcOnLoad="1"', 1)
+        return workbook.replace('</workbook>', '<calcPr fullCalcOnLoad="1"/></workbook>', 1)
+
+    @staticmethod
+    def _ensure_cell(xml: str, ref: str) -> str:
+        """Inserts an empty cell for ref into the sheet XML if the template does not contain it."""
+        if re.search(CELL_PATTERN.format(ref=ref), xml, flags=re.DOTALL):
+            return xml
+
+        letters, row = split_ref(ref)
+        empty = f'<c r="{ref}"/>'
+        match = re.search(ROW_PATTERN.format(row=row), xml, flags=re.DOTALL)
+        if match is None:
+            # Insert a new row before the first row with a greater number
+            for other in re.finditer(r'<row r="(\d+)"', xml):
+                if int(other.group(1)) > row:
+                    return f'{xml[:other.start()]}<row r="{row}">{empty}</row>{xml[other.start():]}'
+            if '<sheetData/>' in xml:
+                return xml.replace('<sheetData/>', f'<sheetData><row r="{row}">{empty}</row></sheetData>', 1)
+            return xml.replace('</sheetData>', f'<row r="{row}">{empty}</row></sheetData>', 1)
+
+        row_xml = match.group(0)
+        if row_xml.endswith('/>'):
+            new_row = f'{row_xml[:-2]}>{empty}</row>'
+        else:
+            # Keep the cells of the row ordered by column
+            position = row_xml.rindex('</row>')
+            for other in re.finditer(r'<c r="([A-Z]+)\d+"', row_xml):
+                if column_index(other.group(1)) > column_index(letters):
+                    position = other.start()
+                    break
+            new_row = row_xml[:position] + empty + row_xml[position:]
+        return xml[:match.start()] + new_row + xml[match.end():]
+
+    def _index_cells(self, xml: str, cells: Iterable[str]) -> Tuple[List[str], Dict[str, Tuple[int, str | None, str]]]:
+        """
+        Splits the sheet XML around the target cells.
+
+        Returns:
+            The static chunks of XML and, per cell, the index of its slot, its style and its original XML.
+        """
+        cells = list(dict.fromkeys(cells))
+        for ref in cells:
+            xml = self._ensure_cell(xml, ref)
+
+        spans = []
+        for ref in cells:
+            match = re.search(CELL_PATTERN.format(ref=ref), xml, flags=re.DOTALL)
+            style = STYLE_PATTERN.search(match.group(0)[:match.group(0).index('>') + 1])
+            spans.append((match.start(), match.end(), ref, style.group(1) if style else None))
+        spans.sort()
+
+        chunks, slots, cursor = [], {}, 0
+        for index, (start, end, ref, style) in enumerate(spans):
+            chunks.append(xml[cursor:start])
+            slots[ref] = (index, style, xml[start:end])
+            cursor = end
+        chunks.append(xml[cursor:])
+        return chunks, slots
+
+    def render(self, values: Dict[str, Any]) -> bytes:
+        """
+        Builds the sheet XML for one set of cell values.
+
+        Args:
+            values: The cell values keyed by cell reference. Cells that are not given keep the template content.
+
+        Returns:
+            The encoded sheet XML.
+
+        Raises:
+            KeyError: If a cell was not declared when the template was opened.
+        """
+        unknown = set(values) - set(self.slots)
+        if unknown:
+            raise KeyError(f'Cells not declared for {self.name}: {", ".join(sorted(unknown))}')
+
+        filled = [''] * len(self.slots)
+        for ref, (index, style, original) in self.slots.items():
+            filled[index] = cell_xml(ref, style, values[ref]) if ref in values else original
+
+        parts = [self.chunks[0]]
+        for cell, chunk in zip(filled, self.chunks[1:]):
+            parts.extend((cell, chunk))
+        return ''.join(parts).encode('utf-8')
+
+    def save(self, values: Dict[str, Any], path: Union[str, Path]) -> Path:
+        """
+        Writes a copy of the template with the given cell values.
+
+        Args:
+            values: The cell values keyed by cell reference.
+            path: The output workbook path.
+
+        Returns:
+            The output workbook path.
+        """
+        path = Path(path)
+        path.write_bytes(self.render_file(values))
+        return path
+
+    def render_file(self, values: Dict[str, Any]) -> bytes:
+        """
+        Builds a copy of the template with the given cell values.
+
+        Args:
+            values: The cell values keyed by cell reference.
+
+        Returns:
+            The workbook file content.
+        """
+        sheet = self.render(values)
+        buffer = BytesIO()
+        with ZipFile(buffer, 'w', compression=ZIP_DEFLATED) as archive:
+            for info, data in self.members:
+                if info.filename == self.sheet_part:
+                    data = sheet
+                elif info.filename == WORKBOOK_PART:
+                    data = self.workbook_xml.encode('utf-8')
+                archive.writestr(info.filename, data, compress_type=ZIP_DEFLATED)
+        return buffer.getvalue()
@@ -0,0 +1,450 @@
+# -*- coding: utf-8 -*-
+
+import math
+import re
+import unicodedata
+import xml.etree.ElementTree as ET
+import zlib
+from collections import namedtuple
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Tuple, Union
+from zipfile import ZipFile
+
+from ._xlsx import WORKBOOK_PART, XlsxTemplate, column_index, split_ref
+
+# SpreadsheetML namespace
+NS = {'m': 'http://schemas.openxmlformats.org/spreadsheetml/2006/main'}
+STYLES_PART = 'xl/styles.xml'
+SHARED_STRINGS_PART = 'xl/sharedStrings.xml'
+
+# Paper sizes in points by the paperSize code of the page setup; A4 when absent
+PAPER_SIZES = {1: (612, 792), 5: (612, 1008), 8: (842, 1191), 9: (595.28, 841.89), 11: (419.53, 595.28)}
+POINTS_PER_INCH = 72
+# Border line widths in points by border style
+BORDER_WIDTHS = {'hair': 0.25, 'thin': 0.5, 'dotted': 0.5, 'dashed': 0.5, 'dashDot': 0.5, 'dashDotDot': 0.5,
+                 'medium': 1.0, 'mediumDashed': 1.0, 'mediumDashDot': 1.0, 'mediumDashDotDot': 1.0,
+                 'slantDashDot': 1.0, 'thick': 1.5, 'double': 1.5}
+# Space between the cell edges and its text, in points
+PADDING = 2
+LINE_HEIGHT = 1.2
+
+# A CJK font every PDF reader provides, so nothing is embedded
+FONT_NAME = 'STSong-Light'
+FONT_OBJECTS = (
+    b'<< /Type /Font /Subtype /Type0 /BaseFont /STSong-Light /Encoding /UniGB-UCS2-H /DescendantFonts [4 0 R] >>',
+    b'<< /Type /Font /Subtype /CIDFontType0 /BaseFont /STSong-Light '
+    b'/CIDSystemInfo << /Registry (Adobe) /Ordering (GB1) /Supplement 2 >> /FontDescriptor 5 0 R '
+    b'/DW 1000 /W [1 95 500] >>',
+    b'<< /Type /FontDescriptor /FontName /STSong-Light /Flags 6 /FontBBox [-25 -254 1000 880] '
+    b'/ItalicAngle 0 /Ascent 880 /Descent -120 /CapHeight 880 /StemV 93 >>',
+)
+
+# The look of a cell: font size, bold, fill color, border widths (left, right, top, bottom) and alignment
+Style = namedtuple('Style', ['size', 'bold', 'fill', 'borders', 'horizontal', 'vertical', 'wrap', 'stacked'])
+# A rectangle in sheet points, from the top-left corner of the printed area
+Box = namedtuple('Box', ['x', 'y', 'width', 'height'])
+
+
+def _attr(element, path: str, name: str, default=None):
+    found = element.find(path, NS) if path else element
+    return default if found is None else found.get(name, default)
+
+
+def _rgb(element) -> Tuple[float, float, float] | None:
+    """Converts an ARGB color element to RGB components, ignoring theme and indexed colors."""
+    value = None if element is None else element.get('rgb')
+    if not value or len(value) != 8:
+        return None
+    return tuple(int(value[i:i + 2], 16) / 255 for i in (2, 4, 6))
+
+
+def parse_styles(xml: bytes) -> List[Style]:
+    """
+    Reads the cell formats of a workbook.
+
+    Args:
+        xml: The content of xl/styles.xml.
+
+    Returns:
+        The styles, indexed like the s attribute of the cells.
+    """
+    root = ET.fromstring(xml)
+    fonts = [(float(_attr(font, 'm:sz', 'val', 11)), font.find('m:b', NS) is not None)
+             for font in root.iterfind('m:fonts/m:font', NS)]
+    fills = []
+    for fill in root.iterfind('m:fills/m:fill', NS):
+        pattern = fill.find('m:patternFill', NS)
+        solid = pattern is not None and pattern.get('patternType') == 'solid'
+        fills.append(_rgb(pattern.find('m:fgColor', NS)) if solid else None)
+    borders = []
+    for border in root.iterfind('m:borders/m:border', NS):
+        borders.append(tuple(BORDER_WIDTHS.get(_attr(border, f'm:{side}', 'style'), 0)
+                             for side in ('left', 'right', 'top', 'bottom')))
+
+    styles = []
+    for xf in root.iterfind('m:cellXfs/m:xf', NS):
+        size, bold = fonts[int(xf.get('fontId', 0))] if fonts else (11, False)
+        alignment = xf.find('m:alignment', NS)
+        alignment = {} if alignment is None else alignment.attrib
+        styles.append(Style(size, bold, fills[int(xf.get('fillId', 0))] if fills else None,
+                            borders[int(xf.get('borderId', 0))] if borders else (0, 0, 0, 0),
+                            alignment.get('horizontal', 'general'), alignment.get('vertical', 'bottom'),
+                            alignment.get('wrapText') in ('1', 'true'),
+                            # Rotation 255 stacks the characters vertically
+                            alignment.get('textRotation') == '255'))
+    return styles or [Style(11, False, None, (0, 0, 0, 0), 'general', 'bottom', False, False)]
+
+
+def parse_shared_strings(xml: bytes | None) -> List[str]:
+    """Reads the shared string table, joining rich text runs and skipping phonetic runs."""
+    if xml is None:
+        return []
+    root = ET.fromstring(xml)
+    return [''.join(t.text or '' for t in item.iterfind('.//m:t', NS)
+                    if t not in {p for rph in item.iterfind('m:rPh', NS) for p in rph.iter()})
+            for item in root.iterfind('m:si', NS)]
+
+
+def cell_text(cell, shared_strings: List[str]) -> str:
+    """Returns the displayed text of a cell, formatting numbers like the General format."""
+    kind, value = cell.get('t'), cell.findtext('m:v', None, NS)
+    if kind == 'inlineStr':
+        return ''.join(t.text or '' for t in cell.iterfind('m:is//m:t', NS))
+    if value is None:
+        return ''
+    if kind == 's':
+        return shared_strings[int(value)]
+    if kind == 'b':
+        return 'TRUE' if value == '1' else 'FALSE'
+    if kind in ('str', 'e'):
+        return value
+    number = float(value)
+    return str(int(number)) if number.is_integer() else f'{number:.10g}'
+
+
+def char_width(char: str) -> float:
+    """Returns the advance of a character in em, full width for CJK and half width otherwise."""
+    return 1.0 if unicodedata.east_asian_width(char) in ('W', 'F') else 0.5
+
+
+def text_width(text: str, size: float) -> float:
+    return sum(map(char_width, text)) * size
+
+
+def wrap_lines(text: str, size: float, width: float) -> List[str]:
+    """Breaks text into lines no wider than width, at any character as Excel does for CJK text."""
+    lines = []
+    for paragraph in text.split('\n'):
+        line, used = '', 0.0
+        for char in paragraph:
+            advance = char_width(char) * size
+            if line and used + advance > width:
+                lines.append(line.rstrip())
+                line, used = '', 0.0
+            line += char
+            used += advance
+        lines.append(line.rstrip())
+    return lines
+
+
+def pdf_string(text: str) -> str:
+    """Encodes text for the UniGB-UCS2-H encoding."""
+    return f'<{text.encode("utf-16-be").hex()}>'
+
+
+class SheetPdf:
+    """
+    Prints a worksheet to PDF without an office process.
+
+    The page layout is computed once from the sheet XML: column widths, row heights, merged cells,
+    borders, fills, alignment, margins, scale and centering. The static content of every page,
+    which is everything but the target cells, is drawn and compressed once. Each call to
+    :meth:`save` only draws the values of the target cells on top of it.
+
+    The output matches Excel's print layout closely but not exactly: text uses one CJK font,
+    theme colors and conditional formats are ignored, and wide sheets are not split across pages.
+
+    Args:
+        fullname: The path to the template workbook.
+        sheet_name: The name of the worksheet to print.
+        cells: The cell references filled for each output.
+    """
+
+    def __init__(self, fullname: Union[str, Path], sheet_name: str, cells: Iterable[str]):
+        self.fullname = Path(fullname)
+        with ZipFile(self.fullname) as archive:
+            parts = {name: archive.read(name) for name in archive.namelist()}
+        sheet_part = XlsxTemplate._resolve_sheet_part(parts, sheet_name)
+        self.styles = parse_styles(parts[STYLES_PART])
+        shared_strings = parse_shared_strings(parts.get(SHARED_STRINGS_PART))
+        sheet = ET.fromstring(parts[sheet_part])
+
+        self.targets = {ref: self._position(ref) for ref in dict.fromkeys(cells)}
+        self.cells: Dict[Tuple[int, int], Tuple[int, str]] = {}
+        for row in sheet.iterfind('m:sheetData/m:row', NS):
+            for cell in row.iterfind('m:c', NS):
+                self.cells[self._position(cell.get('r'))] = (int(cell.get('s', 0)), cell_text(cell, shared_strings))
+
+        self.merges = {}
+        for merge in sheet.iterfind('m:mergeCells/m:mergeCell', NS):
+            first, _, last = merge.get('ref').partition(':')
+            (row, col), (last_row, last_col) = self._position(first), self._position(last or first)
+            self.merges[(row, col)] = (last_row, last_col)
+        self.covered = {(r, c): anchor for anchor, (last_row, last_col) in self.merges.items()
+                        for r in range(anchor[0], last_row + 1) for c in range(anchor[1], last_col + 1)}
+
+        self._measure(sheet)
+        self._paginate(sheet, parts[WORKBOOK_PART])
+        # The static content of every page, drawn once
+        self.base = [zlib.compress(self._draw_page(index, static=True).encode('ascii')) for index in range(len(self.pages))]
+
+    @staticmethod
+    def _position(ref: str) -> Tuple[int, int]:
+        letters, row = split_ref(ref.replace('$', ''))
+        return row, column_index(letters)
+
+    def _measure(self, sheet) -> None:
+        """Computes the column and row edges in points."""
+        default_size = self.styles[0].size
+        # Width of a digit in pixels, from which Excel derives column widths
+        digit = max(1, round(default_size * 96 / POINTS_PER_INCH / 2))
+        format_pr = sheet.find('m:sheetFormatPr', NS)
+        format_pr = {} if format_pr is None else format_pr.attrib
+        default_width = float(format_pr.get('defaultColWidth', float(format_pr.get('baseColWidth', 8)) + 5 / digit))
+        default_height = float(format_pr.get('defaultRowHeight', 15))
+
+        def width_points(width: float) -> float:
+            pixels = math.trunc((256 * width + math.trunc(128 / digit)) / 256 * digit)
+            return pixels * POINTS_PER_INCH / 96
+
+        widths, heights = {}, {}
+        for col in sheet.iterfind('m:cols/m:col', NS):
+            hidden = col.get('hidden') in ('1', 'true')
+            for index in range(int(col.get('min')), int(col.get('max')) + 1):
+                widths[index] = 0 if hidden else width_points(float(col.get('width', default_width)))
+        for row in sheet.iterfind('m:sheetData/m:row', NS):
+            hidden = row.get('hidden') in ('1', 'true')
+            heights[int(row.get('r'))] = 0 if hidden else float(row.get('ht', default_height))
+
+        # Print up to the last cell that shows something. A cell with only a top or left border
+        # just closes the cell before it, whose edge is drawn without printing the cell itself.
+        visible = [position for position, (style, text) in self.cells.items()
+                   if text or self.styles[style].fill or any(self.styles[style].borders[i] for i in (1, 3))]
+        visible += list(self.targets.values())
+        visible += [self.merges[position] for position in visible if position in self.merges]
+        self.last_row = max(row for row, _ in visible)
+        self.last_col = max(col for _, col in visible)
+
+        # Edges of one more column and row, for the borders closing the printed area
+        self.x = [0.0]
+        for col in range(1, self.last_col + 2):
+            self.x.append(self.x[-1] + widths.get(col, width_points(default_width)))
+        self.y = [0.0]
+        for row in range(1, self.last_row + 2):
+            self.y.append(self.y[-1] + heights.get(row, default_height))
+
+    def _paginate(self, sheet, workbook: bytes) -> None:
+        """Splits the rows into pages and places each page on the paper."""
+        setup = sheet.find('m:pageSetup', NS)
+        setup = {} if setup is None else setup.attrib
+        width, height = PAPER_SIZES.get(int(setup.get('paperSize', 9)), PAPER_SIZES[9])
+        if setup.get('orientation') == 'landscape':
+            width, height = height, width
+        margins = sheet.find('m:pageMargins', NS)
+        margins = {} if margins is None else margins.attrib
+        left, right, top, bottom = (float(margins.get(side, default)) * POINTS_PER_INCH for side, default in
+                                    (('left', 0.7), ('right', 0.7), ('top', 0.75), ('bottom', 0.75)))
+        options = sheet.find('m:printOptions', NS)
+        options = {} if options is None else options.attrib
+        fit = _attr(sheet, 'm:sheetPr/m:pageSetUpPr', 'fitToPage') in ('1', 'true')
+
+        printable_width, printable_height = width - left - right, height - top - bottom
+        if fit and setup.get('fitToWidth', '1') != '0':
+            self.scale = min(1.0, printable_width / self.x[self.last_col])
+        else:
+            self.scale = int(setup.get('scale', 100)) / 100
+        self.paper = (width, height)
+
+        breaks = {int(brk.get('id')) for brk in sheet.iterfind('m:rowBreaks/m:brk', NS)}
+        self.pages, first = [], 1
+        for row in range(1, self.last_row + 1):
+            page_height = (self.y[row] - self.y[first - 1]) * self.scale
+            if row > first and page_height > printable_height:
+                self.pages.append((first, row - 1))
+                first = row
+            if row in breaks:
+                self.pages.append((first, row))
+                first = row + 1
+        if first <= self.last_row:
+            self.pages.append((first, self.last_row))
+
+        self.origins = []
+        area_width = self.x[self.last_col] * self.scale
+        for first, last in self.pages:
+            area_height = (self.y[last] - self.y[first - 1]) * self.scale
+            x = left + (max(0.0, printable_width - area_width) / 2 if options.get('horizontalCentered') in ('1', 'true') else 0)
+            y = height - top - (max(0.0, printable_height - area_height) / 2
+                                if options.get('verticalCentered') in ('1', 'true') else 0)
+            self.origins.append((x, y))
+
+    def _box(self, row: int, col: int) -> Box:
+        last_row, last_col = self.merges.get((row, col), (row, col))
+        last_row, last_col = min(last_row, self.last_row), min(last_col, self.last_col)
+        return Box(self.x[col - 1], self.y[row - 1], self.x[last_col] - self.x[col - 1],
+                   self.y[last_row] - self.y[row - 1])
+
+    def _page_of(self, row: int) -> int:
+        for index, (first, last) in enumerate(self.pages):
+            if first <= row <= last:
+                return index
+        return -1
+
+    def _draw_text(self, ops: List[str], box: Box, text: str, style: Style, numeric: bool) -> None:
+        size = style.size
+        available = max(box.width - 2 * PADDING, size)
+        if style.stacked:
+            lines = [char for char in text if not char.isspace()]
+        else:
+            lines = wrap_lines(text, size, available) if style.wrap else text.split('\n')
+        block = len(lines) * size * LINE_HEIGHT
+        if style.vertical == 'top':
+            baseline = box.y + PADDING + size * 0.88
+        elif style.vertical in ('center', 'justify', 'distributed'):
+            baseline = box.y + (box.height - block) / 2 + size * 0.88 + size * (LINE_HEIGHT - 1) / 2
+        else:
+            baseline = box.y + box.height - PADDING - block + size * 0.88 + size * (LINE_HEIGHT - 1)
+
+        horizontal = style.horizontal
+        if horizontal == 'general':
+            horizontal = 'right' if numeric else 'left'
+        if style.bold:
+            ops.append('2 Tr 0.25 w')
+        for line in lines:
+            line_width = text_width(line, size)
+            if horizontal in ('center', 'centerContinuous', 'distributed'):
+                x = box.x + (box.width - line_width) / 2
+            elif horizontal == 'right':
+                x = box.x + box.width - PADDING - line_width
+            else:
+                x = box.x + PADDING
+            if line:
+                ops.append(f'BT /F1 {size:g} Tf {x:.2f} {-baseline:.2f} Td {pdf_string(line)} Tj ET')
+            baseline += size * LINE_HEIGHT
+        if style.bold:
+            ops.append('0 Tr')
+
+    def _draw_page(self, index: int, static: bool, values: Dict[str, Any] | None = None) -> str:
+        """
+        Draws one page: every cell but the targets when static, otherwise only the given target values.
+        """
+        first, last = self.pages[index]
+        x, y = self.origins[index]
+        # Sheet points, measured downwards from the top-left corner of the page's first row
+        ops = [f'q {self.scale:g} 0 0 {self.scale:g} {x:.2f} {y:.2f} cm 1 0 0 1 0 {self.y[first - 1]:.2f} cm']
+
+        if not static:
+            for ref, value in (values or {}).items():
+                row, col = self.targets[ref]
+                if first <= row <= last and value is not None and value != '':
+                    style = self.styles[self.cells.get((row, col), (0, ''))[0]]
+                    self._draw_text(ops, self._box(row, col), str(value), style, isinstance(value, (int, float)))
+            ops.append('Q')
+            return '\n'.join(ops)
+
+        cells = [(position, style) for position, (style, _) in self.cells.items()
+                 if first <= position[0] <= last and position[1] <= self.last_col]
+        for (row, col), style in cells:
+            fill = self.styles[style].fill
+            if fill and self.covered.get((row, col), (row, col)) == (row, col):
+                box = self._box(row, col)
+                ops.append(f'{fill[0]:.3f} {fill[1]:.3f} {fill[2]:.3f} rg '
+                           f'{box.x:.2f} {-box.y - box.height:.2f} {box.width:.2f} {box.height:.2f} re f')
+        ops.append('0 0 0 rg 0 0 0 RG')
+
+        # The closing borders: the top edges of the row after the printed area, and the left edges of the column after it
+        closing = [(position, style) for position, (style, _) in self.cells.items()
+                   if (position[0] == self.last_row + 1 == last + 1 and position[1] <= self.last_col)
+                   or (position[1] == self.last_col + 1 and first <= position[0] <= last)]
+        for (row, col), style in cells + closing:
+            left, right, top, bottom = self.styles[style].borders
+            if row > last:
+                left, right, bottom = 0, 0, 0
+            if col > self.last_col:
+                right, top, bottom = 0, 0, 0
+            anchor = self.covered.get((row, col))
+            x0, x1, y0, y1 = self.x[col - 1], self.x[col], self.y[row - 1], self.y[row]
+            for width, edge, neighbour in ((left, (x0, y0, x0, y1), (row, col - 1)),
+                                           (right, (x1, y0, x1, y1), (row, col + 1)),
+                                           (top, (x0, y0, x1, y0), (row - 1, col)),
+                                           (bottom, (x0, y1, x1, y1), (row + 1, col))):
+                # Edges inside a merged range are not drawn
+                if width and (anchor is None or self.covered.get(neighbour) != anchor):
+                    ops.append(f'{width:g} w {edge[0]:.2f} {-edge[1]:.2f} m {edge[2]:.2f} {-edge[3]:.2f} l S')
+
+        targets = set(self.targets.values())
+        for (row, col), (style, text) in self.cells.items():
+            if text and first <= row <= last and (row, col) not in targets and self.covered.get((row, col), (row, col)) == (row, col):
+                numeric = re.fullmatch(r'-?\d+(\.\d+)?', text) is not None
+                self._draw_text(ops, self._box(row, col), text, self.styles[style], numeric)
+        ops.append('Q')
+        return '\n'.join(ops)
+
+    def render(self, values: Dict[str, Any]) -> bytes:
+        """
+        Builds the PDF for one set of cell values.
+
+        Args:
+            values: The values of the target cells keyed by cell reference.
+
+        Returns:
+            The PDF file content.
+
+        Raises:
+            KeyError: If a cell was not declared when the template was opened.
+        """
+        unknown = set(values) - set(self.targets)
+        if unknown:
+            raise KeyError(f'Cells not declared for {self.fullname.name}: {", ".join(sorted(unknown))}')
+
+        pages = len(self.pages)
+        # Objects 1-5 are the catalog, the page tree and the font; each page then has three objects
+        objects = [b'<< /Type /Catalog /Pages 2 0 R >>',
+                   (f'<< /Type /Pages /Count {pages} /Kids ['
+                    + ' '.join(f'{6 + 3 * index} 0 R' for index in range(pages)) + '] >>').encode('ascii'),
+                   *FONT_OBJECTS]
+        width, height = self.paper
+        for index in range(pages):
+            number = 6 + 3 * index
+            overlay = zlib.compress(self._draw_page(index, static=False, values=values).encode('ascii'))
+            objects.append((f'<< /Type /Page /Parent 2 0 R /MediaBox [0 0 {width:g} {height:g}] '
+                            f'/Resources << /Font << /F1 3 0 R >> >> '
+                            f'/Contents [{number + 1} 0 R {number + 2} 0 R] >>').encode('ascii'))
+            for stream in (self.base[index], overlay):
+                objects.append(b'<< /Length %d /Filter /FlateDecode >>\nstream\n%s\nendstream' % (len(stream), stream))
+
+        output, offsets = [b'%PDF-1.4\n%\xe2\xe3\xcf\xd3\n'], []
+        position = len(output[0])
+        for number, body in enumerate(objects, start=1):
+            offsets.append(position)
+            chunk = b'%d 0 obj\n%s\nendobj\n' % (number, body)
+            output.append(chunk)
+            position += len(chunk)
+        output.append(b'xref\n0 %d\n0000000000 65535 f \n' % (len(objects) + 1))
+        output.extend(b'%010d 00000 n \n' % offset for offset in offsets)
+        output.append(b'trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n' % (len(objects) + 1, position))
+        return b''.join(output)
+
+    def save(self, values: Dict[str, Any], path: Union[str, Path]) -> Path:
+        """
+        Writes the PDF for one set of cell values.
+
+        Args:
+            values: The values of the target cells keyed by cell reference.
+            path: The output PDF path.
+
+        Returns:
+            The output PDF path.
+        """
+        path = Path(path)
+        path.write_bytes(self.render(values))
+        return path
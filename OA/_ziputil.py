@@ -0,0 +1,263 @@
+# -*- coding: utf-8 -*-
+
+import shutil
+import struct
+import time
+import zlib
+from io import BytesIO
+from pathlib import Path
+from typing import BinaryIO, List, Tuple, Union
+from zipfile import (ZipFile, ZipInfo, ZIP_DEFLATED, ZIP_FILECOUNT_LIMIT, ZIP64_LIMIT, ZIP64_VERSION,
+                     sizeFileHeader, stringCentralDir, stringEndArchive, stringEndArchive64,
+                     stringEndArchive64Locator, structCentralDir, structEndArchive, structEndArchive64,
+                     structEndArchive64Locator, structFileHeader)
+
+# Size of the chunks used when streaming member data
+CHUNK_SIZE = 1 << 20
+
+# Offsets into the local file header
+_FH_FILENAME_LENGTH = 10
+_FH_EXTRA_FIELD_LENGTH = 11
+# General purpose flags: sizes in a data descriptor after the data, UTF-8 file name
+FLAG_DATA_DESCRIPTOR = 0x08
+FLAG_UTF8 = 0x800
+# Extra field holding the ZIP64 sizes and offset
+ZIP64_EXTRA = 0x0001
+
+
+def clone_info(zinfo: ZipInfo) -> ZipInfo:
+    """
+    Copies the metadata of a member without its archive-specific fields (offset, extra).
+
+    Args:
+        zinfo: The member to copy.
+
+    Returns:
+        ZipInfo: A new member description with the same name, timestamps, sizes and CRC.
+    """
+    info = ZipInfo(zinfo.filename, zinfo.date_time)
+    info.compress_type = zinfo.compress_type
+    info.comment = zinfo.comment
+    info.create_system = zinfo.create_system
+    info.external_attr = zinfo.external_attr
+    info.CRC = zinfo.CRC
+    info.compress_size = zinfo.compress_size
+    info.file_size = zinfo.file_size
+    return info
+
+
+def data_offset(stream: BinaryIO, zinfo: ZipInfo) -> int:
+    """
+    Returns where the data of a member starts, after its local file header.
+
+    Args:
+        stream: The archive file, opened for reading.
+        zinfo: The member, as listed by ZipFile.infolist.
+    """
+    stream.seek(zinfo.header_offset)
+    header = struct.unpack(structFileHeader, stream.read(sizeFileHeader))
+    return zinfo.header_offset + sizeFileHeader + header[_FH_FILENAME_LENGTH] + header[_FH_EXTRA_FIELD_LENGTH]
+
+
+def read_raw(stream: BinaryIO, zinfo: ZipInfo) -> bytes:
+    """
+    Reads the still-compressed data of a member.
+
+    Args:
+        stream: The archive file, opened for reading.
+        zinfo: The member to read, as listed by ZipFile.infolist.
+
+    Returns:
+        bytes: The compressed bytes, exactly as stored in the archive.
+    """
+    stream.seek(data_offset(stream, zinfo))
+    return stream.read(zinfo.compress_size)
+
+
+def encode_name(filename: str) -> Tuple[bytes, int]:
+    """
+    Encodes a member name as zipfile does: ASCII when possible, otherwise UTF-8 with its flag.
+
+    Returns:
+        Tuple[bytes, int]: The encoded name and the flag bits it needs.
+    """
+    try:
+        return filename.encode('ascii'), 0
+    except UnicodeEncodeError:
+        return filename.encode('utf-8'), FLAG_UTF8
+
+
+def strip_zip64_extra(extra: bytes) -> bytes:
+    """
+    Removes the ZIP64 field from the extra data of a member, so it can be written again.
+    """
+    fields, position = [], 0
+    while position + 4 <= len(extra):
+        tag, size = struct.unpack('<HH', extra[position:position + 4])
+        if tag != ZIP64_EXTRA:
+            fields.append(extra[position:position + 4 + size])
+        position += 4 + size
+    return b''.join(fields)
+
+
+def central_directory_entry(zinfo: ZipInfo) -> bytes:
+    """
+    Serializes the central directory record of a member.
+
+    Args:
+        zinfo: The member, with its sizes, CRC and header offset set.
+    """
+    year, month, day, hour, minute, second = zinfo.date_time
+    dosdate = (year - 1980) << 9 | month << 5 | day
+    dostime = hour << 11 | minute << 5 | second // 2
+
+    zip64, file_size, compress_size, header_offset = [], zinfo.file_size, zinfo.compress_size, zinfo.header_offset
+    if file_size > ZIP64_LIMIT or compress_size > ZIP64_LIMIT:
+        zip64 += [file_size, compress_size]
+        file_size = compress_size = 0xFFFFFFFF
+    if header_offset > ZIP64_LIMIT:
+        zip64.append(header_offset)
+        header_offset = 0xFFFFFFFF
+    # A ZIP64 field read from an existing archive is written again only if still needed
+    extra, min_version = strip_zip64_extra(zinfo.extra), 0
+    if zip64:
+        extra = struct.pack(f'<HH{len(zip64)}Q', ZIP64_EXTRA, 8 * len(zip64), *zip64) + extra
+        min_version = ZIP64_VERSION
+
+    filename, flag_bits = encode_name(zinfo.filename)
+    header = struct.pack(structCentralDir, stringCentralDir, max(min_version, zinfo.create_version),
+                         zinfo.create_system, max(min_version, zinfo.extract_version), zinfo.reserved,
+                         zinfo.flag_bits | flag_bits, zinfo.compress_type, dostime, dosdate, zinfo.CRC,
+                         compress_size, file_size, len(filename), len(extra), len(zinfo.comment), 0,
+                         zinfo.internal_attr, zinfo.external_attr, header_offset)
+    return header + filename + extra + zinfo.comment
+
+
+class RawZipWriter:
+    """
+    Writes a zip archive from members that are compressed already, so they are copied as-is.
+
+    The local headers come from ZipInfo.FileHeader; the central directory and the end records are
+    written on close. In append mode the new members are written over the old central directory,
+    which is written again with every member.
+
+    Args:
+        file: The path or seekable binary file to write.
+        mode: 'w' to create the archive, 'a' to append to an existing one.
+    """
+
+    def __init__(self, file: Union[str, Path, BinaryIO], mode: str = 'w'):
+        self.members: List[ZipInfo] = []
+        self.owned = isinstance(file, (str, Path))
+        if mode == 'a':
+            with ZipFile(file) as old:
+                self.members = old.infolist()
+            if any(zinfo.flag_bits & FLAG_DATA_DESCRIPTOR for zinfo in self.members):
+                raise ValueError(f'Cannot append to {file}: its members end with data descriptors')
+        self.stream = open(file, 'r+b' if mode == 'a' else 'wb') if self.owned else file
+        self.names = {zinfo.filename for zinfo in self.members}
+        # The old central directory starts where the data of the last member ends
+        self.stream.seek(max((data_offset(self.stream, zinfo) + zinfo.compress_size for zinfo in self.members),
+                             default=0))
+
+    def write_raw(self, zinfo: ZipInfo, data: Union[bytes, BinaryIO]) -> None:
+        """
+        Writes an already-compressed member.
+
+        The caller provides CRC, compress_size, file_size and compress_type on zinfo,
+        so the data is copied as-is without being compressed again.
+
+        Args:
+            zinfo: The member description.
+            data: The compressed bytes, or a binary file positioned at their start.
+        """
+        if zinfo.filename in self.names:
+            raise ValueError(f'Duplicate member {zinfo.filename}')
+        zip64 = zinfo.file_size > ZIP64_LIMIT or zinfo.compress_size > ZIP64_LIMIT
+        zinfo.flag_bits = 0x00
+        if not zinfo.external_attr:
+            zinfo.external_attr = 0o600 << 16  # permissions: ?rw-------
+
+        zinfo.header_offset = self.stream.tell()
+        self.stream.write(zinfo.FileHeader(zip64))
+        if isinstance(data, bytes):
+            self.stream.write(data)
+        else:
+            shutil.copyfileobj(data, self.stream, CHUNK_SIZE)
+
+        self.members.append(zinfo)
+        self.names.add(zinfo.filename)
+
+    def writestr(self, name: str, data: bytes, compresslevel: int = 6) -> None:
+        """
+        Compresses and writes a member, like ZipFile.writestr.
+
+        Args:
+            name: The member name.
+            data: The uncompressed content.
+            compresslevel: The zlib compression level.
+        """
+        compressed = BytesIO()
+        zinfo = deflate_stream(BytesIO(data), compressed, compresslevel=compresslevel)
+        zinfo.filename, zinfo.orig_filename = name, name
+        zinfo.date_time = time.localtime()[:6]
+        self.write_raw(zinfo, compressed.getvalue())
+
+    def close(self) -> None:
+        """Writes the central directory and the end records, and closes the file if it was opened here."""
+        if self.stream is None:
+            return
+        try:
+            start = self.stream.tell()
+            for zinfo in self.members:
+                self.stream.write(central_directory_entry(zinfo))
+            end = self.stream.tell()
+            entries, size, offset = len(self.members), end - start, start
+            if entries > ZIP_FILECOUNT_LIMIT or size > ZIP64_LIMIT or offset > ZIP64_LIMIT:
+                self.stream.write(struct.pack(structEndArchive64, stringEndArchive64, 44, 45, 45, 0, 0,
+                                              entries, entries, size, offset))
+                self.stream.write(struct.pack(structEndArchive64Locator, stringEndArchive64Locator, 0, end, 1))
+                entries, size, offset = min(entries, 0xFFFF), min(size, 0xFFFFFFFF), min(offset, 0xFFFFFFFF)
+            self.stream.write(struct.pack(structEndArchive, stringEndArchive, 0, 0, entries, entries, size, offset, 0))
+            # What is left of a longer central directory in append mode
+            self.stream.truncate()
+        finally:
+            if self.owned:
+                self.stream.close()
+            self.stream = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+
+def deflate_stream(src: BinaryIO, dst: BinaryIO, compresslevel: int = 6) -> ZipInfo:
+    """
+    Compresses a stream in chunks into raw deflate data suitable for write_raw.
+
+    Args:
+        src: The uncompressed input.
+        dst: The output receiving the compressed bytes.
+        compresslevel: The zlib compression level.
+
+    Returns:
+        ZipInfo: A partial member description holding CRC and sizes; the caller sets the name and time.
+    """
+    compressor = zlib.compressobj(compresslevel, zlib.DEFLATED, -15)
+    crc, file_size, compress_size = 0, 0, 0
+    while chunk := src.read(CHUNK_SIZE):
+        crc = zlib.crc32(chunk, crc)
+        file_size += len(chunk)
+        compressed = compressor.compress(chunk)
+        compress_size += len(compressed)
+        dst.write(compressed)
+    compressed = compressor.flush()
+    compress_size += len(compressed)
+    dst.write(compressed)
+
+    zinfo = ZipInfo()
+    zinfo.compress_type = ZIP_DEFLATED
+    zinfo.CRC, zinfo.file_size, zinfo.compress_size = crc, file_size, compress_size
+    return zinfo
@@ -5,54 +5,128 @@ from collections import namedtuple
 from pathlib import Path
 from typing import Dict, Any, List, Tuple, Generator
 
-import pandas as pd
 from more_itertools import always_iterable, first
 
+from ._layout import output_root
+
 # 时间序列
 TimeSeries = namedtuple('TimeSeries', ['Start', 'End'])
 
 
-def iterdict(input_data: dict, only=False) -> List[Dict[str, Any]]:
+def _is_missing(value: Any) -> bool:
+    """Return True for the values pandas treats as NA: None and NaN."""
+    return value is None or (isinstance(value, float) and value != value)
+
+
+def _broadcast_columns(input_data: dict) -> Dict[str, list]:
+    """
+    Turns a dict of named-range values into equally long columns.
+
+    Lists and tuples are columns; scalars are repeated to the common length.
+
+    Raises:
+        ValueError: If no value is a list or tuple, or the lists differ in length.
+    """
+    lengths = {len(value) for value in input_data.values() if isinstance(value, (list, tuple))}
+    if len(lengths) != 1:
+        raise ValueError("If using all scalar values, you must pass an index")
+    length = lengths.pop()
+    return {key: list(value) if isinstance(value, (list, tuple)) else [value] * length
+            for key, value in input_data.items()}
+
+
+def _records_to_columns(records: List[dict]) -> Dict[str, list]:
+    """Turns records into columns, filling keys a record lacks with None."""
+    keys = dict.fromkeys(key for record in records for key in record)
+    return {key: [record.get(key) for record in records] for key in keys}
+
+
+def _numeric_converter(values: List[Any]):
+    """
+    Mirrors convert_dtypes for a column: a column of numbers that are all integral becomes int,
+    and a column mixing ints with fractional floats becomes float.
+
+    Returns:
+        The conversion to apply to each present value, or None to keep the values as they are.
+    """
+    present = [value for value in values if not _is_missing(value)]
+    if not present or not all(isinstance(value, (int, float)) and not isinstance(value, bool) for value in present):
+        return None
+    if all(isinstance(value, int) or value.is_integer() for value in present):
+        return int
+    return float
+
+
+def normalize_records(input_data, only=False) -> Generator[Dict[str, Any], None, None]:
     """
-    Transforms input data into a list of dictionaries suitable for DataFrame conversion.
+    Turns named-range data into records without building a DataFrame.
+
+    With only=False the dict holds one column per name: lists are columns and scalars are
+    broadcast to every row, and a Template column of None is added. With only=True the input
+    is one record (or an iterable of records) and list values stay whole.
+    NaN becomes None, integral number columns become int, and rows and then columns whose
+    values are all missing are dropped, as the previous pandas round-trip did.
 
     Args:
         input_data (dict): The input dictionary to be transformed.
         only (bool, optional): A flag to determine the processing path. Defaults to False.
 
-    Returns:
-        List[Dict[str, Any]]: A list of dictionaries representing the processed input data.
+    Yields:
+        Dict[str, Any]: One record per row.
 
     Raises:
         ValueError: If all scalar values are used without an index.
     """
     if only:
-        target_data = list(always_iterable(input_data, base_type=dict))
+        columns = _records_to_columns(list(always_iterable(input_data, base_type=dict)))
     else:
-        target_data = input_data | dict(Template=None)
-    try:
-        result = pd.DataFrame(target_data)
-        df = (result
-              # .replace(to_replace=None, value=pd.NA)  # 将 None 值替换为 NaN
-              .convert_dtypes()
-              .dropna(how='all', axis=0)  # 删除所有值均为 NA 的行
-              .dropna(how='all', axis=1)  # 删除所有值均为 NA 的列
-              )
-    except ValueError as error:
-        raise ValueError("If using all scalar values, you must pass an index") from error
+        columns = _broadcast_columns(input_data | dict(Template=None))
+
+    rows = len(next(iter(columns.values()), []))
+    # 删除所有值均为 NA 的行
+    kept = [row for row in range(rows) if not all(_is_missing(column[row]) for column in columns.values())]
+    # 删除所有值均为 NA 的列
+    columns = {key: column for key, column in columns.items()
+               if not all(_is_missing(column[row]) for row in kept)}
+    converters = {key: _numeric_converter(column) for key, column in columns.items()}
+
+    for row in kept:
+        record = {}
+        for key, column in columns.items():
+            value = column[row]
+            if _is_missing(value):
+                value = None
+            elif converters[key] is not None:
+                value = converters[key](value)
+            record[key] = value
+        yield record
 
-    # Convert the DataFrame back to a list of dictionaries and return.
-    return df.to_dict(orient='records')
+
+def iterdict(input_data: dict, only=False) -> List[Dict[str, Any]]:
+    """
+    Transforms input data into a list of dictionaries.
+
+    Args:
+        input_data (dict): The input dictionary to be transformed.
+        only (bool, optional): A flag to determine the processing path. Defaults to False.
+
+    Returns:
+        List[Dict[str, Any]]: A list of dictionaries representing the processed input data.
+
+    Raises:
+        ValueError: If all scalar values are used without an index.
+    """
+    return list(normalize_records(input_data, only=only))
 
 
 def create_result_folder(top=None, *, target_folder_name='Result') -> Path:
     """
     Creates a folder with the specified name in the given top directory
-    or on the Desktop if no directory is provided.
+    or in the output root (OA_OUTPUT_ROOT, by default the Desktop) if no directory is provided.
 
     Parameters:
     - top (str, optional): The path of the top directory where the folder will be created.
-      Defaults to None, which means the Desktop will be used.
+      Defaults to None, which means the output root will be used.
     - target_folder_name (str, optional): The name of the folder to be created. Defaults to 'Result'.
 
     Returns:
@@ -61,9 +135,8 @@ def create_result_folder(top=None, *, target_folder_name='Result') -> Path:
     Raises:
     - ValueError: If the target folder name contains invalid characters.
     """
-    # Determine the base path: Desktop if 'top' is None, otherwise use 'top'
-    desktop_path = Path.home() / 'Desktop'
-    path = desktop_path if top is None else Path(top)
+    # Determine the base path: the output root if 'top' is None, otherwise use 'top'
+    path = output_root() if top is None else Path(top)
 
     # 验证目标文件夹名称是否包含非法字符
     # 正则表达式模式字符串r'^[a-zA-Z0-9-_\u4e00-\u9fa5]+$'的含义如下：
@@ -1,17 +1,19 @@
 # -*- coding: utf-8 -*-
 
+import tempfile
 from collections import namedtuple
 from dataclasses import dataclass
+from pathlib import Path
 from typing import Dict, Any, Tuple, Iterator
 
 from more_itertools import one
 
 import OA.common as com
-from ._pil import generate_personal_income_tax
-from ._render import render_docx
+from ._layout import OutputLayout, output_layout
 from ._search import search_template_file
-from ._vat import fill_sheet
-from .timeperiod import generate_period_range
+from ._trace import RunReport, span, tracing
+from ._validate import validate_records
+from .timeperiod import generate_period_range, generate_period_ranges
 
 # 时期
 TimeSeries = namedtuple('TimeSeries', ['Start', 'End', 'Freq'])
@@ -33,57 +35,152 @@ class DataPartition:
         return iter(self._split())
 
 
+def template_file(template):
+    """Return the file of a template name: a workbook for the VAT returns, otherwise a Word document."""
+    if template is None:
+        return None
+    elif template in ('小规模', '一般纳税人'):
+        return search_template_file(name=template, suffix='xlsx')
+    else:
+        return search_template_file(template)
+
+
 class TemplateEngine:
+    """
+    Runs the pipeline of a template over the data read from a worksheet.
+
+    With only=True, input_data may also be a list of registers, one per company, each holding its own
+    Template, Start, End and Freq. They are run as a batch: grouped by template, every template and
+    office backend is opened once, and each company gets its own result folder.
+
+    With a sink (see OA._sink), the outputs are written into it, e.g. straight into a zip archive,
+    instead of result folders; a batch puts each company's result folder in the sink.
+    """
 
-    def __init__(self, input_data, only=False):
-        self.template = input_data.setdefault('Template', None)
+    def __init__(self, input_data, only=False, workers=1, backend='excel', sink=None):
+        if isinstance(input_data, dict):
+            self.template = input_data.setdefault('Template', None)
+        else:
+            # A batch of registers; each names its own template
+            self.template = None
         self.only = only
+        self.workers = workers
+        self.backend = backend
+        self.sink = sink
         self.data = input_data
 
     @property
     def template_path(self):
-        if self.template is None:
-            return None
-        elif self.template in ('小规模', '一般纳税人'):
-            return search_template_file(name=self.template, suffix='xlsx')
-        else:
-            return search_template_file(self.template)
-
-    def run(self):
-
+        return template_file(self.template)
+
+    def run(self, report_file=None, trace_file=None) -> RunReport:
+        """
+        Runs the pipeline for the template and traces every stage.
+
+        Args:
+            report_file: Write the run report as JSON to this path.
+            trace_file: Write the spans in the Chrome trace event format to this path.
+
+        Returns:
+            RunReport: Span timings, counters and the value returned by the pipeline.
+        """
+        with tracing() as tracer:
+            with span('run', 'run', template=self.template, only=self.only):
+                result = self._dispatch()
+        report = tracer.report(result=result)
+
+        if report_file is not None:
+            report.write_json(report_file)
+        if trace_file is not None:
+            report.write_chrome_trace(trace_file)
+        return report
+
+    def _result_folder(self, name, register=None, timeseries=None, template=None):
+        # Outputs written into a sink only borrow the folder name
+        if self.sink is not None:
+            return Path(name)
+        register = register or {}
+        return output_layout().create(name, template=template or self.template, company=register.get('CC'),
+                                      timeseries=timeseries)
+
+    def _dispatch(self):
+        # Each stage imports its own backends, so only the branch that runs pays for them.
+        # The records are validated first, so bad input fails before any folder or office process exists.
         if not self.only:
-            out_path = com.create_result_folder(target_folder_name=self.template)
+            records = validate_records(self, template=self.template, periods=False) if self.template else None
+            out_path = self._result_folder(self.template)
             match self.data:
                 case {'Template': tpl} if tpl is not None:
-                    return render_docx(initial_data=self,
-                                       path=self.template_path, out_fd=out_path, label='Cloud')
+                    from ._render import render_docx
+                    return render_docx(initial_data=records, path=self.template_path,
+                                       out_fd=out_path, label='Cloud', workers=self.workers, sink=self.sink)
 
                 case _:
                     pass
 
+        elif not isinstance(self.data, dict):
+            return self._run_batch(validate_records(self))
+
         else:
-            dictionary = one(self)
+            dictionary = one(validate_records(self))
             template, timeseries, register = DataPartition(dictionary)
             periods = generate_period_range(timeseries=timeseries)
 
             target = register.get('CN', template)
-            out_path = com.create_result_folder(target_folder_name=f'{target!s:.6}_{self.template}')
+            out_path = self._result_folder(f'{target!s:.6}_{self.template}', register, timeseries)
 
             match self.data:
                 case {'Template': '个税压缩包'}:
-                    return generate_personal_income_tax(register=register, periods=periods, output_folder=out_path)
+                    from ._pil import generate_personal_income_tax
+                    return generate_personal_income_tax(register=register, periods=periods, output_folder=out_path,
+                                                        backend=self.backend, sink=self.sink)
 
                 case {'Template': tpl} if tpl in ('小规模', '一般纳税人'):
+                    from ._vat import fill_sheet
                     context = com.merge_range_and_data(time_stamps=periods, data=register)
-                    return fill_sheet(path=out_path, fullname=self.template_path, data=context)
+                    return fill_sheet(path=out_path, fullname=self.template_path, data=context,
+                                      backend=self.backend, sink=self.sink)
 
                 case {'Template': tpl} if tpl != '个税压缩包':
+                    from ._render import render_docx
                     context = com.merge_range_and_data(time_stamps=periods, data=register)
-                    return render_docx(initial_data=context,
-                                       path=self.template_path, out_fd=out_path, label='Tax')
+                    return render_docx(initial_data=context, path=self.template_path,
+                                       out_fd=out_path, label='Tax', workers=self.workers, sink=self.sink)
 
                 case _:
                     pass
 
+    def _run_batch(self, records):
+        if self.sink is None:
+            return self._run_batch_in(output_layout(), records)
+        from ._sink import write_directory
+
+        # The batch stages write result folders, so they run in a scratch root copied into the sink
+        with tempfile.TemporaryDirectory(prefix='oa_batch_') as scratch:
+            layout = OutputLayout(Path(scratch), output_layout().shards)
+            folders = self._run_batch_in(layout, records)
+            write_directory(self.sink, layout.root)
+        return [folder.relative_to(layout.root) for folder in folders]
+
+    def _run_batch_in(self, layout, records):
+        from ._batch import BatchJob, run_batch
+
+        partitions = [tuple(DataPartition(record)) for record in records]
+        calendars = generate_period_ranges(timeseries for _, timeseries, _ in partitions)
+
+        jobs, used = [], {}
+        for record, (_, timeseries, register), periods in zip(records, partitions, calendars):
+            template = record.get('Template') or self.template
+            target = register.get('CN', template)
+            name = f'{target!s:.6}_{template}'
+            # Companies whose names start alike still get separate folders
+            used[name] = used.get(name, 0) + 1
+            if used[name] > 1:
+                name = f'{name}_{used[name]}'
+            out_path = layout.create(name, template=template, company=register.get('CC'), timeseries=timeseries)
+            jobs.append(BatchJob(template, template_file(template), register, periods, out_path))
+
+        return run_batch(jobs, workers=self.workers, backend=self.backend)
+
     def __iter__(self):
-        return iter(com.iterdict(self.data, only=self.only))
+        return com.normalize_records(self.data, only=self.only)
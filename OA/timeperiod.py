@@ -1,73 +1,113 @@
 # -*- coding: utf-8 -*-
 
-from datetime import date
-from itertools import combinations
-from typing import Iterable, Tuple
-
-import pandas as pd
-
-# Pandas: Version 2.2
-# Deprecate aliases M, Q, Y, etc. in favour of ME, QE, YE, etc. for offsets
-# Constants for frequency aliases
-OFFSET_ALIASES = {
-    'YE': 'YearEnd_year end frequency',
-    'YS': 'YearBegin_year start frequency',
-    'ME': 'MonthEnd_month end frequency',
-    'MS': 'MonthBegin_month start frequency',
-    'QE': 'QuarterEnd_quarter end frequency',
-    'QS': 'QuarterBegin_quarter start frequency',
+from calendar import monthrange
+from datetime import date, datetime
+from functools import lru_cache
+from typing import Iterable, List, Tuple
+
+# Number of months in one period for each frequency
+MONTHS_PER_PERIOD = {
+    'M': 1,  # month
+    'Q': 3,  # quarter, starting in January, April, July and October
+    'Y': 12,  # calendar year
 }
 
 NO_FREQ = "N"  # Indicator for no frequency
 
+# Number of distinct calendars kept in memory
+CALENDAR_CACHE_SIZE = 1024
 
-def generate_range(start: date | None = None, end: date | None = None,
-                   freq: str = "M") -> Iterable[Tuple[date, date]]:
+# Immutable sequence of (start_date, end_date) pairs
+Periods = Tuple[Tuple[date, date], ...]
+
+
+def _as_date(value) -> date:
+    """Return the calendar date of a date, datetime or ISO 8601 string."""
+    if isinstance(value, datetime):
+        return value.date()
+    if isinstance(value, date):
+        return value
+    return date.fromisoformat(str(value))
+
+
+def _period_index(day: date, months: int) -> int:
+    """Return the number of whole periods between year 0 and the period containing day."""
+    return (day.year * 12 + day.month - 1) // months
+
+
+@lru_cache(maxsize=CALENDAR_CACHE_SIZE)
+def _calendar(first: int, last: int, months: int) -> Periods:
+    """Build the periods from index first to index last, inclusive."""
+    periods = []
+    for index in range(first, last + 1):
+        start_year, start_month = divmod(index * months, 12)
+        end_year, end_month = divmod(index * months + months - 1, 12)
+        periods.append((date(start_year, start_month + 1, 1),
+                        date(end_year, end_month + 1, monthrange(end_year, end_month + 1)[1])))
+    return tuple(periods)
+
+
+def generate_range(start: date | None = None, end: date | None = None, freq: str = "M") -> Periods:
     """
     Generate a range of dates based on the start and end dates, and the frequency provided.
 
+    The calendar is built with plain date arithmetic and cached, so every start and end date
+    falling in the same pair of periods returns the same tuple.
+
     Parameters:
-    - start: Optional start date for the range.
-    - end: Optional end date for the range.
-    - freq: Frequency for generating dates, defaults to monthly ('M').
+    - start: Start date for the range.
+    - end: End date for the range.
+    - freq: Frequency for generating dates, 'M' (monthly, the default), 'Q' or 'Y'.
 
     Returns:
-    An iterable of tuples (start_date, end_date) for each interval within the range.
+    A tuple of (start_date, end_date) pairs, one for each period within the range.
     """
     # Validate input arguments
     if freq is None and any(x is None for x in [start, end]):
         raise ValueError("Must provide freq argument if no data is supplied")
-    if start is None and end is None:
-        raise ValueError("Must provide either start or end argument")
-
-    # Convert start and end dates to period start and end times
-    start_time = pd.Timestamp(start).to_period(freq=freq).start_time
-    end_time = pd.Timestamp(end).to_period(freq=freq).end_time
-
-    # Define start and end aliases based on frequency
-    alias_start, alias_end = f'{freq}S', f'{freq}E'
+    if start is None or end is None:
+        raise ValueError("Must provide both start and end arguments")
+    if freq not in MONTHS_PER_PERIOD:
+        raise ValueError(f"Invalid frequency: {freq}. Expected one of {tuple(MONTHS_PER_PERIOD)}")
 
-    # Generate date ranges for start and end times
-    date_range_start = pd.date_range(start=start_time, end=end_time, freq=alias_start)
-    date_range_end = pd.date_range(start=start_time, end=end_time, freq=alias_end)
+    months = MONTHS_PER_PERIOD[freq]
+    return _calendar(_period_index(_as_date(start), months), _period_index(_as_date(end), months), months)
 
-    # Return a zip object combining start and end dates
-    return zip(date_range_start, date_range_end)
 
-
-def generate_period_range(timeseries):
+def generate_period_range(timeseries) -> Periods:
     """
     Generate a range of periods within a given time range.
 
     Parameters:
-    - timeseries: A pandas Timestamp object representing the time range.
+    - timeseries: A TimeSeries with Start, End and Freq.
 
     Returns:
-    An iterable of tuples representing the periods within the time range.
+    A tuple of (start_date, end_date) pairs representing the periods within the time range.
     """
     # Handle no frequency or single point in time case
     if timeseries.Freq == NO_FREQ or timeseries.Start == timeseries.End:
-        return combinations((timeseries.Start, timeseries.End), r=2)
+        return ((timeseries.Start, timeseries.End),)
     else:
         # Generate range using start, end, and frequency for other cases
         return generate_range(start=timeseries.Start, end=timeseries.End, freq=timeseries.Freq)
+
+
+def generate_period_ranges(timeseries: Iterable) -> List[Periods]:
+    """
+    Generate the periods of many clients in one call.
+
+    Each distinct (Start, End, Freq) is computed once; clients sharing a calendar share the same tuple.
+
+    Parameters:
+    - timeseries: TimeSeries with Start, End and Freq, one per client.
+
+    Returns:
+    The periods of each client, in input order.
+    """
+    computed, periods = {}, []
+    for series in timeseries:
+        key = tuple(series)
+        if key not in computed:
+            computed[key] = generate_period_range(series)
+        periods.append(computed[key])
+    return periods
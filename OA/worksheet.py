@@ -1,10 +1,14 @@
 # -*- coding: utf-8 -*-
 
 import logging
+import re
+import xml.etree.ElementTree as ET
 from collections import namedtuple, UserDict
 from dataclasses import dataclass, field
 from datetime import date, datetime
-from typing import Dict, Any, Set, List, Iterable, NamedTuple
+from pathlib import Path
+from typing import Dict, Any, Set, List, Iterable, NamedTuple, Tuple, Optional
+from zipfile import BadZipFile, ZipFile
 
 from xlwings import Sheet
 
@@ -13,6 +17,19 @@ logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(
 
 # NamedTuple to represent parts of a named range in Excel
 Sandwich = namedtuple('Sandwich', ['prefix', 'sep', 'suffix'])
+# 1-based bounds of a rectangular range
+Bounds = namedtuple('Bounds', ['row', 'col', 'last_row', 'last_col'])
+
+# A1-style address such as "=BASE!$C$8" or "$B$7:$B$8"; the sheet part is captured, quoted or not
+ADDRESS_PATTERN = re.compile(
+    r"^=?(?:('(?:[^']|'')+'|[^!]+)!)?\$?([A-Z]{1,3})\$?(\d+)(?::\$?([A-Z]{1,3})\$?(\d+))?$")
+# Structured reference to a table column such as "=Cloud[企业名称]"
+TABLE_COLUMN_PATTERN = re.compile(r"^=?([^\[\]!]+)\[([^\[\]]+)\]$")
+# Part of an .xlsx/.xlsm package listing the worksheets and the defined names
+WORKBOOK_PART = 'xl/workbook.xml'
+NS = {'m': 'http://schemas.openxmlformats.org/spreadsheetml/2006/main'}
+# Built-in names such as Print_Area are stored with this prefix, which Excel does not show
+BUILTIN_PREFIX = '_xlnm.'
 
 
 @dataclass
@@ -46,6 +63,187 @@ class DefinedName:
             # 返回一个3元组:其中包含分隔符之前的部分、分隔符本身，以及分隔符之后的部分。
             yield Sandwich._make(item.name.partition(self.spe)).suffix
 
+    def items(self) -> Iterable[Tuple[str, str]]:
+        """
+        Yields (name, refers_to) pairs.
+
+        When the workbook is saved, the definitions are read from its file in one go instead of
+        one COM call per name; otherwise each definition is read once over COM.
+        """
+        names = self.saved_names()
+        if names is not None:
+            yield from names.items()
+            return
+        for item, name in zip(self._names_cache, self):
+            yield name, item.refers_to
+
+    def saved_names(self) -> Dict[str, str] | None:
+        """
+        Reads the names of the worksheet from the workbook file, when it holds what Excel shows.
+
+        :return: Name to reference, or None if the workbook has unsaved changes, is not an
+            .xlsx/.xlsm file on disk, or its names differ from the ones Excel reports.
+        """
+        book = self.sheet.book
+        try:
+            saved = bool(book.api.Saved)
+        except AttributeError:
+            saved = False
+        fullname = Path(book.fullname)
+        if not saved or not fullname.is_file():
+            return None
+        names = read_sheet_names(fullname, self.sheet.name)
+        if names is None or len(names) != len(self._names_cache):
+            return None
+        return names
+
+
+def read_sheet_names(fullname: str | Path, sheet_name: str) -> Optional[Dict[str, str]]:
+    """
+    Reads the names scoped to a worksheet from a workbook file, as RefersTo gives them in Excel.
+
+    :param fullname: The .xlsx/.xlsm workbook.
+    :param sheet_name: The worksheet name.
+    :return: Name to reference such as "=BASE!$C$8", or None if the file or worksheet cannot be read.
+    """
+    try:
+        with ZipFile(fullname) as archive:
+            root = ET.fromstring(archive.read(WORKBOOK_PART))
+    except (OSError, KeyError, BadZipFile, ET.ParseError):
+        return None
+    sheets = [sheet.get('name') for sheet in root.iterfind('m:sheets/m:sheet', NS)]
+    if sheet_name not in sheets:
+        return None
+    # Sheet-scoped names refer to the worksheet by its position in the workbook
+    local_id = str(sheets.index(sheet_name))
+    return {defined.get('name').removeprefix(BUILTIN_PREFIX): '=' + (defined.text or '')
+            for defined in root.iterfind('m:definedNames/m:definedName', NS)
+            if defined.get('localSheetId') == local_id}
+
+
+def column_number(letters: str) -> int:
+    """Converts column letters to a 1-based column number."""
+    number = 0
+    for char in letters:
+        number = number * 26 + ord(char) - ord('A') + 1
+    return number
+
+
+def parse_address(address: str) -> Optional[Bounds]:
+    """
+    Parses an A1-style address into its bounds.
+
+    :param address: An address such as "=BASE!$C$8" or "$B$7:$F$8".
+    :return: The bounds, or None if the address is not a plain cell or range.
+    """
+    match = ADDRESS_PATTERN.match(address.replace(' ', ''))
+    if match is None:
+        return None
+    _, col, row, last_col, last_row = match.groups()
+    last_col, last_row = last_col or col, last_row or row
+    return Bounds(int(row), column_number(col), int(last_row), column_number(last_col))
+
+
+def address_sheet(address: str) -> Optional[str]:
+    """
+    Returns the sheet an A1-style address names.
+
+    :param address: An address such as "=BASE!$C$8" or "='My Sheet'!$A$1".
+    :return: The sheet name without quotes, or None if the address names no sheet.
+    """
+    match = ADDRESS_PATTERN.match(address.strip())
+    if match is None or match.group(1) is None:
+        return None
+    sheet = match.group(1)
+    if sheet.startswith("'"):
+        sheet = sheet[1:-1].replace("''", "'")
+    return sheet
+
+
+def table_column_bounds(reference: str, tables: Dict[str, Tuple[Bounds, List[str]]]) -> Optional[Bounds]:
+    """
+    Resolves a structured reference to the data body of a table column.
+
+    :param reference: A reference such as "=Cloud[企业名称]".
+    :param tables: Table name to (data body bounds, column headers).
+    :return: The bounds, or None if the reference cannot be resolved.
+    """
+    match = TABLE_COLUMN_PATTERN.match(reference)
+    if match is None or match.group(1) not in tables:
+        return None
+    body, headers = tables[match.group(1)]
+    if match.group(2) not in headers:
+        return None
+    col = body.col + headers.index(match.group(2))
+    return Bounds(body.row, col, body.last_row, col)
+
+
+def slice_values(grid: List[List[Any]], origin: Tuple[int, int], bounds: Bounds) -> Any:
+    """
+    Cuts the values of a range out of a block of values read in one go.
+
+    The result has the shape xlwings gives a range value: a scalar for one cell,
+    a list for a single row or column, and a list of rows otherwise.
+
+    :param grid: The values of the block, row by row.
+    :param origin: 1-based (row, col) of the block's top-left cell.
+    :param bounds: The range to cut.
+    :return: The values of the range; cells outside the block are None.
+    """
+    def cell(row, col):
+        r, c = row - origin[0], col - origin[1]
+        if 0 <= r < len(grid) and 0 <= c < len(grid[r]):
+            return grid[r][c]
+        return None
+
+    rows = [[cell(row, col) for col in range(bounds.col, bounds.last_col + 1)]
+            for row in range(bounds.row, bounds.last_row + 1)]
+    if len(rows) == 1 and len(rows[0]) == 1:
+        return rows[0][0]
+    if len(rows) == 1:
+        return rows[0]
+    if all(len(row) == 1 for row in rows):
+        return [row[0] for row in rows]
+    return rows
+
+
+def normalize_value(value: Any) -> Any:
+    """Converts datetimes to dates and empty strings to None, like options(dates=date, empty=None)."""
+    if isinstance(value, datetime):
+        return value.date()
+    if value == '':
+        return None
+    return value
+
+
+@dataclass
+class FileSheet:
+    """
+    A worksheet loaded from a workbook file, for use without an Excel process.
+
+    :param name: The worksheet name.
+    :param grid: The cell values from A1, row by row.
+    :param names: Sheet-scoped defined names and what they refer to.
+    :param tables: Table name to (data body bounds, column headers).
+    """
+    name: str
+    grid: List[List[Any]]
+    names: Dict[str, str]
+    tables: Dict[str, Tuple[Bounds, List[str]]] = field(default_factory=dict)
+
+    @classmethod
+    def from_openpyxl(cls, ws) -> 'FileSheet':
+        grid = [[normalize_value(value) for value in row] for row in ws.iter_rows(values_only=True)]
+        names = {name: defined.attr_text for name, defined in ws.defined_names.items()}
+        tables = {}
+        for table in ws.tables.values():
+            bounds = parse_address(table.ref)
+            header_rows = table.headerRowCount if table.headerRowCount is not None else 1
+            body = Bounds(bounds.row + header_rows, bounds.col,
+                          bounds.last_row - (table.totalsRowCount or 0), bounds.last_col)
+            tables[table.name] = (body, [column.name for column in table.tableColumns])
+        return cls(name=ws.title, grid=grid, names=names, tables=tables)
+
 
 # 定义一个名为DefaultValues的元组，用于存储默认值
 class DefaultValues(NamedTuple):
@@ -109,26 +307,72 @@ class NamedRangeDict(UserDict):
 
 @dataclass
 class Worksheet:
-    sheets: Sheet | list
+    sheets: Sheet | FileSheet | list
     sheet_names: Set[str] = field(default_factory=set)
 
     def __post_init__(self):
         # Ensure sheets is a list for uniform processing
-        self.sheets = [self.sheets] if isinstance(self.sheets, Sheet) else self.sheets
+        self.sheets = [self.sheets] if isinstance(self.sheets, (Sheet, FileSheet)) else self.sheets
         if self.sheets is None:
             raise ValueError('No worksheets are provided.')
 
+    @classmethod
+    def from_path(cls, path: str | Path, sheet_names: Iterable[str] | None = None) -> 'Worksheet':
+        """
+        Loads worksheets from a workbook file without Excel.
+
+        :param path: The .xlsx/.xlsm workbook.
+        :param sheet_names: The worksheets to load. Defaults to the active worksheet.
+        :return: A Worksheet over the loaded sheets.
+        """
+        from openpyxl import load_workbook
+
+        wb = load_workbook(path, data_only=True)
+        try:
+            sheets = [wb[name] for name in sheet_names] if sheet_names else [wb.active]
+            return cls([FileSheet.from_openpyxl(ws) for ws in sheets])
+        finally:
+            wb.close()
+
     @staticmethod
-    def convert_to_dict(sheet: Sheet) -> Dict[str, Any]:
+    def convert_to_dict(sheet: Sheet | FileSheet) -> Dict[str, Any]:
         """
         Converts named ranges in a sheet to a dictionary.
+
+        All names are resolved to addresses first; the values are then read from the
+        used range in one call and sliced locally. Names that cannot be resolved to a
+        plain address or table column are read one by one.
         """
+        if isinstance(sheet, FileSheet):
+            references = sheet.names
+            tables, grid, origin = sheet.tables, sheet.grid, (1, 1)
+        else:
+            references = dict(DefinedName(sheet).items())
+            tables = {table.name: (parse_address(table.data_body_range.address),
+                                   table.header_row_range.options(ndim=1).value)
+                      for table in sheet.tables if table.data_body_range is not None}
+            # 通过 Range 的 options() 方法，可以指定读取数据的格式。
+            # options() 方法的参数 dates 用于指定日期格式:将日期转换为 datetime.date 类型。
+            # empty 用于指定空值的格式：将空值转换为 None。ndim=2 保证返回二维列表。
+            used = sheet.used_range
+            grid = used.options(dates=date, empty=None, ndim=2).value
+            origin = (used.row, used.column)
+
         # 将命名区域的名称作为 key，命名区域的值作为 value，构建字典。
-        # 通过 Range 的 options() 方法，可以指定读取数据的格式。
-        # options() 方法的参数 dates 用于指定日期格式:将日期转换为 datetime.date 类型。
-        # empty 用于指定空值的格式：将空值转换为 None。
-        return {name: sheet.range(name).options(dates=date, empty=None).value
-                for name in DefinedName(sheet)}
+        data = {}
+        for name, reference in references.items():
+            bounds = parse_address(reference) or table_column_bounds(reference, tables)
+            # The grid holds this sheet only; a name pointing at another sheet is read on its own
+            if bounds is not None and address_sheet(reference) not in (None, sheet.name):
+                bounds = None
+            if bounds is not None:
+                data[name] = slice_values(grid, origin, bounds)
+            elif isinstance(sheet, FileSheet):
+                logging.error(f'Unsupported reference for {name}: {reference}')
+                data[name] = None
+            else:
+                data[name] = sheet.range(name).options(dates=date, empty=None).value
+        return data
 
     def check_duplicate_sheets_and_convert(self, sheet: Sheet) -> Dict[str, Any]:
         """
@@ -0,0 +1,254 @@
+# -*- coding: utf-8 -*-
+"""
+Benchmark harness for the output pipeline stages.
+
+Each (stage, size) case runs in a fresh process against the bundled templates in OA/Template,
+using synthetic client registers, and reports wall time, peak RSS and files/second as JSON.
+
+The zip stage writes one copy of the 4 MB personal income tax workbook per register,
+so the 10,000 record case needs about 40 GB of scratch space in the temporary directory.
+
+Usage:
+    python benchmarks/bench.py --sizes 1,100 --stages render,fill --output bench.json
+"""
+
+import argparse
+import json
+import multiprocessing
+import platform
+import queue
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import date
+from pathlib import Path
+from random import Random
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+STAGES = ('validate', 'render', 'fill', 'convert', 'merge', 'zip')
+SIZES = (1, 100, 10_000)
+# Seconds allowed for one (stage, size) case
+CASE_TIMEOUT = 3600
+
+# Characters used to build unified social credit codes
+CODE_CHARS = '0123456789ABCDEFGHJKLMNPQRTUWXY'
+SURNAMES = '张王李赵刘陈杨黄周吴'
+WORDS = ('华东', '鑫源', '信达', '恒通', '宏远', '智联', '瑞丰', '嘉禾')
+
+
+def synthetic_registers(count, seed=0):
+    """
+    Generates reproducible client registers shaped like the data read from 税务.xlsx.
+
+    Args:
+        count (int): Number of registers.
+        seed (int): Random seed.
+
+    Returns:
+        list: The registers, one per client.
+    """
+    from OA._validate import cc_check_char, idn_check_char
+
+    rng = Random(seed)
+    registers = []
+    for index in range(count):
+        month = index % 12 + 1
+        name = rng.choice(SURNAMES) + rng.choice(SURNAMES)
+        code = '91' + ''.join(rng.choice(CODE_CHARS) for _ in range(15))
+        number = (f'{rng.randrange(110000, 660000)}{rng.randrange(1960, 2000)}'
+                  f'{rng.randrange(1, 13):02}{rng.randrange(1, 29):02}{rng.randrange(100, 1000)}')
+        registers.append({
+            'CN': f'上海{rng.choice(WORDS)}{rng.choice(WORDS)}{index:05}有限公司',
+            'CC': code + cc_check_char(code),
+            'LP': name,
+            'Name': name,
+            'IDN': number + idn_check_char(number),
+            'Date': date(2024, month, 15),
+            'Start': date(2024, month, 1),
+            'End': date(2024, month, 28),
+            'Phone': f'139{rng.randrange(10 ** 7, 10 ** 8)}',
+            'ID': index,
+            'Role': '法定代表人',
+            'Status': '在业',
+            'Freq': 'M',
+            'Template': '个人声明',
+        })
+    return registers
+
+
+def stage_validate(registers, workdir):
+    from OA._validate import check_records
+
+    start = time.perf_counter()
+    issues = check_records(registers)
+    return time.perf_counter() - start, len(registers) - len({issue.row for issue in issues})
+
+
+def stage_render(registers, workdir):
+    from OA._render import build_filenames, render_shard
+    from OA._search import search_template_file
+
+    jobs = build_filenames(registers, workdir, 'Cloud')
+    start = time.perf_counter()
+    failures = render_shard(search_template_file('个人声明'), jobs)
+    return time.perf_counter() - start, len(jobs) - len(failures)
+
+
+def stage_fill(registers, workdir):
+    from OA._search import search_template_file
+    from OA._vat import fill_headless
+
+    start = time.perf_counter()
+    fill_headless(workdir, search_template_file('小规模', suffix='xlsx'), registers)
+    # Registers sharing a period overwrite the same workbook, so count the saves instead of the files
+    return time.perf_counter() - start, len(registers)
+
+
+def stage_convert(registers, workdir):
+    from OA._convert2pdf import convert_directory
+
+    stage_render(registers, workdir)
+    start = time.perf_counter()
+    failures = convert_directory(workdir)
+    return time.perf_counter() - start, len(list(workdir.glob('*.docx'))) - len(failures)
+
+
+def stage_merge(registers, workdir):
+    from PyPDF2 import PdfWriter
+    from OA._pdfmerge import merge_and_write_pdf_files
+
+    # One two-page PDF per register
+    for index, _ in enumerate(registers):
+        writer = PdfWriter()
+        writer.add_blank_page(width=595, height=842)
+        writer.add_blank_page(width=595, height=842)
+        writer.write(workdir / f'{index:05}.pdf')
+        writer.close()
+
+    start = time.perf_counter()
+    merge_and_write_pdf_files(workdir)
+    return time.perf_counter() - start, len(registers)
+
+
+def stage_zip(registers, workdir):
+    from OA._autozip import auto_zip
+    from OA._biff import load_biff_template
+    from OA._pil import TPL_2019
+
+    template = load_biff_template(TPL_2019)
+    for index, register in enumerate(registers):
+        values = {key: register[key] for key in ('CN', 'CC', 'LP', 'Name', 'IDN', 'Date', 'Start', 'End')}
+        template.save(values, workdir / f'{2019 + index // 12}_{index % 12 + 1:02}.xls')
+
+    start = time.perf_counter()
+    auto_zip(lambda: workdir)()
+    return time.perf_counter() - start, len(registers)
+
+
+def peak_rss_mb():
+    """Returns the peak resident set size of this process in MiB, if the platform reports it."""
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports KiB, macOS reports bytes
+    return round(peak / (1024 * 1024 if sys.platform == 'darwin' else 1024), 1)
+
+
+def run_case(stage, size, queue):
+    """Runs one stage in the current (fresh) process and puts the measurement on the queue."""
+    result = {'stage': stage, 'size': size}
+    try:
+        with tempfile.TemporaryDirectory(prefix=f'oa_bench_{stage}_') as workdir:
+            seconds, files = globals()[f'stage_{stage}'](synthetic_registers(size), Path(workdir))
+        result.update(status='ok', wall_seconds=round(seconds, 4), files=files,
+                      files_per_second=round(files / seconds, 2) if seconds else None)
+    except (ImportError, FileNotFoundError) as error:
+        # Missing tooling, such as LibreOffice, Office or an optional package, skips the case
+        result.update(status='skipped', reason=f'{type(error).__name__}: {error}')
+    except Exception as error:
+        result.update(status='error', reason=f'{type(error).__name__}: {error}')
+    result['peak_rss_mb'] = peak_rss_mb()
+    queue.put(result)
+
+
+def collect(process, results_queue, timeout):
+    """
+    Waits for the measurement of a case, without hanging on a child that crashed or stalled.
+
+    Args:
+        process: The started case process.
+        results_queue: The queue the case puts its measurement on.
+        timeout (float): Seconds allowed for the case.
+
+    Returns:
+        dict: The measurement, or the status and reason of a case that reported nothing.
+    """
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            return results_queue.get(timeout=1)
+        except queue.Empty:
+            if not process.is_alive():
+                # A result put just before exiting may still be in flight
+                try:
+                    return results_queue.get(timeout=1)
+                except queue.Empty:
+                    return {'status': 'error', 'reason': f'case process exited with code {process.exitcode}'}
+    process.terminate()
+    return {'status': 'error', 'reason': f'case did not finish within {timeout}s'}
+
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', 'HEAD'], cwd=ROOT, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--stages', default=','.join(STAGES), help='comma-separated stages to run')
+    parser.add_argument('--sizes', default=','.join(map(str, SIZES)), help='comma-separated register counts')
+    parser.add_argument('--output', type=Path, help='write the JSON report to this file instead of stdout')
+    parser.add_argument('--timeout', type=float, default=CASE_TIMEOUT, help='seconds allowed for each case')
+    args = parser.parse_args(argv)
+
+    stages = [stage for stage in args.stages.split(',') if stage]
+    unknown = set(stages) - set(STAGES)
+    if unknown:
+        parser.error(f'unknown stages: {", ".join(sorted(unknown))}')
+
+    context = multiprocessing.get_context('spawn')
+    results = []
+    for stage in stages:
+        for size in map(int, args.sizes.split(',')):
+            results_queue = context.Queue()
+            process = context.Process(target=run_case, args=(stage, size, results_queue))
+            process.start()
+            results.append({'stage': stage, 'size': size} | collect(process, results_queue, args.timeout))
+            process.join()
+            print(json.dumps(results[-1], ensure_ascii=False), file=sys.stderr)
+
+    report = {
+        'commit': git_commit(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'results': results,
+    }
+    text = json.dumps(report, ensure_ascii=False, indent=2)
+    if args.output:
+        args.output.write_text(text, encoding='utf-8')
+    else:
+        print(text)
+    # Skipped cases lack tooling; errors are regressions
+    return 1 if any(result['status'] == 'error' for result in results) else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,94 @@
+# -*- coding: utf-8 -*-
+"""
+Import-time budget check for the OA package.
+
+Each statement is timed in fresh interpreters (best of --repeat runs). The check fails when the
+engine or a button module import exceeds the budget or pulls in a stage backend that should load
+lazily. The Worksheet import is reported for reference only, since xlwings itself imports pandas.
+tests/test_import_time.py runs the same check under pytest.
+
+Usage:
+    python benchmarks/import_time.py --budget 0.15
+"""
+
+import argparse
+import json
+import subprocess
+import sys
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+
+# Backends that must not be loaded by importing the engine
+LAZY_MODULES = ('pandas', 'PyPDF2', 'docx', 'docxtpl', 'jinja2', 'xlwings', 'win32com', 'uno')
+# Statements held to the budget: the package, the engine and the modules of the Excel buttons
+BUDGETED = ('import OA', 'from OA import TemplateEngine', 'import 工商', 'import 税务', 'import 工资表')
+# Seconds allowed for each budgeted statement
+BUDGET = 0.15
+
+PROBE = '''
+import json, sys, time
+start = time.perf_counter()
+{statement}
+seconds = time.perf_counter() - start
+print(json.dumps({{'seconds': seconds, 'loaded': [m for m in {lazy!r} if m in sys.modules]}}))
+'''
+
+
+def measure(statement, repeat):
+    """
+    Times a statement in fresh interpreters.
+
+    Args:
+        statement (str): The import statement.
+        repeat (int): Number of interpreters to start.
+
+    Returns:
+        dict: The best time in seconds and the lazy backends loaded by the statement.
+    """
+    runs = []
+    for _ in range(repeat):
+        output = subprocess.run([sys.executable, '-c', PROBE.format(statement=statement, lazy=LAZY_MODULES)],
+                                cwd=ROOT, capture_output=True, text=True, check=True).stdout
+        runs.append(json.loads(output))
+    best = min(runs, key=lambda run: run['seconds'])
+    return {'statement': statement, 'seconds': round(best['seconds'], 4), 'loaded': best['loaded']}
+
+
+def check(results, budget):
+    """
+    Returns the budget violations of the measurements.
+
+    Args:
+        results (list): Measurements returned by measure.
+        budget (float): Seconds allowed for each statement.
+
+    Returns:
+        list: One message per statement over the budget or loading a lazy backend.
+    """
+    errors = []
+    for result in results:
+        if result['seconds'] > budget:
+            errors.append(f'{result["statement"]!r} took {result["seconds"]}s, over the {budget}s budget')
+        if result['loaded']:
+            errors.append(f'{result["statement"]!r} loaded {", ".join(result["loaded"])}')
+    return errors
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--budget', type=float, default=BUDGET, help='seconds allowed for each budgeted import')
+    parser.add_argument('--repeat', type=int, default=5, help='fresh interpreters per statement')
+    args = parser.parse_args(argv)
+
+    results = [measure(statement, args.repeat) for statement in BUDGETED]
+    worksheet = measure('from OA import Worksheet', args.repeat)
+    errors = check(results, args.budget)
+
+    print(json.dumps({'budget': args.budget, 'results': results + [worksheet], 'errors': errors},
+                     ensure_ascii=False, indent=2))
+    return 1 if errors else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
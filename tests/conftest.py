@@ -0,0 +1,7 @@
+# -*- coding: utf-8 -*-
+
+import sys
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
@@ -0,0 +1,71 @@
+# -*- coding: utf-8 -*-
+
+from zipfile import ZIP_DEFLATED, ZipFile
+
+import pytest
+
+from OA._autozip import DIGEST_PREFIX, zip_directory
+from OA._ziputil import RawZipWriter
+
+CONTENT = {'2019_01.pdf': b'%PDF-1.4 January' * 500, '2019_02.pdf': b'%PDF-1.4 February' * 500,
+           '个人声明.docx': b'PK document' * 100}
+
+
+def read_back(archive):
+    with ZipFile(archive) as myzip:
+        assert myzip.testzip() is None
+        return {name: myzip.read(name) for name in myzip.namelist()}
+
+
+def write_files(path, content):
+    for name, data in content.items():
+        (path / name).write_bytes(data)
+
+
+def test_fresh_write(tmp_path):
+    archive = tmp_path / 'fresh.zip'
+    with RawZipWriter(archive) as myzip:
+        for name, data in CONTENT.items():
+            myzip.writestr(name, data)
+    assert read_back(archive) == CONTENT
+
+
+def test_append(tmp_path):
+    archive = tmp_path / 'append.zip'
+    with ZipFile(archive, 'w', ZIP_DEFLATED) as myzip:
+        myzip.writestr('2019_01.pdf', CONTENT['2019_01.pdf'])
+    with RawZipWriter(archive, 'a') as myzip:
+        myzip.writestr('2019_02.pdf', CONTENT['2019_02.pdf'])
+        myzip.writestr('个人声明.docx', CONTENT['个人声明.docx'])
+        with pytest.raises(ValueError):
+            myzip.writestr('2019_01.pdf', b'')
+    assert read_back(archive) == CONTENT
+
+
+def test_year_archive_skips_unchanged_content(tmp_path):
+    write_files(tmp_path, CONTENT)
+    zip_directory(tmp_path, per_year=True)
+    archive = tmp_path / '2019.zip'
+    assert read_back(archive) == {name: CONTENT[name] for name in ('2019_01.pdf', '2019_02.pdf')}
+    assert read_back(tmp_path / '个人声明.zip') == {'个人声明.docx': CONTENT['个人声明.docx']}
+    with ZipFile(archive) as myzip:
+        assert all(info.comment.startswith(DIGEST_PREFIX.encode()) for info in myzip.infolist())
+
+    # The same content again leaves the archive untouched, and the files are still cleaned up
+    written = archive.read_bytes()
+    write_files(tmp_path, {'2019_01.pdf': CONTENT['2019_01.pdf']})
+    zip_directory(tmp_path, per_year=True)
+    assert archive.read_bytes() == written
+    assert not (tmp_path / '2019_01.pdf').exists()
+
+    # A new month is appended in place
+    write_files(tmp_path, {'2019_03.pdf': b'March'})
+    zip_directory(tmp_path, per_year=True)
+    assert read_back(archive) == {name: CONTENT.get(name, b'March')
+                                  for name in ('2019_01.pdf', '2019_02.pdf', '2019_03.pdf')}
+
+    # Changed content replaces the member
+    write_files(tmp_path, {'2019_02.pdf': b'changed'})
+    zip_directory(tmp_path, per_year=True)
+    assert read_back(archive) == {'2019_01.pdf': CONTENT['2019_01.pdf'], '2019_02.pdf': b'changed',
+                                  '2019_03.pdf': b'March'}
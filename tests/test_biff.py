@@ -0,0 +1,76 @@
+# -*- coding: utf-8 -*-
+
+from datetime import date
+
+import pytest
+
+xlrd = pytest.importorskip('xlrd')
+
+from OA._biff import CompoundFile, load_biff_template  # noqa: E402
+from OA._pil import TPL_2019  # noqa: E402
+
+REGISTER = {'CN': '上海俊雅光学眼镜有限公司', 'CC': '91310000MACY1H6853', 'LP': '许军', 'Name': 'Xu Jun',
+            'IDN': '11010519491231002X', 'Date': date(2024, 3, 28), 'Start': date(2024, 1, 1),
+            'End': date(2024, 3, 31)}
+
+
+def a1(row, col):
+    letters = ''
+    col += 1
+    while col:
+        col, rest = divmod(col - 1, 26)
+        letters = chr(ord('A') + rest) + letters
+    return f'{letters}{row + 1}'
+
+
+def cell_value(book, sheet, row, col):
+    cell = sheet.cell(row, col)
+    if cell.ctype == xlrd.XL_CELL_DATE:
+        return xlrd.xldate_as_datetime(cell.value, book.datemode).date()
+    return cell.value
+
+
+@pytest.fixture(scope='module')
+def template():
+    return load_biff_template(TPL_2019)
+
+
+def test_named_cells_round_trip(template, tmp_path):
+    path = template.save(REGISTER, tmp_path / '2024_01.xls')
+    book = xlrd.open_workbook(path)
+    sheet = book.sheet_by_index(0)
+    for key, value in REGISTER.items():
+        cells = template.resolve(key)
+        assert cells
+        assert [cell_value(book, sheet, row, col) for row, col in cells] == [value] * len(cells)
+
+
+def test_long_values_grow_the_fat(template):
+    # 255 CJK characters take two sectors per cell, past the free entries of the last FAT sector
+    cells = sorted(cell for cell in template.cells if cell[0] > 20)[:200]
+    values = {a1(row, col): f'{index:03}' + '税' * 252 for index, (row, col) in enumerate(cells)}
+    data = bytes(template.render_file(REGISTER | values))
+
+    container = CompoundFile(data, 'Workbook')
+    assert len(container.fat_sectors) > len(template.container.fat_sectors)
+    book = xlrd.open_workbook(file_contents=data)
+    sheet = book.sheet_by_index(0)
+    assert all(sheet.cell_value(row, col) == values[a1(row, col)] for row, col in cells)
+    assert cell_value(book, sheet, *template.resolve('CC')[0]) == REGISTER['CC']
+
+
+def test_difat_grows_with_the_fat(template):
+    # A stream past 109 FAT sectors (about 7 MB) needs DIFAT sectors beyond the header
+    stream = template.container.read_stream()
+    grown = stream + bytes(20_000_000)
+    data = bytes(template.container.replace_stream(grown))
+
+    container = CompoundFile(data, 'Workbook')
+    assert container.difat_sectors
+    assert container.read_stream() == grown
+    assert xlrd.open_workbook(file_contents=data).nsheets == len(template.sheets)
+
+    # Shrinking back releases the sectors and keeps a readable file
+    data = bytes(container.replace_stream(stream))
+    assert CompoundFile(data, 'Workbook').read_stream() == stream
+    assert xlrd.open_workbook(file_contents=data).nsheets == len(template.sheets)
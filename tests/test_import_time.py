@@ -0,0 +1,16 @@
+# -*- coding: utf-8 -*-
+
+import sys
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / 'benchmarks'))
+
+from import_time import BUDGET, BUDGETED, check, measure  # noqa: E402
+
+
+@pytest.mark.parametrize('statement', BUDGETED)
+def test_import_within_budget(statement):
+    # Best of three fresh interpreters, as benchmarks/import_time.py measures
+    assert check([measure(statement, repeat=3)], BUDGET) == []
@@ -0,0 +1,45 @@
+# -*- coding: utf-8 -*-
+
+from concurrent.futures import ProcessPoolExecutor
+
+from OA._manifest import MANIFEST_NAME, Manifest, read_manifest
+
+
+def record_outputs(folder, names):
+    for name in names:
+        manifest = Manifest(folder)
+        output = folder / name
+        output.write_bytes(b'')
+        manifest.record(name, f'digest of {name}', [output])
+        manifest.save()
+
+
+def test_two_writers_merge(tmp_path):
+    first, second = Manifest(tmp_path), Manifest(tmp_path)
+    first.record('24_0331.xlsx', 'a', [tmp_path / '24_0331.xlsx'])
+    second.record('24_0630.xlsx', 'b', [tmp_path / '24_0630.xlsx'])
+    second.record('24_0930.xlsx', 'c')
+    first.save()
+    second.save()
+
+    entries, outputs = read_manifest(tmp_path / MANIFEST_NAME)
+    assert entries == {'24_0331.xlsx': 'a', '24_0630.xlsx': 'b', '24_0930.xlsx': 'c'}
+    assert outputs['24_0331.xlsx'] == ['24_0331.xlsx']
+    # The saving writer sees the other's entries afterwards
+    assert second.entries == entries
+
+    # A later record overwrites only its own entry
+    first.record('24_0331.xlsx', 'd')
+    first.save()
+    assert read_manifest(tmp_path / MANIFEST_NAME)[0] == entries | {'24_0331.xlsx': 'd'}
+
+
+def test_concurrent_processes_keep_every_entry(tmp_path):
+    batches = [[f'{writer}_{index}.pdf' for index in range(20)] for writer in range(4)]
+    with ProcessPoolExecutor(max_workers=len(batches)) as executor:
+        list(executor.map(record_outputs, [tmp_path] * len(batches), batches))
+
+    entries, outputs = read_manifest(tmp_path / MANIFEST_NAME)
+    names = {name for batch in batches for name in batch}
+    assert entries == {name: f'digest of {name}' for name in names}
+    assert outputs == {name: [name] for name in names}
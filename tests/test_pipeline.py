@@ -0,0 +1,72 @@
+# -*- coding: utf-8 -*-
+
+from datetime import date
+from pathlib import Path
+
+import pytest
+
+PyPDF2 = pytest.importorskip('PyPDF2')
+
+from OA._classify_files import MERGED_PDF_FOLDER_NAME, pdf_path  # noqa: E402
+from OA._convert2pdf import Converter  # noqa: E402
+from OA._pipeline import run_pipeline  # noqa: E402
+
+TEMPLATE = Path(__file__).resolve().parent.parent / 'OA' / 'Template' / 'Word' / '个人声明.docx'
+
+REGISTER = {'CN': '上海俊雅光学眼镜有限公司', 'CC': '91310000MACY1H6853', 'LP': '许军', 'Name': '许军',
+            'IDN': '11010519491231002X', 'Date': date(2024, 3, 28)}
+
+
+def write_pdf(document):
+    # One blank page whose width tells the documents apart
+    writer = PyPDF2.PdfWriter()
+    writer.add_blank_page(100 + int(document.stem), 100)
+    with open(pdf_path(document), 'wb') as stream:
+        writer.write(stream)
+
+
+class ReversingConverter(Converter):
+    """Converts every document, then reports them in reverse order."""
+
+    def convert_iter(self, files):
+        files = list(files)
+        for file in files:
+            write_pdf(file)
+        for file in reversed(files):
+            yield file, None
+
+
+class FailingConverter(Converter):
+    """Converts the first documents, then fails."""
+
+    def __init__(self, after):
+        self.after = after
+
+    def convert_iter(self, files):
+        for index, file in enumerate(files):
+            if index == self.after:
+                raise RuntimeError('converter crashed')
+            write_pdf(file)
+            yield file, None
+
+
+def jobs(folder, count):
+    return [(REGISTER, folder / f'{index:02}.docx') for index in range(count)]
+
+
+def test_merge_keeps_file_name_order(tmp_path):
+    failures = run_pipeline(TEMPLATE, jobs(tmp_path, 12), converter=ReversingConverter(), queue_size=2)
+
+    assert failures == []
+    merged = sorted((tmp_path / MERGED_PDF_FOLDER_NAME).iterdir())
+    assert len(merged) == 1
+    widths = [float(page.mediabox.width) for page in PyPDF2.PdfReader(merged[0]).pages]
+    assert widths == [100 + index for index in range(12)]
+
+
+def test_stage_error_aborts_the_pipeline(tmp_path):
+    # More documents than the queues hold, so the render stage is blocked when the converter fails
+    with pytest.raises(RuntimeError, match='converter crashed'):
+        run_pipeline(TEMPLATE, jobs(tmp_path, 30), converter=FailingConverter(after=3), queue_size=2)
+
+    assert not any((tmp_path / MERGED_PDF_FOLDER_NAME).glob('*.pdf'))
@@ -0,0 +1,76 @@
+# -*- coding: utf-8 -*-
+
+from datetime import date
+from pathlib import Path
+
+import pytest
+
+from OA import Worksheet
+from OA._validate import ValidationError, check_cc, check_idn, check_records, validate_records
+
+ROOT = Path(__file__).resolve().parent.parent
+
+# Unified social credit codes of registered companies, as published in the national registry
+PUBLIC_CODES = ('91330100799655058B', '9144030071526726XG', '91110108551385082Q', '91310000MACY1H6853')
+
+
+def register(**values):
+    record = {'CN': '上海俊雅光学眼镜有限公司', 'CC': '91310000MACY1H6853', 'LP': '许军', 'Name': '许军',
+              'IDN': '11010519491231002X', 'Date': date(2024, 3, 28), 'Start': date(2024, 1, 1),
+              'End': date(2024, 3, 31), 'Freq': 'M', 'Template': '小规模'}
+    return record | values
+
+
+@pytest.mark.parametrize('code', PUBLIC_CODES)
+def test_public_codes_pass(code):
+    assert check_cc(code) is None
+
+
+@pytest.mark.parametrize('code', PUBLIC_CODES)
+def test_changed_check_character_fails(code):
+    wrong = '0' if code[-1] != '0' else '1'
+    assert check_cc(code[:-1] + wrong) is not None
+
+
+@pytest.mark.parametrize('code', ('310226594781851', '32111919720611771801'))
+def test_legacy_taxpayer_numbers_pass(code):
+    assert check_cc(code) is None
+
+
+@pytest.mark.parametrize('code', ('31022659478185', '91310000MACY1H685I'))
+def test_malformed_codes_fail(code):
+    assert check_cc(code) is not None
+
+
+def test_identity_numbers():
+    assert check_idn('11010519491231002X') is None
+    assert check_idn('110105194912310021') is not None
+    assert check_idn('110105194913310020') is not None
+
+
+def test_all_problems_are_reported():
+    records = [register(CC='91310000MACY1H6854'), register(Start=date(2025, 1, 1)),
+               register(Freq='W'), register(Template=None)]
+    with pytest.raises(ValidationError) as error:
+        validate_records(records)
+    assert [(issue.row, issue.field) for issue in error.value.issues] == [
+        (0, 'CC'), (1, 'Start'), (2, 'Freq'), (3, 'Template')]
+
+
+def test_blank_rows_are_dropped():
+    records = [register(), {key: None for key in register()} | {'Template': '小规模', 'Freq': 'M'}]
+    assert validate_records(records) == records[:1]
+
+
+def test_missing_placeholders():
+    issues = check_records([register(Template='个人声明')])
+    assert [issue.message for issue in issues] == ['个人声明 needs ID, Phone, Role, Status']
+
+
+@pytest.mark.parametrize('workbook', ('工商.xlsx', '税务.xlsx'))
+def test_sample_workbooks_pass(workbook):
+    from OA.engine import TemplateEngine
+
+    data = Worksheet.from_path(ROOT / workbook).data
+    engine = TemplateEngine(data, only=workbook == '税务.xlsx')
+    assert validate_records(engine, engine.template, periods=engine.only)
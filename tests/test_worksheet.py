@@ -0,0 +1,61 @@
+# -*- coding: utf-8 -*-
+
+from pathlib import Path
+from types import SimpleNamespace
+
+import pytest
+
+openpyxl = pytest.importorskip('openpyxl')
+
+from OA.worksheet import DefinedName, read_sheet_names  # noqa: E402
+
+ROOT = Path(__file__).resolve().parent.parent
+WORKBOOKS = (ROOT / '税务.xlsx', ROOT / '工商.xlsx')
+
+
+class ComName:
+    """A defined name read over COM, counting the calls for its definition."""
+
+    def __init__(self, name, refers_to, calls):
+        self.name, self._refers_to, self.calls = name, refers_to, calls
+
+    @property
+    def refers_to(self):
+        self.calls.append(self.name)
+        return self._refers_to
+
+
+def com_sheet(fullname, saved, calls):
+    ws = openpyxl.load_workbook(fullname).active
+    names = [ComName(f'{ws.title}!{name}', '=' + defined.attr_text, calls)
+             for name, defined in ws.defined_names.items()]
+    book = SimpleNamespace(fullname=str(fullname), api=SimpleNamespace(Saved=saved))
+    return SimpleNamespace(name=ws.title, names=names, book=book)
+
+
+@pytest.mark.parametrize('fullname', WORKBOOKS, ids=lambda path: path.stem)
+def test_read_sheet_names(fullname):
+    for ws in openpyxl.load_workbook(fullname).worksheets:
+        expected = {name: '=' + defined.attr_text for name, defined in ws.defined_names.items()}
+        assert read_sheet_names(fullname, ws.title) == expected
+    assert read_sheet_names(fullname, 'missing') is None
+
+
+@pytest.mark.parametrize('fullname', WORKBOOKS, ids=lambda path: path.stem)
+def test_saved_workbook_names_skip_com(fullname):
+    calls = []
+    sheet = com_sheet(fullname, saved=True, calls=calls)
+    assert dict(DefinedName(sheet).items()) == read_sheet_names(fullname, sheet.name)
+    assert calls == []
+
+
+def test_unsaved_workbook_names_use_com():
+    calls = []
+    sheet = com_sheet(WORKBOOKS[0], saved=False, calls=calls)
+    assert dict(DefinedName(sheet).items()) == read_sheet_names(WORKBOOKS[0], sheet.name)
+    assert sorted(calls) == sorted(item.name for item in sheet.names)
+
+    # A workbook that was never saved has no file to read
+    calls.clear()
+    sheet.book = SimpleNamespace(fullname='Book1', api=SimpleNamespace(Saved=True))
+    assert len(dict(DefinedName(sheet).items())) == len(sheet.names) == len(calls)
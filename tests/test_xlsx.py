@@ -0,0 +1,56 @@
+# -*- coding: utf-8 -*-
+
+from datetime import date
+from io import BytesIO
+from pathlib import Path
+
+import pytest
+
+openpyxl = pytest.importorskip('openpyxl')
+PyPDF2 = pytest.importorskip('PyPDF2')
+
+from OA._vat import MAIN_SHEET, build_record, fill_many_headless  # noqa: E402
+from OA._xlsxpdf import SheetPdf  # noqa: E402
+from OA._sentence import layout_cells  # noqa: E402
+
+TEMPLATES = Path(__file__).resolve().parents[1] / 'OA' / 'Template' / 'Excel'
+
+REGISTER = {'CN': '上海俊雅光学眼镜有限公司', 'CC': '91310000MACY1H6853', 'Name': '许军',
+            'IDN': '11010519491231002X', 'Date': date(2024, 4, 10)}
+PERIODS = [{'Start': date(2024, 1, 1), 'End': date(2024, 3, 31)},
+           {'Start': date(2024, 4, 1), 'End': date(2024, 6, 30)}]
+
+# Pages printed by Excel for each template
+PAGES = {'小规模.xlsx': 1, '一般纳税人.xlsx': 1}
+
+
+@pytest.fixture(params=sorted(PAGES))
+def template(request):
+    return TEMPLATES / request.param
+
+
+def test_headless_fill_round_trip(template, tmp_path):
+    fill_many_headless(template, [(tmp_path, [REGISTER | period for period in PERIODS])])
+
+    for period in PERIODS:
+        stem = f'{period["End"]:%y_%m%d}'
+        book = openpyxl.load_workbook(tmp_path / 'Excel' / f'{stem}.xlsx')
+        sheet = book[MAIN_SHEET]
+        expected = build_record(template.name, REGISTER | period)
+        assert {ref: sheet[ref].value for ref in expected} == expected
+
+        reader = PyPDF2.PdfReader(tmp_path / 'PDF' / f'{stem}.pdf')
+        assert len(reader.pages) == PAGES[template.name]
+
+
+def test_pdf_pages(template):
+    printout = SheetPdf(template, sheet_name=MAIN_SHEET, cells=layout_cells(template.name))
+    values = build_record(template.name, REGISTER | PERIODS[0])
+    reader = PyPDF2.PdfReader(BytesIO(printout.render(values)))
+
+    assert len(reader.pages) == len(printout.pages) == PAGES[template.name]
+    for page in reader.pages:
+        assert [float(side) for side in page.mediabox[2:]] == pytest.approx(printout.paper)
+        # The static page drawn once, then the cell values on top of it
+        base, cells = (stream.get_object().get_data() for stream in page['/Contents'])
+        assert base and cells
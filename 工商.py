@@ -1,16 +1,21 @@
 # -*- coding: utf-8 -*-
 
-import xlwings as xw
-
-from OA import Worksheet, TemplateEngine
+from OA import run_job
 
 
 def main():
+    # xlwings imports pandas, so it is loaded by the button that needs it, not on import
+    import xlwings as xw
+    from OA import Worksheet
+
     wb = xw.Book.caller()
     ws = Worksheet(wb.sheets.active)
     data = ws.data
-    engine = TemplateEngine(data, only=False)
-    engine.run()
+    # 有常驻服务时交给服务运行，否则在本进程运行 Run in the daemon when one is listening
+    reply = run_job(data, only=False)
+    if not reply['ok']:
+        # xlwings shows the error to the user
+        raise RuntimeError(reply['error'])
 
 
 if __name__ == '__main__':
@@ -1,19 +1,36 @@
 # -*- coding: utf-8 -*-
 
-import xlwings as xw
-
-from OA import Worksheet, TemplateEngine
+from OA import run_job
 
 
 def main():
+    # xlwings imports pandas, so it is loaded by the button that needs it, not on import
+    import xlwings as xw
+    from OA import Worksheet
+
     book = xw.Book.caller()
     sheet = book.sheets.active  # 当前工作表
     # 数据字典
     target_data = Worksheet(sheet).data
-    # 引擎
-    engine = TemplateEngine(target_data, only=True)
-    # 自动化
-    engine.run()
+    # 自动化：有常驻服务时交给服务运行 Run in the daemon when one is listening
+    raise_for_reply(run_job(target_data, only=True))
+
+
+def main_all():
+    """Run every worksheet holding a register as one batch, one result folder per company."""
+    import xlwings as xw
+    from OA import Worksheet
+
+    book = xw.Book.caller()
+    # 每个工作表一户 One register per worksheet; sheets without named ranges are skipped
+    registers = [Worksheet(sheet).data for sheet in book.sheets if len(sheet.names)]
+    raise_for_reply(run_job(registers, only=True))
+
+
+def raise_for_reply(reply):
+    """Raise the error of a failed job, for xlwings to show to the user."""
+    if not reply['ok']:
+        raise RuntimeError(reply['error'])
 
 
 if __name__ == '__main__':